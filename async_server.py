@@ -0,0 +1,322 @@
+"""
+An asyncio front end to the query server for bots that send many requests at once, see server.py for the protocol.
+
+Requests are read and answered concurrently, with the CPU heavy refining and suggesting done by a pool of worker
+processes, each of which runs a `server.QueryServer`.  The index of the default dictionary is built before the workers
+start and each of them maps the index file read-only, so they all share the one copy in the page cache and adding
+workers doesn't add another copy of the dictionary to each of them.  The same goes for the other dictionaries the
+server was started with, whose indexes are mapped the first time a request names them.
+
+Only so many requests are answered at once, further lines aren't read until a slot frees up, and each connection only
+gets so far ahead of its responses, which still come back in the order the requests were sent.  Every response gets the
+`latency_ms` it spent in the server, including waiting for a slot and a worker, on top of the `elapsed_ms` the worker
+spent answering it, and a stats request also reports the count, errors and latency percentiles of each operation, with
+requests of an unknown operation counted together as "invalid".  Each worker keeps its own refine cache, so the `cache`
+of a stats response is that of the worker that happened to answer it, whose process id is given as its `worker`:
+
+    {"id": 4, "ok": true, "cache": {"worker": 5120, ...}, "service": {"in_flight": 1, "operations": {"refine":
+     {"count": 12, "errors": 0, "p50_ms": 0.8, "p95_ms": 2.1, "p99_ms": 3.5}}}, "elapsed_ms": 0.01, "latency_ms": 0.6}
+
+When instrumentation is enabled the latency of every request is also recorded as a `serve.<op>` stage.
+"""
+
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+import instrumentation
+import parse_dictionary
+import server
+import wordlepy
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional
+
+# the most requests answered at once, and the most a single connection can have waiting on their responses.
+MAX_IN_FLIGHT: int = 64
+
+# number of latencies kept for each operation to work out its percentiles from.
+LATENCY_WINDOW: int = 4096
+
+PERCENTILES: tuple = (50, 95, 99)
+
+# the longest request line read from a socket, a line can hold an array of many requests.
+_LINE_LIMIT: int = 1 << 24
+
+# state of each worker process.
+_worker: Dict = {}
+
+
+def _initialise_worker(dictionary: str, dictionaries: tuple):
+    _worker["server"] = server.QueryServer(dictionary, dictionaries)
+
+
+def _respond(request) -> Dict:
+    response: Dict = _worker["server"].respond(request)
+
+    if "cache" in response:
+        # the cache is this worker's alone, say which worker it is so it isn't mistaken for the whole server's.
+        response["cache"]["worker"] = os.getpid()
+
+    return response
+
+
+def _ready() -> bool:
+    return True
+
+
+class LatencyMetrics:
+    """
+    Counts the requests and errors of each operation and keeps their most recent latencies to report percentiles of.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window: int = window
+        self.counts: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._latencies: Dict = {}
+
+    def record(self, operation: str, latency_ms: float, ok: bool):
+        """
+        Records a request that has been answered.
+        :param operation: String containing the operation of the request.
+        :param latency_ms: Float number of milliseconds it took to answer.
+        :param ok: Boolean, False if it was answered with an error.
+        """
+        self.counts[operation] += 1
+        if not ok:
+            self.errors[operation] += 1
+        self._latencies.setdefault(operation, deque(maxlen=self.window)).append(latency_ms)
+
+    def summary(self) -> Dict:
+        """
+        Sums up the requests answered so far.
+        :return: Dictionary of the count, errors and latency percentiles of each operation.
+        """
+        operations: Dict = {}
+
+        for operation, latencies in self._latencies.items():
+            ordered: List = sorted(latencies)
+            summary: Dict = {"count": self.counts[operation], "errors": self.errors[operation]}
+            for percentile in PERCENTILES:
+                # nearest rank, so every percentile is a latency that was actually seen.
+                summary[f"p{percentile}_ms"] = ordered[max(math.ceil(percentile / 100 * len(ordered)) - 1, 0)]
+            operations[operation] = summary
+
+        return operations
+
+
+class AsyncQueryServer:
+    """
+    Answers requests concurrently using a pool of worker processes that map the same index of the default dictionary.
+    """
+
+    def __init__(self, dictionary: str = wordlepy.DEFAULT_DICTIONARY, workers: Optional[int] = None,
+                 max_in_flight: int = MAX_IN_FLIGHT, dictionaries: Iterable[str] = ()):
+        """
+        :param dictionary: String containing the file path to the dictionary used by requests that don't name one.
+        :param workers: Integer number of worker processes, defaults to the number of CPUs.
+        :param max_in_flight: Integer number of requests answered at once.
+        :param dictionaries: Iterable of the file paths to the other dictionaries requests can name.
+        :raises DictionaryNotFound: If the dictionary cannot be located using the path specified.
+        """
+        # imported here as only the asynchronous server needs a process pool
+        from concurrent.futures import ProcessPoolExecutor
+
+        if not os.path.exists(dictionary):
+            raise wordlepy.DictionaryNotFound(f"The specified path: {dictionary} doesn't exist or is invalid!")
+
+        self.dictionary: str = dictionary
+        self.max_in_flight: int = max_in_flight
+        self.metrics: LatencyMetrics = LatencyMetrics()
+        self.in_flight: int = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        try:
+            # built once here rather than by every worker racing to, a read-only location is left to the workers' own
+            # fallback.
+            parse_dictionary.load_index(dictionary)
+        except OSError:
+            pass
+
+        self._pool = ProcessPoolExecutor(workers, initializer=_initialise_worker,
+                                         initargs=(dictionary, tuple(dictionaries)))
+        # starts the workers up front, before any threads of the event loop exist to be forked along with them.
+        self._pool.submit(_ready).result()
+
+    def close(self):
+        """
+        Stops the workers.
+        """
+        self._pool.shutdown()
+
+    def __enter__(self) -> "AsyncQueryServer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def respond(self, request) -> Dict:
+        """
+        Answers a single request in a worker, waiting for a free slot first.
+        :param request: Dictionary containing the request.
+        :return: Dictionary containing the response, including its latency.
+        """
+        start: float = time.perf_counter()
+        # only the real operations get their own metrics, anything a client makes up shares one bucket.
+        operation: str = request.get("op") if isinstance(request, dict) else None
+        if operation not in server.OPERATIONS:
+            operation = "invalid"
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                response: Dict = await asyncio.get_running_loop().run_in_executor(self._pool, _respond, request)
+            except Exception as error:
+                # a worker that died takes the pool with it, answer rather than leave the client waiting.
+                request_id = request.get("id") if isinstance(request, dict) else None
+                response = {"id": request_id, "ok": False, "error": f"Could not answer request: {error!r}"}
+            finally:
+                self.in_flight -= 1
+
+        if operation == "stats" and response["ok"]:
+            response["service"] = {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+                                   "operations": self.metrics.summary()}
+
+        seconds: float = time.perf_counter() - start
+        response["latency_ms"] = seconds * 1000
+        self.metrics.record(operation, response["latency_ms"], response["ok"])
+
+        if instrumentation.enabled():
+            instrumentation.emit({"stage": f"serve.{operation}", "seconds": seconds, "candidates_in": None,
+                                  "candidates_out": response.get("count")})
+
+        return response
+
+    async def respond_line(self, line) -> Optional[str]:
+        """
+        Answers a line of the protocol, the requests of an array are answered concurrently.
+        :param line: String or bytes containing the JSON of the request or requests.
+        :return: String containing the JSON of the response or responses, None for a blank line.
+        """
+        if not line.strip():
+            return None
+
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return json.dumps({"id": None, "ok": False, "error": f"Could not parse request: {error}"})
+
+        if isinstance(request, list):
+            return json.dumps(list(await asyncio.gather(*(self.respond(item) for item in request))))
+
+        return json.dumps(await self.respond(request))
+
+    async def serve_lines(self, readline, write):
+        """
+        Answers request lines until the input runs out, reading ahead of the responses until this connection has the
+        most requests waiting it is allowed.  Responses are written in the order the requests were read.
+        :param readline: Coroutine function returning the next line, empty once the input runs out.
+        :param write: Coroutine function writing a response line.
+        """
+        pending: asyncio.Queue = asyncio.Queue(self.max_in_flight)
+
+        async def write_responses():
+            connected: bool = True
+            while True:
+                task: Optional[asyncio.Future] = await pending.get()
+                if task is None:
+                    return
+                response: Optional[str] = await task
+                if response is None or not connected:
+                    continue
+                try:
+                    await write(response)
+                except ConnectionError:
+                    # keep taking the responses off the queue so the reader is never left waiting for room.
+                    connected = False
+
+        writer: asyncio.Task = asyncio.ensure_future(write_responses())
+
+        try:
+            while True:
+                line = await readline()
+                if not line:
+                    break
+                await pending.put(asyncio.ensure_future(self.respond_line(line)))
+        finally:
+            await pending.put(None)
+            await writer
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def write(response: str):
+            writer.write(response.encode("utf-8") + b"\n")
+            await writer.drain()
+
+        try:
+            await self.serve_lines(reader.readline, write)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_stdio(self):
+        """
+        Answers requests read from stdin and writes the responses to stdout until stdin runs out.  Stdin is read in a
+        thread so it works whether it is a terminal, a pipe or a file.
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+        async def readline() -> str:
+            return await loop.run_in_executor(None, sys.stdin.readline)
+
+        async def write(response: str):
+            sys.stdout.write(response + "\n")
+            sys.stdout.flush()
+
+        await self.serve_lines(readline, write)
+
+    async def serve_socket(self, socket_path: Optional[str] = None, host: str = "127.0.0.1",
+                           port: Optional[int] = None):
+        """
+        Answers requests from every client of a Unix or TCP socket until cancelled.
+        :param socket_path: String containing the file path of a Unix socket to listen on.
+        :param host: String containing the address to listen on when a port is given.
+        :param port: Integer TCP port to listen on.
+        :raises OSError: If something other than a socket is at the socket path.
+        """
+        if socket_path is not None:
+            if not hasattr(asyncio, "start_unix_server"):
+                raise OSError("Unix sockets aren't supported on this platform, use a TCP port instead!")
+            server.remove_stale_socket(socket_path)
+            listener = await asyncio.start_unix_server(self._handle_connection, socket_path, limit=_LINE_LIMIT)
+        else:
+            listener = await asyncio.start_server(self._handle_connection, host, port, limit=_LINE_LIMIT)
+
+        async with listener:
+            await listener.serve_forever()
+
+
+def serve(dictionary: str = wordlepy.DEFAULT_DICTIONARY, socket_path: Optional[str] = None,
+          host: str = "127.0.0.1", port: Optional[int] = None, workers: Optional[int] = None,
+          max_in_flight: int = MAX_IN_FLIGHT, dictionaries: Iterable[str] = ()):
+    """
+    Runs the asynchronous query server until it is interrupted or its input runs out.  With neither a socket path nor a
+    port the requests are read from stdin and the responses written to stdout.
+    :param dictionary: String containing the file path to the dictionary used by requests that don't name one.
+    :param socket_path: String containing the file path of a Unix socket to listen on.
+    :param host: String containing the address to listen on when a port is given.
+    :param port: Integer TCP port to listen on.
+    :param workers: Integer number of worker processes, defaults to the number of CPUs.
+    :param max_in_flight: Integer number of requests answered at once.
+    :param dictionaries: Iterable of the file paths to the other dictionaries requests can name.
+    """
+    with AsyncQueryServer(dictionary, workers, max_in_flight, dictionaries) as query_server:
+        if socket_path is None and port is None:
+            asyncio.run(query_server.serve_stdio())
+        else:
+            asyncio.run(query_server.serve_socket(socket_path, host, port))
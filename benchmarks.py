@@ -0,0 +1,284 @@
+"""
+Benchmarks the hot paths of wordlepy so the effect of a change on performance can be measured.
+
+Each stage is run against synthetic dictionaries of random words, across word lengths, dictionary sizes and constraint
+densities, with warm-up runs followed by repeated timed trials.  Results are written out as JSON, and a previous run can
+be given as a baseline to flag any stage that has become slower.
+
+    python benchmarks.py --sizes 10000 100000 --output baseline.json
+    python benchmarks.py --sizes 10000 100000 --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import parse_dictionary
+import wordlepy
+import wordlepy_tester
+from typing import Callable, Dict, List
+
+STAGES = ("parse", "load", "filter", "regex", "patterns", "compile", "constraints", "refine", "solve")
+
+# letters are drawn with roughly english frequencies so constraints eliminate words realistically.
+LETTERS = "etaoinshrdlcumwfgypbvkjxqz"
+LETTER_WEIGHTS = [12, 9, 8, 7, 7, 7, 6, 6, 6, 4, 4, 3, 3, 2, 2, 2, 2, 2, 2, 1.5, 1, 0.8, 0.2, 0.2, 0.1, 0.1]
+
+# games played per trial of the solve stage.
+SOLVE_GAMES = 20
+
+
+def synthetic_dictionary(directory: str, length: int, size: int, seed: int = 0) -> str:
+    """
+    Writes a dictionary of random words in the same JSON format as the Webster's dictionary, or reuses the one already
+    written with the same parameters.
+    :param directory: String containing the directory to write the dictionary in.
+    :param length: Integer length of the words.
+    :param size: Integer number of words to write, fewer are written if the length can't make that many distinct words.
+    :param seed: Integer seed of the random words.
+    :return: String containing the file path of the dictionary.
+    """
+    file_path: str = os.path.join(directory, f"synthetic-{length}-{size}-{seed}.json")
+
+    if os.path.exists(file_path):
+        return file_path
+
+    generator: random.Random = random.Random(seed)
+    words: set = set()
+    attempts: int = 0
+
+    while len(words) < size and attempts < size * 4:
+        batch: int = size - len(words)
+        attempts += batch
+        words.update("".join(generator.choices(LETTERS, LETTER_WEIGHTS, k=length)) for _ in range(batch))
+
+    with open(file_path, "w") as file:
+        file.write("{")
+        for index, word in enumerate(sorted(words)):
+            file.write(f'{"," if index else ""}"{word}": "A synthetic definition of {word}."\n')
+        file.write("}")
+
+    return file_path
+
+
+def constraints(words: List, density: int, seed: int = 0) -> Dict:
+    """
+    Picks a realistic set of constraints by pretending a word of the dictionary is the answer, the density is the number
+    of present letters, absent letters and green positions given.
+    :param words: List of the words of the dictionary.
+    :param density: Integer number of letters of each kind of constraint.
+    :param seed: Integer seed used to pick the answer and constraints.
+    :return: Dictionary of the present and absent strings and list of patterns.
+    """
+    generator: random.Random = random.Random(seed)
+    answer: str = generator.choice(words)
+    length: int = len(answer)
+
+    present: str = "".join(generator.sample(sorted(set(answer)), min(density, len(set(answer)))))
+    absent: str = "".join(generator.sample([char for char in LETTERS if char not in answer], density))
+    greens: List = generator.sample(range(length), min(density, length))
+    pattern: str = "".join(answer[position] if position in greens else "?" for position in range(length))
+
+    return {"present": present, "absent": absent, "patterns": [pattern]}
+
+
+def time_stage(run: Callable, warmup: int, repeat: int) -> Dict:
+    """
+    Times a stage, discarding the warm-up runs.
+    :param run: Callable running the stage once.
+    :param warmup: Integer number of untimed runs first.
+    :param repeat: Integer number of timed runs.
+    :return: Dictionary of the timings in seconds.
+    """
+    for _ in range(warmup):
+        run()
+
+    trials: List = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        run()
+        trials.append(time.perf_counter() - start)
+
+    return {"median": statistics.median(trials), "min": min(trials), "mean": statistics.mean(trials), "trials": trials}
+
+
+def stage_runners(dictionary: str, length: int, density: int) -> Dict:
+    """
+    Builds a callable for every stage against a dictionary.
+    :param dictionary: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param density: Integer constraint density.
+    :return: Dictionary of callables keyed by stage name.
+    """
+    parse_dictionary.load_index(dictionary)
+    table = parse_dictionary.load_table(dictionary, length)
+    words: List = list(table.words)
+    query: Dict = constraints(words, density)
+    regexes: List = [wordlepy._build_regex(pattern) for pattern in query["patterns"]]
+    answers: List = random.Random(density).sample(words, min(SOLVE_GAMES, len(words)))
+    session: wordlepy.WordleSession = wordlepy.WordleSession(length=length, table=table)
+    compiled = wordlepy.compile_constraints(query["present"], query["absent"], query["patterns"])
+    log: logging.Logger = logging.getLogger("benchmarks")
+
+    def parse():
+        parse_dictionary.build_index(dictionary)
+        parse_dictionary.load_index(dictionary)
+
+    def regex():
+        filtered: List = words
+        for pattern in regexes:
+            filtered = wordlepy.refined_by_regex(filtered, pattern)
+
+    def patterns():
+        # drop the cached positional bitsets so each run pays for building the ones it needs, as a fresh process would.
+        table._positions.clear()
+        wordlepy.refined_by_patterns(table, query["patterns"])
+
+    def constraint_bits():
+        # the same cold start as the patterns stage, the compiled constraints are what a refine actually evaluates.
+        table._positions.clear()
+        compiled.bits(table)
+
+    def solve():
+        for answer in answers:
+            wordlepy_tester.solve(log, session.branch(), answer, words[0])
+
+    return {
+        "parse": parse,
+        "load": lambda: parse_dictionary.parse(dictionary, length),
+        "filter": lambda: wordlepy.filter_entries_by_presence_or_absence(table, present=list(query["present"]),
+                                                                         absent=list(query["absent"])),
+        "regex": regex,
+        "patterns": patterns,
+        "compile": lambda: wordlepy.compile_constraints(query["present"], query["absent"], query["patterns"]),
+        "constraints": constraint_bits,
+        # a session built from a table isn't cached, so this is the whole of a refine with the bitsets already built.
+        "refine": lambda: session.branch().refine(query["present"], query["absent"], query["patterns"]),
+        "solve": solve
+    }
+
+
+def run_benchmarks(args) -> Dict:
+    """
+    Runs every requested stage for every combination of length, size and density.
+    :param args: Namespace containing the command line arguments.
+    :return: Dictionary of the machine details and the results of every run.
+    """
+    results: List = []
+    # without a directory to keep them in, the dictionaries and their indexes are removed once the run is over.
+    directories = (contextlib.nullcontext(args.directory) if args.directory
+                   else tempfile.TemporaryDirectory(prefix="wordlepy-benchmarks-"))
+
+    with directories as directory:
+        for length in args.lengths:
+            for size in args.sizes:
+                dictionary: str = synthetic_dictionary(directory, length, size)
+
+                for density in args.densities:
+                    runners: Dict = stage_runners(dictionary, length, density)
+
+                    for stage in args.stages:
+                        # dictionary loading doesn't depend on the constraints, so only time it once.
+                        if stage in ("parse", "load") and density != args.densities[0]:
+                            continue
+
+                        timing: Dict = time_stage(runners[stage], args.warmup, args.repeat)
+                        results.append(dict(stage=stage, length=length, size=size, density=density, **timing))
+                        print(f"{stage:>11} length={length:<3} size={size:<9} density={density:<2} "
+                              f"median={timing['median'] * 1000:10.3f}ms", file=sys.stderr)
+
+    return {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor()},
+        "timestamp": time.time(),
+        "results": results
+    }
+
+
+def _key(result: Dict) -> tuple:
+    return result["stage"], result["length"], result["size"], result["density"]
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List:
+    """
+    Compares the median timings of two runs.
+    :param baseline: Dictionary of the results of the earlier run.
+    :param current: Dictionary of the results of the new run.
+    :param threshold: Float fraction a median can grow by before it counts as a regression.
+    :return: List of (key, baseline median, current median) tuples of every regression.
+    """
+    baseline_medians: Dict = {_key(result): result["median"] for result in baseline["results"]}
+    regressions: List = []
+
+    for result in current["results"]:
+        before = baseline_medians.get(_key(result))
+
+        if before is None:
+            continue
+
+        change: float = (result["median"] - before) / before if before else 0.0
+        flag: str = "REGRESSION" if change > threshold else ""
+        print(f"{'/'.join(map(str, _key(result))):<40} {before * 1000:10.3f}ms -> {result['median'] * 1000:10.3f}ms "
+              f"{change * 100:+7.1f}% {flag}", file=sys.stderr)
+
+        if flag:
+            regressions.append((_key(result), before, result["median"]))
+
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of wordlepy.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES),
+                        help="Specify the stages to benchmark, the default is all of them.")
+    parser.add_argument("--lengths", nargs="+", type=int, default=[5, 8],
+                        help="Specify the word lengths to benchmark, the default is 5 and 8.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000, 1000000],
+                        help="Specify the number of words in each synthetic dictionary, the default is 10k, 100k and "
+                             "1M, sizes up to 10M are supported.")
+    parser.add_argument("--densities", nargs="+", type=int, default=[1, 2, 3],
+                        help="Specify the constraint densities, the number of present letters, absent letters and "
+                             "green positions in each query.")
+    parser.add_argument("--warmup", type=int, default=1, help="Specify the number of untimed runs of each stage.")
+    parser.add_argument("--repeat", type=int, default=5, help="Specify the number of timed runs of each stage.")
+    parser.add_argument("--directory", type=str, required=False,
+                        help="Specify a directory to keep the synthetic dictionaries in between runs, the default is "
+                             "a new temporary directory.")
+    parser.add_argument("--output", type=str, required=False,
+                        help="Specify a file to write the results to, the default is stdout.")
+    parser.add_argument("--compare", type=str, required=False,
+                        help="Specify the results of an earlier run to flag regressions against.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Specify how much slower a stage has to get to count as a regression, the default is "
+                             "0.10 i.e. 10%%.")
+
+    args = parser.parse_args(argv)
+    results: Dict = run_benchmarks(args)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            regressions: List = compare(json.load(file), results, args.threshold)
+
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed by more than {args.threshold * 100:.0f}%!", file=sys.stderr)
+            sys.exit(1)
+
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
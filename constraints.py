@@ -0,0 +1,267 @@
+"""
+Compiles everything known about a word into a single set of constraints that is evaluated in one pass.
+
+Present and absent letters, the letters known to be in or not in a position and how many copies of a letter the word
+has are all reduced to four kinds of constraint:
+
+* greens, a letter that is in a position,
+* exclusions, a letter that isn't in a position,
+* a lower bound on the number of copies of a letter, a present letter has at least one,
+* an upper bound on the number of copies of a letter, an absent letter has at most none.
+
+Against a WordTable each constraint is a bitset from the inverted index, the bitsets are applied most eliminating first
+and evaluation stops as soon as no candidates are left.  Against a plain word the checks run cheapest first.
+"""
+
+import feedback
+import word_index
+from typing import Dict, Iterable, List, Optional
+
+GREY, YELLOW, GREEN = feedback.FEEDBACK_CHARACTERS
+
+
+class Constraints:
+    """
+    What is known about the word being guessed.
+    """
+
+    def __init__(self):
+        self.greens: Dict = {}
+        self.excluded: Dict = {}
+        self.at_least: Dict = {}
+        self.at_most: Dict = {}
+        # the shortest a word can be for the positional constraints to apply to it.
+        self.min_length: int = 0
+        # set when two constraints contradict each other e.g. two different letters in the same position.
+        self.impossible: bool = False
+
+    def require_at(self, position: int, letter: str):
+        if self.greens.get(position, letter) != letter:
+            self.impossible = True
+        self.greens[position] = letter
+        self.min_length = max(self.min_length, position + 1)
+
+    def exclude_at(self, position: int, letter: str):
+        self.excluded.setdefault(position, set()).add(letter)
+        self.min_length = max(self.min_length, position + 1)
+
+    def require_count(self, letter: str, minimum: int):
+        if minimum > 0:
+            self.at_least[letter] = max(self.at_least.get(letter, 0), minimum)
+
+    def limit_count(self, letter: str, maximum: int):
+        self.at_most[letter] = min(self.at_most.get(letter, maximum), maximum)
+
+    def contradictions(self) -> List:
+        """
+        Lists the letters whose lower bound is above their upper bound, no word can satisfy these.
+        :return: List of the contradicting letters in sorted order.
+        """
+        return sorted(letter for letter, minimum in self.at_least.items()
+                      if minimum > self.at_most.get(letter, minimum))
+
+    def key(self, length: Optional[int] = None) -> str:
+        """
+        Builds a canonical key of the constraints, constraints that match exactly the same words get the same key
+        however the arguments were ordered or repeated.  Counts already implied by the greens are dropped, as are
+        exclusions in a position that already has a green.
+        :param length: Integer length of the words the constraints are applied to, when given the key no longer
+        depends on how long the patterns were.
+        :return: String containing the key.
+        """
+        if length is not None and self.min_length > length:
+            return "!"
+
+        if self.impossible or self.contradictions() or any(
+                letter in self.excluded.get(position, ()) for position, letter in self.greens.items()):
+            return "!"
+
+        green_counts: Dict = {}
+        for letter in self.greens.values():
+            green_counts[letter] = green_counts.get(letter, 0) + 1
+
+        greens: str = ",".join(f"{position}{letter}" for position, letter in sorted(self.greens.items()))
+        excluded: str = ",".join(f"{position}{''.join(sorted(letters))}" for position, letters in
+                                 sorted(self.excluded.items()) if position not in self.greens and letters)
+        at_least: str = ",".join(f"{letter}{minimum}" for letter, minimum in sorted(self.at_least.items())
+                                 if minimum > green_counts.get(letter, 0))
+        at_most: str = ",".join(f"{letter}{maximum}" for letter, maximum in sorted(self.at_most.items()))
+
+        return f"{'' if length is not None else self.min_length}|{greens}|{excluded}|{at_least}|{at_most}"
+
+    @classmethod
+    def from_arguments(cls, present: Iterable = "", absent: Iterable = "", patterns: Iterable = (),
+                       at_least: Optional[Dict] = None, at_most: Optional[Dict] = None) -> "Constraints":
+        """
+        Compiles the arguments of refine into constraints.
+        :param present: Iterable of the characters present in the word.
+        :param absent: Iterable of the characters absent from the word.
+        :param patterns: Iterable of patterns, each a list of (kind, character) tuples with one per position where the
+        kind is `=` for a letter in that position, `^` for a letter not in that position and `?` for anything.
+        :param at_least: Dictionary of the fewest copies of a letter the word has, keyed by letter.
+        :param at_most: Dictionary of the most copies of a letter the word has, keyed by letter.
+        :return: Constraints combining all of the arguments.
+        """
+        constraints: Constraints = cls()
+
+        for char in present:
+            constraints.require_count(char, 1)
+
+        for char in absent:
+            constraints.limit_count(char, 0)
+
+        for tokens in patterns:
+            constraints.min_length = max(constraints.min_length, len(tokens))
+            for position, (kind, char) in enumerate(tokens):
+                if kind == "=":
+                    constraints.require_at(position, char)
+                elif kind == "^":
+                    constraints.exclude_at(position, char)
+
+        for char, minimum in (at_least or {}).items():
+            constraints.require_count(char, minimum)
+
+        for char, maximum in (at_most or {}).items():
+            constraints.limit_count(char, maximum)
+
+        return constraints
+
+    @classmethod
+    def from_feedback(cls, guess: str, feedback: str) -> "Constraints":
+        """
+        Compiles the colours given to a guess into constraints, following the wordle rules for duplicate letters.  The
+        green and yellow copies of a letter give a lower bound on how many copies the word has, and if any copy of the
+        letter was also grey then the word has exactly that many.
+        :param guess: String containing the word that was guessed.
+        :param feedback: String with one character per letter, g for green, y for yellow and - for grey.
+        :return: Constraints implied by the feedback.
+        :raises ValueError: If the feedback contains an unexpected character.
+        """
+        constraints: Constraints = cls()
+        coloured: Dict = {}
+        greyed: set = set()
+
+        for position, (char, colour) in enumerate(zip(guess, feedback)):
+            if colour == GREEN:
+                constraints.require_at(position, char)
+                coloured[char] = coloured.get(char, 0) + 1
+            elif colour == YELLOW:
+                constraints.exclude_at(position, char)
+                coloured[char] = coloured.get(char, 0) + 1
+            elif colour == GREY:
+                constraints.exclude_at(position, char)
+                greyed.add(char)
+            else:
+                raise ValueError(f"Unexpected feedback character encountered: {colour}, use {GREEN}, {YELLOW} or "
+                                 f"{GREY}.")
+
+        for char, count in coloured.items():
+            constraints.require_count(char, count)
+
+        for char in greyed:
+            constraints.limit_count(char, coloured.get(char, 0))
+
+        constraints.min_length = len(guess)
+
+        return constraints
+
+    def combine(self, other: "Constraints") -> "Constraints":
+        """
+        Combines two sets of constraints into one that a word has to satisfy both of.
+        :param other: Constraints to combine with these.
+        :return: Constraints of both.
+        """
+        combined: Constraints = Constraints()
+
+        for constraints in (self, other):
+            for position, letter in constraints.greens.items():
+                combined.require_at(position, letter)
+            for position, letters in constraints.excluded.items():
+                for letter in letters:
+                    combined.exclude_at(position, letter)
+            for letter, minimum in constraints.at_least.items():
+                combined.require_count(letter, minimum)
+            for letter, maximum in constraints.at_most.items():
+                combined.limit_count(letter, maximum)
+            combined.min_length = max(combined.min_length, constraints.min_length)
+            combined.impossible = combined.impossible or constraints.impossible
+
+        return combined
+
+    def matches(self, word: str) -> bool:
+        """
+        Checks a single word against the constraints, cheapest checks first.
+        :param word: String containing the word to check.
+        :return: True if the word satisfies every constraint; False if it doesn't.
+        """
+        if self.impossible or len(word) < self.min_length:
+            return False
+
+        for position, letter in self.greens.items():
+            if word[position] != letter:
+                return False
+
+        for letter, maximum in self.at_most.items():
+            if maximum == 0 and letter in word:
+                return False
+
+        for position, letters in self.excluded.items():
+            if word[position] in letters:
+                return False
+
+        for letter, minimum in self.at_least.items():
+            if word.count(letter) < minimum:
+                return False
+
+        for letter, maximum in self.at_most.items():
+            if maximum and word.count(letter) > maximum:
+                return False
+
+        return True
+
+    def plan(self, table: word_index.WordTable) -> List:
+        """
+        Turns the constraints into bitset steps against a table, ordered so the steps that leave the fewest words run
+        first.
+        :param table: WordTable to plan against.
+        :return: List of (bitset, keep) tuples, keep is True to intersect with the bitset and False to subtract it.
+        """
+        steps: List = []
+
+        for position, letter in self.greens.items():
+            steps.append((table.position_bits(position, letter), True))
+
+        for letter, minimum in self.at_least.items():
+            steps.append((table.count_bits(letter, minimum), True))
+
+        for letter, maximum in self.at_most.items():
+            steps.append((table.count_bits(letter, maximum + 1), False))
+
+        for position, letters in self.excluded.items():
+            for letter in letters:
+                steps.append((table.position_bits(position, letter), False))
+
+        def survivors(step: tuple) -> int:
+            size: int = word_index.popcount(step[0])
+            return size if step[1] else len(table) - size
+
+        return sorted(steps, key=survivors)
+
+    def bits(self, table: word_index.WordTable, bits: Optional[int] = None) -> int:
+        """
+        Evaluates the constraints against a table in a single pass.
+        :param table: WordTable to evaluate against.
+        :param bits: Integer bitset of the candidates to narrow down, defaults to every word in the table.
+        :return: Integer bitset of the candidates satisfying every constraint.
+        """
+        if self.impossible or self.min_length > table.length:
+            return 0
+
+        bits = table.all_bits if bits is None else bits
+
+        for step_bits, keep in self.plan(table):
+            bits = bits & step_bits if keep else bits & ~step_bits
+            if not bits:
+                break
+
+        return bits
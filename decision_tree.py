@@ -0,0 +1,371 @@
+"""
+Builds a complete solver decision tree for a dictionary ahead of time, so playing a game is a walk down the tree rather
+than a refine and filter after every guess.
+
+Each node of the tree holds the guess to make, and has a child for every feedback code that guess can get other than all
+green.  The guess of each node is the candidate expected to narrow down the candidates reaching it the most, so the tree
+plays the same game as the suggestions do.  Below the starting guess, the subtrees are built across a pool of worker
+processes.
+
+The tree is stored in compressed sparse row form, as four flat arrays:
+
+* the word id of the guess of each node,
+* where the children of each node start in the edge arrays, with one extra entry marking the end of the last node,
+* the id of the child node of each edge,
+* the feedback code of each edge, sorted within each node.
+
+The file is memory-mapped when loaded, following a feedback code to the next node is a binary search over the at most
+3 ** length edges of a single node, however big the dictionary is.
+"""
+
+import json
+import mmap
+import os
+import sys
+import feedback
+import parse_dictionary
+import suggestions
+import word_index
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+TREE_SUFFIX: str = ".wptree"
+TREE_MAGIC: bytes = b"WPTREE"
+TREE_VERSION: int = 1
+
+# the most candidates tried as the guess of a node, nodes with more candidates try an evenly spread sample of them.
+GUESS_POOL: int = 256
+
+# byte alignment of the payload and of every array in a tree file.
+_ALIGNMENT: int = 8
+
+_NODE_TYPECODE: str = "I"
+
+
+class InvalidTree(Exception):
+    pass
+
+
+def tree_path_for(file_path: str, length: int) -> str:
+    """
+    Works out where the decision tree of a dictionary and word length lives.
+    :param file_path: String containing the file path to the source dictionary.
+    :param length: Integer length of the words.
+    :return: String containing the file path to the decision tree.
+    """
+    return f"{file_path}.{length}{TREE_SUFFIX}"
+
+
+def _fresh_matrix(file_path: str, length: int, sha256: str) -> Optional[feedback.FeedbackMatrix]:
+    try:
+        matrix: feedback.FeedbackMatrix = feedback.FeedbackMatrix(feedback.matrix_path_for(file_path, length))
+    except (OSError, ValueError, feedback.InvalidMatrix):
+        return None
+
+    if matrix.header["sha256"] != sha256 or matrix.length != length:
+        matrix.close()
+        return None
+
+    return matrix
+
+
+def _codes(table: word_index.WordTable, matrix: Optional[feedback.FeedbackMatrix], guess_id: int,
+           ids: List) -> Sequence:
+    return feedback.score_ids(table, [guess_id] * len(ids), ids, matrix)
+
+
+def _split(ids: List, codes: List, solved: int) -> Dict:
+    buckets: Dict = {}
+
+    for answer_id, code in zip(ids, codes):
+        if code != solved:
+            buckets.setdefault(code, []).append(answer_id)
+
+    return buckets
+
+
+def build_subtree(table: word_index.WordTable, ids: List,
+                  matrix: Optional[feedback.FeedbackMatrix] = None) -> Tuple:
+    """
+    Builds the decision tree that solves for a set of candidates, guessing the candidate expected to narrow them down
+    the most at every node.  Ties are broken by the smaller worst case, then by the word id, so the same tree is always
+    built.
+    :param table: WordTable the candidates are from.
+    :param ids: List of the ids of the candidates in table order.
+    :param matrix: FeedbackMatrix of the table, when not given the candidates are scored as the tree is built.
+    :return: Tuple of the id of the guess and a dictionary of the subtree of each feedback code it can get.
+    """
+    solved: int = 3 ** table.length - 1
+
+    if len(ids) <= 2:
+        guess_id: int = ids[0]
+    else:
+        pool: List = ids if len(ids) <= GUESS_POOL else [ids[i * len(ids) // GUESS_POOL] for i in range(GUESS_POOL)]
+        best: Optional[Tuple] = None
+
+        for candidate_id in pool:
+            counts: Dict = Counter(_codes(table, matrix, candidate_id, ids))
+            rank: Tuple = (-suggestions.information(counts.values()), max(counts.values()), candidate_id)
+
+            if best is None or rank < best:
+                best = rank
+
+        guess_id = best[2]
+
+    buckets: Dict = _split(ids, _codes(table, matrix, guess_id, ids), solved)
+
+    return guess_id, {code: build_subtree(table, bucket, matrix) for code, bucket in buckets.items()}
+
+
+# the table and matrix used by each worker process while building a tree.
+_worker: Dict = {}
+
+
+def _initialise_worker(file_path: str, length: int):
+    _worker["table"] = parse_dictionary.load_table(file_path, length)
+    _worker["matrix"] = _fresh_matrix(file_path, length, parse_dictionary.source_digest(file_path))
+
+
+def _build_worker_subtree(ids: List) -> Tuple:
+    return build_subtree(_worker["table"], ids, _worker["matrix"])
+
+
+def _flatten(root: Tuple, typecode: str) -> Tuple:
+    guesses: array = array(_NODE_TYPECODE)
+    first: array = array(_NODE_TYPECODE, [0])
+    children: array = array(_NODE_TYPECODE)
+    codes: array = array(typecode)
+    depth: int = 0
+
+    # nodes are numbered breadth first, so a node's id is known as soon as its parent is written out.
+    queue: deque = deque([(root, 1)])
+
+    while queue:
+        (guess_id, subtrees), level = queue.popleft()
+        depth = max(depth, level)
+        guesses.append(guess_id)
+
+        for code in sorted(subtrees):
+            codes.append(code)
+            children.append(len(guesses) + len(queue))
+            queue.append((subtrees[code], level + 1))
+
+        first.append(len(codes))
+
+    return guesses, first, children, codes, depth
+
+
+def build_tree(file_path: str, length: int, tree_path: Optional[str] = None, start: Optional[str] = None,
+               workers: Optional[int] = None) -> str:
+    """
+    Builds the decision tree of a dictionary and word length and writes it to a tree file.  The feedback matrix is used
+    to score guesses if one has been built for the dictionary.
+    :param file_path: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param tree_path: String containing the file path to write the tree to, defaults to next to the dictionary.
+    :param start: String containing the first guess, defaults to the best suggestion for the dictionary.
+    :param workers: Integer number of worker processes, defaults to the number of CPUs.
+    :return: String containing the file path of the tree that was written.
+    :raises ValueError: If the starting word isn't a word of the dictionary.
+    """
+    # imported here as starting up a process pool is only ever needed when building a tree
+    from concurrent.futures import ProcessPoolExecutor
+
+    tree_path = tree_path or tree_path_for(file_path, length)
+    table: word_index.WordTable = parse_dictionary.load_table(file_path, length)
+    sha256: str = parse_dictionary.source_digest(file_path)
+    typecode: str = feedback.typecode_for(length)
+
+    if not len(table):
+        raise ValueError(f"There are no words of length {length} to build a tree for!")
+
+    start = start or suggestions.suggest(file_path, length, top=1)[0]
+
+    try:
+        start_id: int = table.words.index(start)
+    except ValueError:
+        raise ValueError(f"The starting word {start} isn't a word of length {length} in the dictionary!")
+
+    # the starting guess is scored against the whole table a row at a time, the subtrees below it are independent.
+    matrix: Optional[feedback.FeedbackMatrix] = _fresh_matrix(file_path, length, sha256)
+    row = matrix.row(start_id) if matrix is not None else feedback.score_row(table, start)
+    buckets: Dict = _split(range(len(table)), row, 3 ** length - 1)
+
+    if matrix is not None:
+        # the row is a view onto the matrix and has to be let go of before the matrix can be closed.
+        row.release()
+        matrix.close()
+
+    # the biggest subtrees are handed out first so no worker is left with a big one at the end.
+    order: List = sorted(buckets, key=lambda code: -len(buckets[code]))
+
+    with ProcessPoolExecutor(workers, initializer=_initialise_worker, initargs=(file_path, length)) as executor:
+        subtrees: Dict = dict(zip(order, executor.map(_build_worker_subtree, [buckets[code] for code in order])))
+
+    arrays: Tuple = _flatten((start_id, subtrees), typecode)
+    depth: int = arrays[-1]
+    sections: Dict = {}
+    payload: List = []
+    offset: int = 0
+
+    for name, values in zip(("guesses", "first", "children", "codes"), arrays):
+        data: bytes = values.tobytes()
+        sections[name] = [offset, len(data)]
+        data += b"\0" * (-len(data) % _ALIGNMENT)
+        payload.append(data)
+        offset += len(data)
+
+    header: Dict = {
+        "sha256": sha256,
+        "length": length,
+        "count": len(table),
+        "start": start,
+        "nodes": len(arrays[0]),
+        "depth": depth,
+        "typecode": typecode,
+        "byteorder": sys.byteorder,
+        "sections": sections
+    }
+
+    preamble: bytes = TREE_MAGIC + b" %d\n" % TREE_VERSION + json.dumps(header).encode("utf-8")
+    preamble += b" " * (-(len(preamble) + 1) % _ALIGNMENT) + b"\n"
+
+    temporary_path: str = f"{tree_path}.{os.getpid()}.tmp"
+
+    with open(temporary_path, "wb") as file:
+        file.write(preamble)
+        for data in payload:
+            file.write(data)
+
+    os.replace(temporary_path, tree_path)
+
+    return tree_path
+
+
+class DecisionTree:
+    """
+    A memory-mapped, read-only view of a decision tree.  Node 0 is the starting guess.
+    """
+
+    def __init__(self, tree_path: str, table: Optional[word_index.WordTable] = None):
+        """
+        :param tree_path: String containing the file path to the tree.
+        :param table: WordTable the tree was built from, used to turn the guesses into words.
+        :raises InvalidTree: If the file isn't a decision tree this version can read.
+        """
+        self.tree_path: str = tree_path
+        self.table: Optional[word_index.WordTable] = table
+
+        with open(tree_path, "rb") as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic_end: int = self._buffer.find(b"\n")
+        header_end: int = self._buffer.find(b"\n", magic_end + 1)
+
+        if self._buffer[:magic_end] != TREE_MAGIC + b" %d" % TREE_VERSION or header_end == -1:
+            self._buffer.close()
+            raise InvalidTree(f"{tree_path} is not a wordlepy decision tree of version {TREE_VERSION}!")
+
+        self.header: Dict = json.loads(self._buffer[magic_end + 1:header_end])
+
+        if self.header["byteorder"] != sys.byteorder:
+            self._buffer.close()
+            raise InvalidTree(f"{tree_path} was built on a machine with a different byte order!")
+
+        self.length: int = self.header["length"]
+        self._views: List = []
+        payload: memoryview = memoryview(self._buffer)[header_end + 1:]
+
+        def section(name: str, typecode: str) -> memoryview:
+            offset, size = self.header["sections"][name]
+            view: memoryview = payload[offset:offset + size].cast(typecode)
+            self._views.append(view)
+            return view
+
+        self._guesses: memoryview = section("guesses", _NODE_TYPECODE)
+        self._first: memoryview = section("first", _NODE_TYPECODE)
+        self._children: memoryview = section("children", _NODE_TYPECODE)
+        self._codes: memoryview = section("codes", self.header["typecode"])
+        self._views.append(payload)
+
+    def __len__(self) -> int:
+        return len(self._guesses)
+
+    def guess_id(self, node: int) -> int:
+        """
+        Looks up the guess to make at a node.
+        :param node: Integer id of the node.
+        :return: Integer id of the guess in the word table.
+        """
+        return self._guesses[node]
+
+    def guess(self, node: int) -> str:
+        """
+        Looks up the guess to make at a node.
+        :param node: Integer id of the node.
+        :return: String containing the word to guess.
+        """
+        return self.table.words[self._guesses[node]]
+
+    def child(self, node: int, code: int) -> Optional[int]:
+        """
+        Follows the feedback a guess got to the node of the next guess.
+        :param node: Integer id of the node the guess was made at.
+        :param code: Integer code of the feedback the guess got.
+        :return: Integer id of the next node, None if the feedback solved the word or no word of the dictionary could
+        have given it.
+        """
+        start: int = self._first[node]
+        stop: int = self._first[node + 1]
+        position: int = bisect_left(self._codes, code, start, stop)
+
+        if position < stop and self._codes[position] == code:
+            return self._children[position]
+
+        return None
+
+    def next(self, node: int, colours: str) -> Optional[int]:
+        """
+        Follows the feedback a guess got, given as colours, to the node of the next guess.
+        :param node: Integer id of the node the guess was made at.
+        :param colours: String with one character per letter of the guess, g for green, y for yellow and - for grey.
+        :return: Integer id of the next node, None if the feedback solved the word or no word of the dictionary could
+        have given it.
+        :raises ValueError: If the feedback contains an unexpected character.
+        """
+        return self.child(node, feedback.from_string(colours))
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._buffer.close()
+
+
+def load_tree(file_path: str, length: int, tree_path: Optional[str] = None,
+              workers: Optional[int] = None) -> DecisionTree:
+    """
+    Loads the decision tree of a dictionary and word length, building it first if it is missing or was built from a
+    different version of the dictionary.
+    :param file_path: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param tree_path: String containing the file path of the tree, defaults to next to the dictionary.
+    :param workers: Integer number of worker processes to build the tree with, defaults to the number of CPUs.
+    :return: DecisionTree of the dictionary.
+    """
+    tree_path = tree_path or tree_path_for(file_path, length)
+    table: word_index.WordTable = parse_dictionary.load_table(file_path, length)
+
+    try:
+        tree: Optional[DecisionTree] = DecisionTree(tree_path, table)
+    except (OSError, ValueError, InvalidTree):
+        tree = None
+
+    if tree is not None and tree.header["sha256"] == parse_dictionary.source_digest(file_path) and tree.length == length:
+        return tree
+
+    if tree is not None:
+        tree.close()
+
+    return DecisionTree(build_tree(file_path, length, tree_path, workers=workers), table)
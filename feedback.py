@@ -0,0 +1,430 @@
+"""
+Scores guesses against answers the same way wordle colours the letters of a guess, and stores the score of every pair of
+words of a dictionary in a memory-mapped matrix.
+
+A score is packed into a single integer code by treating the colour of each letter as a base 3 digit, grey is 0, yellow
+is 1 and green is 2, with the first letter as the least significant digit.
+
+Scoring a guess against every word of a table is done a whole row at a time using the positional bitsets of the table.
+The green and yellow bitsets of each position are spread out into one lane of bytes per answer and added together as big
+integers, the lanes are wide enough for the largest code so the lanes never carry into each other.
+
+Batches of (guess, answer) pairs, as played by the tester and the solvers, are scored with `score_pairs` or, for words
+of a table, `score_ids`, which scores a guess a row at a time when it is paired with enough answers to make that
+cheaper than scoring each pair on its own.
+"""
+
+import json
+import mmap
+import os
+import sys
+import parse_dictionary
+import word_index
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+# characters used to describe the colour of each letter of a guess, indexed by the digit of that colour.
+FEEDBACK_CHARACTERS: str = "-yg"
+GREY: int = 0
+YELLOW: int = 1
+GREEN: int = 2
+
+MATRIX_SUFFIX: str = ".wpfbm"
+MATRIX_MAGIC: bytes = b"WPFBM"
+MATRIX_VERSION: int = 1
+
+# typecodes wide enough to hold every code of words up to the given length.
+_TYPECODES: List = [(5, "B"), (10, "H"), (20, "I"), (40, "Q")]
+
+# number of guess rows handed to a worker at a time when building a matrix.
+_CHUNK_ROWS: int = 64
+
+# byte alignment of the payload of a matrix file.
+_ALIGNMENT: int = 8
+
+# value of a digit at each position of a code, for words up to the longest that can be coded.
+_PLACES: List = [3 ** position for position in range(_TYPECODES[-1][0] + 1)]
+
+# a guess paired with at least the size of the table divided by this many answers is scored a whole row at a time.
+_ROW_FRACTION: int = 8
+
+
+class InvalidMatrix(Exception):
+    pass
+
+
+def typecode_for(length: int) -> str:
+    """
+    Picks the smallest array typecode able to hold every code of words of a given length.
+    :param length: Integer length of the words.
+    :return: String containing the array typecode.
+    :raises ValueError: If the words are too long to code in 64 bits.
+    """
+    for longest, typecode in _TYPECODES:
+        if length <= longest:
+            return typecode
+
+    raise ValueError(f"Words of length {length} are too long to score!")
+
+
+def score(guess: str, answer: str) -> int:
+    """
+    Scores a guess against an answer.  Greens are given out first, then each remaining letter of the guess is yellow for
+    as long as the answer has unmatched copies of that letter left, so duplicate letters are coloured as wordle would.
+    :param guess: String containing the word that was guessed.
+    :param answer: String containing the word being guessed, the same length as the guess.
+    :return: Integer code of the feedback.
+    """
+    if guess == answer:
+        return _PLACES[len(guess)] - 1
+
+    code: int = 0
+    # the letters of the answer that aren't green, only listed once a letter of the guess is found in the answer.
+    unmatched: Optional[List] = None
+
+    for guess_char, answer_char, place in zip(guess, answer, _PLACES):
+        if guess_char == answer_char:
+            code += GREEN * place
+        elif guess_char in answer:
+            if unmatched is None:
+                unmatched = [char for char, other in zip(answer, guess) if char != other]
+            if guess_char in unmatched:
+                unmatched.remove(guess_char)
+                code += YELLOW * place
+
+    return code
+
+
+def score_pairs(guesses: Sequence[str], answers: Sequence[str]) -> List:
+    """
+    Scores a batch of guesses against their answers.
+    :param guesses: Sequence of the words that were guessed.
+    :param answers: Sequence of the words being guessed, one for each guess and the same length as it.
+    :return: List of the feedback codes of each pair.
+    :raises ValueError: If there isn't an answer for every guess or a guess and its answer differ in length.
+    """
+    if len(guesses) != len(answers):
+        raise ValueError(f"There are {len(guesses)} guesses but {len(answers)} answers!")
+
+    codes: List = []
+
+    for guess, answer in zip(guesses, answers):
+        if len(guess) != len(answer):
+            raise ValueError(f"The guess {guess} and answer {answer} are different lengths!")
+        codes.append(score(guess, answer))
+
+    return codes
+
+
+def score_ids(table: word_index.WordTable, guess_ids: Sequence[int], answer_ids: Sequence[int],
+              matrix: Optional["FeedbackMatrix"] = None) -> array:
+    """
+    Scores a batch of guesses against their answers, both given as ids of the words of a table.  The pairs are grouped
+    by guess, a guess paired with enough answers is scored against the whole table at once with `score_row` and the
+    rest are scored one pair at a time, or every code is looked up when a feedback matrix is given.
+    :param table: WordTable containing the guesses and answers.
+    :param guess_ids: Sequence of the ids of the words that were guessed.
+    :param answer_ids: Sequence of the ids of the words being guessed, one for each guess.
+    :param matrix: FeedbackMatrix of the table, to look the codes up in rather than working them out.
+    :return: array of the feedback codes of each pair.
+    :raises ValueError: If there isn't an answer for every guess.
+    """
+    if len(guess_ids) != len(answer_ids):
+        raise ValueError(f"There are {len(guess_ids)} guesses but {len(answer_ids)} answers!")
+
+    codes: array = array(typecode_for(table.length), [0]) * len(answer_ids)
+    pairs_of: Dict = {}
+
+    for pair, guess_id in enumerate(guess_ids):
+        pairs_of.setdefault(guess_id, []).append(pair)
+
+    words: Sequence = table.words
+    row_limit: int = len(table) // _ROW_FRACTION
+
+    for guess_id, pairs in pairs_of.items():
+        if matrix is not None or len(pairs) >= row_limit:
+            row = matrix.row(guess_id) if matrix is not None else score_row(table, words[guess_id])
+            for pair in pairs:
+                codes[pair] = row[answer_ids[pair]]
+        else:
+            guess: str = words[guess_id]
+            for pair in pairs:
+                codes[pair] = score(guess, words[answer_ids[pair]])
+
+    return codes
+
+
+def to_string(code: int, length: int) -> str:
+    """
+    Converts a feedback code into a string of colour characters.
+    :param code: Integer code of the feedback.
+    :param length: Integer length of the guess.
+    :return: String with one character per letter, g for green, y for yellow and - for grey.
+    """
+    characters: List = []
+
+    for _ in range(length):
+        code, digit = divmod(code, 3)
+        characters.append(FEEDBACK_CHARACTERS[digit])
+
+    return "".join(characters)
+
+
+def from_string(feedback: str) -> int:
+    """
+    Converts a string of colour characters into a feedback code.
+    :param feedback: String with one character per letter, g for green, y for yellow and - for grey.
+    :return: Integer code of the feedback.
+    :raises ValueError: If the string contains an unexpected character.
+    """
+    code: int = 0
+
+    for char in reversed(feedback):
+        code = code * 3 + FEEDBACK_CHARACTERS.index(char)
+
+    return code
+
+
+def colour_bits(table: word_index.WordTable, guess: str, bits: Optional[int] = None) -> List:
+    """
+    Works out which answers colour each letter of a guess green or yellow, as bitsets over the table.  Every distinct
+    letter of the guess is handled in one go, tracking bitsets of the answers with at least t unmatched copies of that
+    letter left so that duplicate letters use up the copies from left to right.
+    :param table: WordTable containing the answers.
+    :param guess: String containing the word that was guessed, the same length as the words of the table.
+    :param bits: Integer bitset of the answers to score, defaults to every word in the table.
+    :return: List of (green, yellow) bitset tuples, one per position of the guess.
+    """
+    bits = table.all_bits if bits is None else bits
+    colours: List = [(0, 0)] * len(guess)
+    positions_of: Dict = {}
+
+    for position, char in enumerate(guess):
+        positions_of.setdefault(char, []).append(position)
+
+    for char, positions in positions_of.items():
+        greens: Dict = {position: table.position_bits(position, char) & bits for position in positions}
+
+        # at_least[t] is the bitset of answers with at least t copies of the letter outside of the green positions.
+        at_least: List = [bits] + [0] * len(guess)
+        for position in range(len(guess)):
+            if position in greens:
+                continue
+            present: int = table.position_bits(position, char)
+            if not present & bits:
+                continue
+            for count in range(len(guess), 0, -1):
+                at_least[count] |= at_least[count - 1] & present
+
+        for position in positions:
+            yellow: int = at_least[1] & ~greens[position]
+            colours[position] = (greens[position], yellow)
+
+            # every yellow answer uses up one copy of the letter.
+            for count in range(1, len(guess)):
+                at_least[count] = (at_least[count] & ~yellow) | (at_least[count + 1] & yellow)
+            at_least[len(guess)] &= ~yellow
+
+    return colours
+
+
+def score_row(table: word_index.WordTable, guess: str) -> array:
+    """
+    Scores a guess against every word of a table at once.
+    :param table: WordTable containing the answers.
+    :param guess: String containing the word that was guessed, the same length as the words of the table.
+    :return: array of the feedback codes of the guess against each word in table order.
+    """
+    typecode: str = typecode_for(len(guess))
+    row: array = array(typecode)
+    count: int = len(table)
+
+    if not count:
+        return row
+
+    width: int = row.itemsize
+    zero_lane: bytes = b"\0" * width
+    one_lane: bytes = b"\0" * (width - 1) + b"\1"
+    flag_format: str = "0%db" % count
+    total: int = 0
+    weight: int = 1
+
+    for green, yellow in colour_bits(table, guess):
+        # digits of a position are 2 for green and 1 for yellow, spread into one big-endian lane per answer.
+        for digit_bits, multiple in ((green, GREEN * weight), (yellow, YELLOW * weight)):
+            if digit_bits:
+                lanes: bytes = format(digit_bits, flag_format).encode("ascii")
+                lanes = lanes.replace(b"0", zero_lane).replace(b"1", one_lane)
+                total += int.from_bytes(lanes, "big") * multiple
+        weight *= 3
+
+    row.frombytes(total.to_bytes(count * width, "big"))
+    if width > 1 and sys.byteorder == "little":
+        row.byteswap()
+
+    return row
+
+
+def matrix_path_for(file_path: str, length: int) -> str:
+    """
+    Works out where the feedback matrix of a dictionary and word length lives.
+    :param file_path: String containing the file path to the source dictionary.
+    :param length: Integer length of the words.
+    :return: String containing the file path to the feedback matrix.
+    """
+    return f"{file_path}.{length}{MATRIX_SUFFIX}"
+
+
+# the table used by each worker process while building a matrix.
+_worker_table: Optional[word_index.WordTable] = None
+
+
+def _initialise_worker(file_path: str, length: int):
+    global _worker_table
+    _worker_table = parse_dictionary.load_table(file_path, length)
+
+
+def _score_rows(start: int, stop: int) -> bytes:
+    return b"".join(score_row(_worker_table, _worker_table.words[index]).tobytes() for index in range(start, stop))
+
+
+def build_matrix(file_path: str, length: int, matrix_path: Optional[str] = None, workers: Optional[int] = None) -> str:
+    """
+    Scores every word of a given length in a dictionary against every other word and writes the codes to a matrix
+    file, one row per guess.  Rows are scored in chunks across a pool of worker processes and written out as they
+    finish, so only a few chunks are ever held in memory.
+    :param file_path: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param matrix_path: String containing the file path to write the matrix to, defaults to next to the dictionary.
+    :param workers: Integer number of worker processes, defaults to the number of CPUs.
+    :return: String containing the file path of the matrix that was written.
+    """
+    # imported here as starting up a process pool is only ever needed when building a matrix
+    from concurrent.futures import ProcessPoolExecutor
+
+    matrix_path = matrix_path or matrix_path_for(file_path, length)
+    count: int = len(parse_dictionary.load_words(file_path, length))
+    typecode: str = typecode_for(length)
+
+    header: Dict = {
+        "sha256": parse_dictionary.source_digest(file_path),
+        "length": length,
+        "count": count,
+        "typecode": typecode,
+        "byteorder": sys.byteorder
+    }
+
+    preamble: bytes = MATRIX_MAGIC + b" %d\n" % MATRIX_VERSION + json.dumps(header).encode("utf-8")
+    preamble += b" " * (-(len(preamble) + 1) % _ALIGNMENT) + b"\n"
+    row_size: int = count * array(typecode).itemsize
+
+    temporary_path: str = f"{matrix_path}.{os.getpid()}.tmp"
+
+    with open(temporary_path, "wb") as file, \
+            ProcessPoolExecutor(workers, initializer=_initialise_worker, initargs=(file_path, length)) as executor:
+        file.write(preamble)
+        file.truncate(len(preamble) + count * row_size)
+
+        chunks: List = [(start, min(start + _CHUNK_ROWS, count)) for start in range(0, count, _CHUNK_ROWS)]
+        in_flight: int = 2 * (workers or os.cpu_count() or 1)
+
+        for batch in range(0, len(chunks), in_flight):
+            pending: List = chunks[batch:batch + in_flight]
+            for (start, _), rows in zip(pending, executor.map(_score_rows, *zip(*pending))):
+                file.seek(len(preamble) + start * row_size)
+                file.write(rows)
+
+    os.replace(temporary_path, matrix_path)
+
+    return matrix_path
+
+
+class FeedbackMatrix:
+    """
+    A memory-mapped, read-only view of a feedback matrix, looking up the code of a guess against an answer is a single
+    index into the mapped array.
+    """
+
+    def __init__(self, matrix_path: str):
+        self.matrix_path: str = matrix_path
+
+        with open(matrix_path, "rb") as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic_end: int = self._buffer.find(b"\n")
+        header_end: int = self._buffer.find(b"\n", magic_end + 1)
+
+        if self._buffer[:magic_end] != MATRIX_MAGIC + b" %d" % MATRIX_VERSION or header_end == -1:
+            self._buffer.close()
+            raise InvalidMatrix(f"{matrix_path} is not a wordlepy feedback matrix of version {MATRIX_VERSION}!")
+
+        self.header: Dict = json.loads(self._buffer[magic_end + 1:header_end])
+
+        if self.header["byteorder"] != sys.byteorder:
+            self._buffer.close()
+            raise InvalidMatrix(f"{matrix_path} was built on a machine with a different byte order!")
+
+        self.count: int = self.header["count"]
+        self.length: int = self.header["length"]
+        self.codes: memoryview = memoryview(self._buffer)[header_end + 1:].cast(self.header["typecode"])
+
+    def code(self, guess_id: int, answer_id: int) -> int:
+        """
+        Looks up the feedback code of a guess against an answer.
+        :param guess_id: Integer id of the guess in the word table.
+        :param answer_id: Integer id of the answer in the word table.
+        :return: Integer code of the feedback.
+        """
+        return self.codes[guess_id * self.count + answer_id]
+
+    def row(self, guess_id: int) -> memoryview:
+        """
+        Fetches the feedback codes of a guess against every answer.
+        :param guess_id: Integer id of the guess in the word table.
+        :return: memoryview of the codes in table order.
+        """
+        return self.codes[guess_id * self.count:(guess_id + 1) * self.count]
+
+    def matching(self, guess_id: int, code: int, ids) -> List:
+        """
+        Narrows down a list of candidates to those that would have given a guess the same feedback.
+        :param guess_id: Integer id of the guess in the word table.
+        :param code: Integer code of the feedback that was given.
+        :param ids: Iterable of the ids of the candidates.
+        :return: List of the ids of the candidates that are still possible.
+        """
+        row: memoryview = self.row(guess_id)
+
+        return [answer_id for answer_id in ids if row[answer_id] == code]
+
+    def close(self):
+        self.codes.release()
+        self._buffer.close()
+
+
+def load_matrix(file_path: str, length: int, matrix_path: Optional[str] = None,
+                workers: Optional[int] = None) -> FeedbackMatrix:
+    """
+    Loads the feedback matrix of a dictionary and word length, building it first if it is missing or was built from a
+    different version of the dictionary.
+    :param file_path: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param matrix_path: String containing the file path of the matrix, defaults to next to the dictionary.
+    :param workers: Integer number of worker processes to build the matrix with, defaults to the number of CPUs.
+    :return: FeedbackMatrix of the dictionary.
+    """
+    matrix_path = matrix_path or matrix_path_for(file_path, length)
+    sha256: str = parse_dictionary.source_digest(file_path)
+
+    try:
+        matrix: Optional[FeedbackMatrix] = FeedbackMatrix(matrix_path)
+    except (OSError, ValueError, InvalidMatrix):
+        matrix = None
+
+    if matrix is not None and matrix.header["sha256"] == sha256 and matrix.length == length:
+        return matrix
+
+    if matrix is not None:
+        matrix.close()
+
+    return FeedbackMatrix(build_matrix(file_path, length, matrix_path, workers))
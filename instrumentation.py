@@ -0,0 +1,207 @@
+"""
+Opt-in instrumentation of the stages of a refine and of the tester's games, to find out where the time goes.
+
+Every instrumented stage produces a record, a dictionary of:
+
+* stage, the name of the stage,
+* seconds, the wall time it took,
+* allocated_bytes and peak_bytes, the memory it left allocated and the most it allocated at once, only when allocations
+  are being tracked as that slows everything down (the peak of a stage run inside another only counts from the start
+  of the inner stage),
+* candidates_in and candidates_out, the number of words it started and finished with, where that makes sense.
+
+Records are handed to every registered hook as soon as the stage finishes, so a metrics system can consume them:
+
+    instrumentation.add_hook(lambda record: metrics.timing(record["stage"], record["seconds"]))
+    instrumentation.enable()
+
+`Profile` is a hook that sums the records up by stage and prints them as a table, which is what `--profile` shows.
+Nothing is recorded until instrumentation is enabled.
+"""
+
+import functools
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, TextIO
+
+_hooks: List = []
+_enabled: bool = False
+_allocations: bool = False
+# whether `enable` started tracing allocations, tracing started by someone else is left running.
+_started_tracing: bool = False
+
+
+def enable(allocations: bool = False):
+    """
+    Starts recording stages.
+    :param allocations: Boolean, True to also track the memory allocated by each stage.
+    """
+    global _enabled, _allocations, _started_tracing
+    _enabled = True
+    _allocations = allocations
+
+    if allocations:
+        # imported here as tracing allocations is rarely wanted and the module is slow to import
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+
+
+def disable():
+    """
+    Stops recording stages.
+    """
+    global _enabled, _allocations, _started_tracing
+
+    if _started_tracing:
+        import tracemalloc
+
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    _enabled = False
+    _allocations = False
+    _started_tracing = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def add_hook(hook: Callable[[Dict], None]):
+    """
+    Registers a callable to be given the record of every stage as it finishes.
+    :param hook: Callable taking the record.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[Dict], None]):
+    """
+    Stops giving records to a callable registered with `add_hook`.
+    :param hook: Callable that was registered.
+    """
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def emit(record: Dict):
+    """
+    Hands a record to every registered hook, e.g. one recorded by a worker process.
+    :param record: Dictionary of the record.
+    """
+    for hook in list(_hooks):
+        hook(record)
+
+
+def instrumented(name: str, candidates_in: Optional[Callable] = None,
+                 candidates_out: Optional[Callable] = len) -> Callable:
+    """
+    Decorates a function so every call of it is recorded as a stage, while disabled the only cost is checking whether
+    instrumentation is enabled.
+    :param name: String containing the name of the stage.
+    :param candidates_in: Callable given the arguments of the call that returns the number of words it started with.
+    :param candidates_out: Callable given the result of the call that returns the number of words it finished with.
+    :return: Callable decorator.
+    """
+    def decorate(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            with stage(name, candidates_in(*args, **kwargs) if candidates_in else None) as record:
+                result = function(*args, **kwargs)
+                record["candidates_out"] = candidates_out(result) if candidates_out else None
+
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def stage(name: str, candidates_in: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Records a stage of work, the record is given to the hooks when the block finishes.  The block can set the
+    candidates_out of the record it is given.
+    :param name: String containing the name of the stage.
+    :param candidates_in: Integer number of words the stage started with.
+    :return: Iterator yielding the record of the stage.
+    """
+    record: Dict = {"stage": name, "candidates_in": candidates_in, "candidates_out": None}
+
+    if not _enabled:
+        yield record
+        return
+
+    if _allocations:
+        import tracemalloc
+
+        allocated_before: int = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    start: float = time.perf_counter()
+
+    yield record
+
+    record["seconds"] = time.perf_counter() - start
+
+    if _allocations:
+        allocated_after, peak = tracemalloc.get_traced_memory()
+        record["allocated_bytes"] = allocated_after - allocated_before
+        record["peak_bytes"] = peak - allocated_before
+
+    emit(record)
+
+
+def _format_count(count: Optional[int]) -> str:
+    return "-" if count is None else str(count)
+
+
+class Profile:
+    """
+    A hook that sums up the records of each stage.
+    """
+
+    def __init__(self):
+        self.stages: Dict = {}
+
+    def __call__(self, record: Dict):
+        totals: Dict = self.stages.setdefault(record["stage"], {
+            "calls": 0, "seconds": 0.0, "allocated_bytes": 0, "peak_bytes": 0, "candidates_in": None,
+            "candidates_out": None
+        })
+
+        totals["calls"] += 1
+        totals["seconds"] += record.get("seconds", 0.0)
+        totals["allocated_bytes"] += record.get("allocated_bytes", 0)
+        totals["peak_bytes"] = max(totals["peak_bytes"], record.get("peak_bytes", 0))
+        # stages that don't deal in words are left without counts rather than counted as none.
+        for count in ("candidates_in", "candidates_out"):
+            if record[count] is not None:
+                totals[count] = (totals[count] or 0) + record[count]
+
+    def table(self) -> str:
+        """
+        Formats the totals of each stage as a table, slowest stage first.
+        :return: String containing the table.
+        """
+        lines: List = [f"{'stage':<12} {'calls':>8} {'total ms':>12} {'mean ms':>10} {'alloc KiB':>11} "
+                       f"{'peak KiB':>10} {'words in':>12} {'words out':>12}"]
+
+        for name, totals in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(f"{name:<12} {totals['calls']:>8} {totals['seconds'] * 1000:>12.3f} "
+                         f"{totals['seconds'] * 1000 / totals['calls']:>10.3f} "
+                         f"{totals['allocated_bytes'] / 1024:>11.1f} {totals['peak_bytes'] / 1024:>10.1f} "
+                         f"{_format_count(totals['candidates_in']):>12} "
+                         f"{_format_count(totals['candidates_out']):>12}")
+
+        return "\n".join(lines)
+
+    def print(self, file: TextIO = sys.stderr):
+        print(self.table(), file=file)
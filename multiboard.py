@@ -0,0 +1,226 @@
+"""
+Solves several wordles at once, as in Quordle or Octordle, where every guess is played on every board.
+
+Each board keeps its own bitset of candidates over a single shared word table.  A guess is coloured against the union of
+the candidates of every board in one go, giving a green, yellow and grey bitset per position, and each board is then
+narrowed down by intersecting the bitsets its feedback picks out, so adding boards only adds a handful of big integer
+operations per guess.
+
+Guesses are chosen by the expected information they give summed over the boards that are still unsolved, boards with the
+same candidates are only scored once.
+"""
+
+import feedback
+import suggestions
+import word_index
+import wordlepy
+from collections import Counter
+from itertools import compress
+from typing import List, Optional, Sequence
+
+# the most guesses scored when choosing the next one, an evenly spread sample is scored when there are more.
+GUESS_POOL: int = 256
+
+# boards with fewer candidates than the table divided by this are scored by looking up their candidates one at a time,
+# rather than by scanning the whole row of codes.
+_SPARSE_FRACTION: int = 16
+
+
+class MultiBoardSession:
+    """
+    An incremental solver for several boards that share a dictionary and every guess.
+    """
+
+    def __init__(self, dictionary: str = wordlepy.DEFAULT_DICTIONARY, length: int = 5, boards: int = 4,
+                 table: Optional[word_index.WordTable] = None):
+        """
+        :param dictionary: String containing the file path to the dictionary to solve with.
+        :param length: Integer length of the words to be guessed.
+        :param boards: Integer number of boards.
+        :param table: WordTable to solve with, when given the dictionary isn't loaded.
+        :raises DictionaryNotFound: If the dictionary cannot be located using the path specified.
+        """
+        if table is None:
+            table = wordlepy.WordleSession(dictionary, length).table
+
+        self.table: word_index.WordTable = table
+        self.length: int = length
+        self.boards: int = boards
+        # each entry holds the candidates of every board and which boards are solved.
+        self._history: List = [([table.all_bits] * boards, [False] * boards)]
+
+    @property
+    def candidates(self) -> List:
+        """
+        The bitsets of the words still possible on each board.
+        """
+        return self._history[-1][0]
+
+    @property
+    def solved(self) -> List:
+        """
+        Whether each board has been solved.
+        """
+        return self._history[-1][1]
+
+    def remaining(self) -> List:
+        """
+        Counts the words still possible on each board.
+        :return: List of the number of candidates of each board, 0 once a board is solved.
+        """
+        return [0 if solved else word_index.popcount(bits) for bits, solved in zip(self.candidates, self.solved)]
+
+    def words(self, board: int, limit: Optional[int] = None) -> List:
+        """
+        Lists the words still possible on a board.
+        :param board: Integer index of the board.
+        :param limit: Integer number of words to stop after, defaults to every candidate.
+        :return: List of the candidate words, most common first if the dictionary has weights.
+        """
+        return [self.table.words[index] for index in self.table.ranked_ids(self.candidates[board], limit)]
+
+    def guess(self, word: str, feedbacks: Sequence[Optional[str]]) -> List:
+        """
+        Narrows down the candidates of every board using the colours the guess got on each of them.
+        :param word: String containing the word that was guessed.
+        :param feedbacks: Sequence with the colours of the guess on each board, g for green, y for yellow and - for
+        grey, None for boards that were already solved.
+        :return: List of the number of candidates left on each board.
+        :raises InvalidFeedback: If the number of feedbacks doesn't match the number of boards, the guess or a feedback
+        doesn't match the length of the words, or a feedback contains an unexpected character.
+        """
+        if len(feedbacks) != self.boards:
+            raise wordlepy.InvalidFeedback(f"Give feedback for all {self.boards} boards, None for solved ones!")
+
+        if len(word) != self.length:
+            raise wordlepy.InvalidFeedback(f"The guess must be {self.length} characters long!")
+
+        candidates: List = list(self.candidates)
+        solved: List = list(self.solved)
+        union: int = 0
+
+        for board, colours in enumerate(feedbacks):
+            if solved[board] or colours is None:
+                continue
+            if len(colours) != self.length or any(char not in feedback.FEEDBACK_CHARACTERS for char in colours):
+                raise wordlepy.InvalidFeedback(f"The feedback {colours} should be {self.length} of "
+                                               f"{feedback.FEEDBACK_CHARACTERS}!")
+            union |= candidates[board]
+
+        # every board is coloured by the same bitsets, worked out once over the candidates of all of them.
+        colour_bits: List = feedback.colour_bits(self.table, word, union)
+        by_colour: List = [{wordlepy.FEEDBACK_GREEN: green, wordlepy.FEEDBACK_YELLOW: yellow,
+                            wordlepy.FEEDBACK_GREY: union & ~(green | yellow)} for green, yellow in colour_bits]
+
+        for board, colours in enumerate(feedbacks):
+            if solved[board] or colours is None:
+                continue
+
+            if colours == wordlepy.FEEDBACK_GREEN * self.length:
+                solved[board] = True
+                continue
+
+            bits: int = candidates[board]
+            for position, char in enumerate(colours):
+                bits &= by_colour[position][char]
+                if not bits:
+                    break
+            candidates[board] = bits
+
+        self._history.append((candidates, solved))
+
+        return self.remaining()
+
+    def undo(self) -> List:
+        """
+        Forgets the most recent guess.
+        :return: List of the number of candidates left on each board.
+        """
+        if len(self._history) > 1:
+            self._history.pop()
+
+        return self.remaining()
+
+    def suggest(self, top: int = 10, matrix: Optional[feedback.FeedbackMatrix] = None) -> List:
+        """
+        Suggests the guesses expected to narrow down the unsolved boards the most.  A board with a single candidate
+        left is always guessed first, as that solves it for certain.  Otherwise guesses are ranked by the information
+        they give summed over the boards, then by how many boards they could solve, then alphabetically.
+        :param top: Integer number of guesses to return.
+        :param matrix: FeedbackMatrix of the table, when not given each guess is scored as it is ranked.
+        :return: List of the best guesses, best first.
+        """
+        groups: Counter = Counter(bits for bits, solved in zip(self.candidates, self.solved) if not solved and bits)
+
+        if not groups:
+            return []
+
+        certain: List = sorted(self.table.words[self.table.ids_of(bits)[0]] for bits in groups
+                               if word_index.popcount(bits) == 1)
+        if certain:
+            return certain[:top]
+
+        union: int = 0
+        for bits in groups:
+            union |= bits
+
+        pool_ids: List = self.table.ids_of(union)
+        if len(pool_ids) > GUESS_POOL:
+            pool_ids = [pool_ids[i * len(pool_ids) // GUESS_POOL] for i in range(GUESS_POOL)]
+
+        sparse_limit: int = len(self.table) // _SPARSE_FRACTION
+        boards: List = []
+        for bits, count in groups.items():
+            ids: List = self.table.ids_of(bits)
+            flags: Optional[bytes] = None if len(ids) < sparse_limit else suggestions.candidate_flags(self.table, bits)
+            boards.append((ids, flags, count, bits))
+
+        ranked: List = []
+        for guess_id in pool_ids:
+            guess: str = self.table.words[guess_id]
+            row = matrix.row(guess_id) if matrix is not None else feedback.score_row(self.table, guess)
+            information: float = 0.0
+            solvable: int = 0
+
+            for ids, flags, count, bits in boards:
+                codes = compress(row, flags) if flags is not None else (row[answer_id] for answer_id in ids)
+                information += count * suggestions.information(Counter(codes).values())
+                if bits >> (len(self.table) - 1 - guess_id) & 1:
+                    solvable += count
+
+            ranked.append((-information, -solvable, guess))
+
+        ranked.sort()
+
+        return [guess for _, _, guess in ranked[:top]]
+
+
+def play(session: MultiBoardSession, answers: Sequence[str], max_guesses: Optional[int] = None,
+         matrix: Optional[feedback.FeedbackMatrix] = None) -> int:
+    """
+    Plays a game against a set of answers, one per board, always making the top suggestion.
+    :param session: MultiBoardSession to play with, it is narrowed down as the game goes on.
+    :param answers: Sequence of the answer of each board.
+    :param max_guesses: Integer number of guesses to give up after, defaults to playing until every board is solved.
+    :param matrix: FeedbackMatrix of the table, used to score suggestions if given.
+    :return: Integer number of guesses made.
+    :raises ValueError: If an unsolved board has no candidates left, e.g. its answer isn't a word of the dictionary.
+    """
+    guesses: int = 0
+
+    while not all(session.solved) and (max_guesses is None or guesses < max_guesses):
+        suggested: List = session.suggest(1, matrix)
+
+        if not suggested:
+            # only boards with candidates are suggested for, so every unsolved board has run out of them.
+            boards: List = [str(board) for board, solved in enumerate(session.solved) if not solved]
+            raise ValueError(f"No words are left on board(s) {', '.join(boards)}, their answers aren't in the "
+                             f"dictionary!")
+
+        guess: str = suggested[0]
+        guesses += 1
+        codes: List = feedback.score_pairs([guess] * len(answers), answers)
+        session.guess(guess, [None if solved else feedback.to_string(code, session.length)
+                              for code, solved in zip(codes, session.solved)])
+
+    return guesses
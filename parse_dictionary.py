@@ -1,9 +1,77 @@
 """
 Load the local dictionary and perform any culling of words that can't be used etc.
+
+Dictionaries can be JSON objects like the Webster's dictionary, JSON arrays, JSON lines or plain word lists, any of them
+gzip or xz compressed (see `iter_words`).  Parsing a full dictionary is slow, so the first time a dictionary is used it
+is compiled into a compact binary index stored alongside it (see `build_index`).  The index holds the sorted words of
+every length in their own block, as fixed-width rows of alphabet indexes, followed by the letter mask column and the
+weights, if any, of those words, and is memory-mapped when loaded.  It is rebuilt automatically whenever the source
+dictionary changes.
 """
 
+import codecs
+import io
 import json
-from typing import Dict, List, Optional, Pattern, Set
+import mmap
+import os
+import re
+import sys
+import time
+import instrumentation
+import word_index
+from array import array
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Pattern, Sequence
+
+INDEX_SUFFIX: str = ".wpidx"
+INDEX_MAGIC: bytes = b"WPIDX"
+INDEX_VERSION: int = 5
+
+# size of the chunks dictionaries are streamed in.
+_CHUNK_SIZE: int = 1 << 20
+
+# formats a dictionary can be in, see `detect_format`.
+FORMATS: tuple = ("json", "json-array", "jsonl", "words")
+
+# fields of a JSON entry that can hold the weight of a word, saying how common it is, in order of preference.
+WEIGHT_FIELDS: tuple = ("frequency", "count", "weight")
+
+# unicode normalisation form every word is put into, so the same word typed differently is only indexed once.
+NORMALIZATION: str = "NFC"
+
+_GZIP_MAGIC: bytes = b"\x1f\x8b"
+_XZ_MAGIC: bytes = b"\xfd7zXZ\x00"
+_COMPRESSED_SUFFIXES: tuple = (".gz", ".xz")
+
+# bytes looked at to tell the format of a dictionary from how it starts.
+_FORMAT_PEEK_BYTES: int = 4096
+
+_WHITESPACE: Pattern = re.compile(r"[ \t\n\r]*")
+_STRING: Pattern = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"')
+_KEY: Pattern = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:')
+
+# bytes first read of an index to find its header, more are read if the header is longer.
+_PREAMBLE_BYTES: int = 1 << 16
+
+# byte alignment of each block within the index, enough for the letter mask column.
+_ALIGNMENT: int = 8
+
+# indexes that have already been opened by this process, keyed by the path of the index file.
+_LOADED_INDEXES: Dict = {}
+
+# indexes this process couldn't write, keyed by the path of the index file, with the size and modification time of the
+# dictionary when it tried and the error, so it isn't tried again until the dictionary changes.
+_BUILD_FAILURES: Dict = {}
+
+# dictionaries parsed directly as their index couldn't be written, keyed by their path, with their size and
+# modification time when they were parsed, their digest, the words and weights of every length they hold and the tables
+# built from those so far.
+_INGESTED: Dict = {}
+
+
+class StaleIndex(Exception):
+    pass
+
 
 def parse_json(file_path: str) -> Dict:
     """
@@ -21,24 +89,786 @@ def parse_json(file_path: str) -> Dict:
             raise ValueError("Could not parse dictionary, it is probably not in the right format!")
 
     return english_dictionary
-    
-    
-   
-    
 
+
+class _HashingReader(io.RawIOBase):
+    """
+    Feeds the raw bytes of a file into a digest as they are read, so a compressed dictionary is hashed as it is on disk
+    while it is being decompressed.
+    """
+
+    def __init__(self, file: BinaryIO, digest=None):
+        self._file: BinaryIO = file
+        self._digest = digest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count: int = self._file.readinto(buffer)
+        if self._digest is not None and count:
+            self._digest.update(memoryview(buffer)[:count])
+        return count
+
+
+@contextmanager
+def open_source(file_path: str, digest=None) -> Iterator[BinaryIO]:
+    """
+    Opens a dictionary for reading, decompressing it on the fly if it is gzip or xz compressed.
+    :param file_path: String containing the file path to the dictionary.
+    :param digest: hashlib object to feed the raw bytes of the file into as they are read, if any.  The whole file is
+    hashed even if the reader stops early.
+    :return: Iterator yielding the binary stream of the decompressed dictionary.
+    """
+    with open(file_path, "rb") as file:
+        raw: io.BufferedReader = io.BufferedReader(_HashingReader(file, digest), _CHUNK_SIZE)
+        magic: bytes = raw.peek(len(_XZ_MAGIC))[:len(_XZ_MAGIC)]
+        stream: BinaryIO = raw
+
+        # imported here as most dictionaries aren't compressed
+        if magic.startswith(_GZIP_MAGIC):
+            import gzip
+            stream = gzip.GzipFile(fileobj=raw)
+        elif magic.startswith(_XZ_MAGIC):
+            import lzma
+            stream = lzma.LZMAFile(raw)
+
+        try:
+            yield stream
+        finally:
+            if digest is not None:
+                while raw.read(_CHUNK_SIZE):
+                    pass
+
+
+def detect_format(file_path: str, head: bytes) -> str:
+    """
+    Works out the format of a dictionary from its extension, ignoring any compression extension, and from how it
+    starts.
+    :param file_path: String containing the file path to the dictionary.
+    :param head: bytes the decompressed dictionary starts with.
+    :return: String containing one of `FORMATS`.
+    """
+    name: str = file_path.lower()
+
+    for suffix in _COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+
+    extension: str = os.path.splitext(name)[1]
+    first: str = head.decode("utf-8", "ignore").lstrip("\ufeff \t\r\n")[:1]
+
+    if extension in (".jsonl", ".ndjson") or first == '"':
+        return "jsonl"
+
+    if first == "{":
+        return "json"
+
+    if first == "[":
+        return "json-array"
+
+    return "words"
+
+
+def iter_json_keys(file_path: str, digest=None, chunk_size: int = _CHUNK_SIZE) -> Iterator:
+    """
+    Streams the keys of a JSON object out of a file one at a time without ever loading the values, so a dictionary of
+    any size can be read in bounded memory.  Only a chunk of the file, plus the value being skipped over, is held at
+    once.
+    :param file_path: String containing the file path to the dictionary you wish to parse.
+    :param digest: hashlib object to feed the raw bytes of the file into as they are read, if any.
+    :param chunk_size: Integer number of bytes to read at a time.
+    :return: Iterator of the keys of the top level object, in file order.
+    :raises: ValueError if the file isn't a JSON object.
+    """
+    with open_source(file_path, digest) as file:
+        for key, _ in _iter_object_entries(file, chunk_size):
+            yield key
+
+
+def _iter_object_entries(file: BinaryIO, chunk_size: int = _CHUNK_SIZE) -> Iterator:
+    """
+    Streams the keys of the JSON object read from a binary stream, see `iter_json_keys`, along with the weight held by
+    their value if it is a number or an object with a weight field.  String values are skipped over without being
+    decoded.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    value_decoder: json.JSONDecoder = json.JSONDecoder()
+    buffer: str = ""
+    position: int = 0
+    finished: bool = False
+    started: bool = False
+
+    while True:
+        if position > chunk_size:
+            # drop what has already been consumed so the buffer stays around the size of a chunk.
+            buffer, position = buffer[position:], 0
+
+        position = _WHITESPACE.match(buffer, position).end()
+        token: Optional[str] = None
+
+        if not started:
+            if position < len(buffer):
+                if buffer[position] != "{":
+                    raise ValueError("Could not parse dictionary, it is probably not in the right format!")
+                started, position = True, position + 1
+                continue
+        elif position < len(buffer) and buffer[position] in ",}":
+            if buffer[position] == "}":
+                return
+            position += 1
+            continue
+        else:
+            key = _KEY.match(buffer, position)
+            if key is not None:
+                value_start: int = _WHITESPACE.match(buffer, key.end()).end()
+                if value_start < len(buffer):
+                    weight: Optional[float] = None
+                    if buffer[value_start] == '"':
+                        value = _STRING.match(buffer, value_start)
+                        value_end: Optional[int] = value.end() if value is not None else None
+                    else:
+                        try:
+                            decoded, value_end = value_decoder.raw_decode(buffer, value_start)
+                            weight = _weight_of(decoded)
+                        except ValueError:
+                            value_end = None
+                        # a number or literal could carry on into the next chunk, so wait for what follows it.
+                        if value_end is not None and not finished:
+                            following: int = _WHITESPACE.match(buffer, value_end).end()
+                            if following == len(buffer) or buffer[following] not in ",}":
+                                value_end = None
+
+                    if value_end is not None:
+                        token = key.group(1)
+                        position = value_end
+
+        if token is not None:
+            yield json.loads(f'"{token}"') if "\\" in token else token, weight
+            continue
+
+        if finished:
+            raise ValueError("Could not parse dictionary, it is probably not in the right format!")
+
+        chunk: bytes = file.read(chunk_size)
+        buffer += decoder.decode(chunk, final=not chunk)
+        finished = not chunk
+
+
+def _weight_of(value) -> Optional[float]:
+    # a weight is either the value itself or held by one of the weight fields of an object.
+    if isinstance(value, dict):
+        value = next((value[field] for field in WEIGHT_FIELDS if field in value), None)
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+
+    return None
+
+
+def _entry_of(value) -> Optional[tuple]:
+    # an entry of a JSON array or line is either the word itself or an object with the word under "word".
+    if isinstance(value, str):
+        return value, None
+
+    if isinstance(value, dict) and isinstance(value.get("word"), str):
+        return value["word"], _weight_of(value)
+
+    return None
+
+
+def _iter_lines(file: BinaryIO) -> Iterator:
+    text: io.TextIOWrapper = io.TextIOWrapper(file, encoding="utf-8-sig")
+
+    try:
+        yield from text
+    finally:
+        # detached so the stream is left open for `open_source` to finish hashing.
+        text.detach()
+
+
+def _iter_json_array(file: BinaryIO, chunk_size: int = _CHUNK_SIZE) -> Iterator:
+    """
+    Streams the entries of the JSON array read from a binary stream one element at a time, in the same way as
+    `_iter_object_entries`, so only a chunk of the file, plus the element being decoded, is held at once.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    value_decoder: json.JSONDecoder = json.JSONDecoder()
+    buffer: str = ""
+    position: int = 0
+    finished: bool = False
+    started: bool = False
+
+    while True:
+        if position > chunk_size:
+            # drop what has already been consumed so the buffer stays around the size of a chunk.
+            buffer, position = buffer[position:], 0
+
+        position = _WHITESPACE.match(buffer, position).end()
+        value_end: Optional[int] = None
+
+        if not started:
+            if position < len(buffer):
+                if buffer[position] != "[":
+                    raise ValueError("Could not parse dictionary, it is probably not in the right format!")
+                started, position = True, position + 1
+                continue
+        elif position < len(buffer) and buffer[position] in ",]":
+            if buffer[position] == "]":
+                return
+            position += 1
+            continue
+        elif position < len(buffer):
+            try:
+                value, value_end = value_decoder.raw_decode(buffer, position)
+            except ValueError:
+                value_end = None
+            # a number or literal could carry on into the next chunk, so wait for what follows it.
+            if value_end is not None and not finished:
+                following: int = _WHITESPACE.match(buffer, value_end).end()
+                if following == len(buffer) or buffer[following] not in ",]":
+                    value_end = None
+
+        if value_end is not None:
+            position = value_end
+            entry: Optional[tuple] = _entry_of(value)
+            if entry is not None:
+                yield entry
+            continue
+
+        if finished:
+            raise ValueError("Could not parse dictionary, it is probably not in the right format!")
+
+        chunk: bytes = file.read(chunk_size)
+        buffer += decoder.decode(chunk, final=not chunk)
+        finished = not chunk
+
+
+def _iter_json_lines(file: BinaryIO) -> Iterator:
+    for number, line in enumerate(_iter_lines(file), 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            entry: Optional[tuple] = _entry_of(json.loads(line))
+        except ValueError:
+            raise ValueError(f"Could not parse line {number} of the dictionary, it is probably not in the right format!")
+
+        if entry is not None:
+            yield entry
+
+
+def _iter_word_list(file: BinaryIO) -> Iterator:
+    # the first column of each line is the word and a number in the second column is its weight, e.g. a count.
+    for line in _iter_lines(file):
+        fields: List = line.split(None, 2)
+        if not fields or fields[0].startswith("#"):
+            continue
+
+        weight: Optional[float] = None
+        if len(fields) > 1:
+            try:
+                weight = float(fields[1])
+            except ValueError:
+                # anything else after the word means the entry is several words e.g. "new york", which is never
+                # playable, rather than a word to cut short.
+                continue
+
+        yield fields[0], weight
+
+
+def iter_words(file_path: str, digest=None) -> Iterator:
+    """
+    Streams the entries of a dictionary in any of the supported formats, decompressing it on the fly if needed:
+
+    * json, an object with the words as keys, like the Webster's dictionary, the value is the weight of the word if it
+      is a number,
+    * json-array, an array of words,
+    * jsonl, a JSON value per line, either the word or an object holding it under "word",
+    * words, a plain list with a word per line, optionally followed by its weight, lines starting with # and lines holding
+      several words are ignored.
+
+    Words in an array or on a line can also be given as an object holding the word under "word" and its weight under
+    one of `WEIGHT_FIELDS`.  The weight of a word says how common it is, candidates are listed most common first.
+    :param file_path: String containing the file path to the dictionary.
+    :param digest: hashlib object to feed the raw bytes of the file into as they are read, if any.
+    :return: Iterator of (word, weight) tuples in file order, before any normalisation or filtering, the weight is None
+    for words without one.
+    :raises: ValueError if the dictionary cannot be parsed.
+    """
+    with open_source(file_path, digest) as file:
+        dictionary_format: str = detect_format(file_path, file.peek(_FORMAT_PEEK_BYTES))
+
+        if dictionary_format == "json":
+            yield from _iter_object_entries(file)
+        elif dictionary_format == "json-array":
+            yield from _iter_json_array(file)
+        elif dictionary_format == "jsonl":
+            yield from _iter_json_lines(file)
+        else:
+            yield from _iter_word_list(file)
+
+
+def ingest(file_path: str) -> tuple:
+    """
+    Streams the playable words out of a dictionary, in any of the formats read by `iter_words`, grouped by length in a
+    single pass, keeping track of how long it took and how much memory it needed.  Words are put into the same unicode
+    normalisation form before being checked, so duplicates that only differ in how their accents are encoded are
+    dropped, keeping the highest weight given to any of them.
+    :param file_path: String containing the file path to the dictionary you wish to parse.
+    :return: Tuple of a dictionary keyed by length of dictionaries mapping each word to its weight, None for words
+    without one, the hex SHA-256 digest of the file, and a dictionary of statistics about the ingestion.
+    :raises: ValueError if the dictionary cannot be parsed.
+    """
+    # imported here as hashing and normalising are only needed when (re)building an index, not when loading one
+    import hashlib
+    import unicodedata
+
+    digest = hashlib.sha256()
+    words_by_length: Dict = {}
+    entries: int = 0
+    weighted: int = 0
+    start: float = time.perf_counter()
+
+    for key, weight in iter_words(file_path, digest):
+        entries += 1
+        if not unicodedata.is_normalized(NORMALIZATION, key):
+            key = unicodedata.normalize(NORMALIZATION, key)
+        if not _is_playable(key):
+            continue
+
+        words: Dict = words_by_length.setdefault(len(key), {})
+        if weight is None:
+            words.setdefault(key, None)
+        else:
+            weighted += 1
+            if words.get(key) is None or weight > words[key]:
+                words[key] = weight
+
+    elapsed: float = time.perf_counter() - start
+    size: int = os.path.getsize(file_path)
+
+    stats: Dict = {
+        "entries": entries,
+        "words": sum(len(words) for words in words_by_length.values()),
+        "weighted": weighted,
+        "bytes": size,
+        "seconds": elapsed,
+        "bytes_per_second": size / elapsed if elapsed else 0.0,
+        "peak_rss_bytes": peak_rss()
+    }
+
+    return words_by_length, digest.hexdigest(), stats
+
+
+def peak_rss() -> int:
+    """
+    Fetches the most memory the process has held at once.
+    :return: Integer peak resident set size of the process in bytes.
+    """
+    import resource
+
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # linux reports the peak in kilobytes, macOS in bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _is_playable(word: str) -> bool:
+    """
+    Checks whether a dictionary entry could ever appear in a wordle.
+    :param word: String containing the dictionary entry.
+    :return: True if the entry only contains alphabetic characters; False if it doesn't.
+    """
+    return word.isalpha()
+
+
+def _file_digest(file_path: str) -> str:
+    """
+    Calculates the SHA-256 digest of a file without reading it into memory all at once.
+    :param file_path: String containing the file path of the file to hash.
+    :return: String containing the hex digest of the file.
+    """
+    import hashlib
+
+    digest = hashlib.sha256()
+
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def index_path_for(file_path: str) -> str:
+    """
+    Works out where the compiled index of a dictionary lives.
+    :param file_path: String containing the file path to the source dictionary.
+    :return: String containing the file path to the index of that dictionary.
+    """
+    return file_path + INDEX_SUFFIX
+
+
+def _read_preamble(view: memoryview) -> bytes:
+    # the magic line and the header are the first two lines of an index, read enough of it to hold both.
+    size: int = _PREAMBLE_BYTES
+
+    while True:
+        preamble: bytes = bytes(view[:size])
+        if preamble.count(b"\n") >= 2 or size >= len(view):
+            return preamble
+        size *= 4
+
+
+class DictionaryIndex:
+    """
+    A memory-mapped, read-only view of a compiled dictionary index.  Words are grouped into one block per length, which
+    is viewed as a word store without being copied.  Every process mapping the same index shares its pages through
+    the page cache.
+    """
+
+    def __init__(self, index_path: str):
+        """
+        :param index_path: String containing the file path to the index.
+        :raises StaleIndex: If the index is of another version or was built on a machine with a different byte order.
+        """
+        self.index_path: str = index_path
+
+        with open(index_path, "rb") as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        preamble: bytes = _read_preamble(memoryview(self._buffer))
+        magic_end: int = preamble.find(b"\n")
+        header_end: int = preamble.find(b"\n", magic_end + 1)
+
+        if preamble[:magic_end] != INDEX_MAGIC + b" %d" % INDEX_VERSION or header_end == -1:
+            self._buffer.close()
+            raise StaleIndex(f"{index_path} is not a wordlepy index of version {INDEX_VERSION}!")
+
+        self.header: Dict = json.loads(preamble[magic_end + 1:header_end])
+        self._payload_offset: int = header_end + 1
+        self._words: Dict = {}
+        self._tables: Dict = {}
+        # size and modification time of the source dictionary last found to still hash to the digest in the header.
+        self._verified: tuple = (self.header["source"]["size"], self.header["source"]["mtime_ns"])
+
+        if self.header["byteorder"] != sys.byteorder:
+            self._buffer.close()
+            raise StaleIndex(f"{index_path} was built on a machine with a different byte order!")
+
+    def lengths(self) -> List:
+        """
+        Lists the word lengths held in the index.
+        :return: List of integers of every word length that has at least one word.
+        """
+        return sorted(int(length) for length in self.header["lengths"])
+
+    def words(self, length: int) -> Sequence:
+        """
+        Fetches every word of a given length from the index.
+        :param length: Integer length of the words to fetch.
+        :return: WordStore of the words of that length in sorted order, a list for alphabets too large to store as rows
+        and empty if there aren't any.
+        """
+        if length not in self._words:
+            block: Optional[Dict] = self.header["lengths"].get(str(length))
+
+            if block is None:
+                self._words[length] = []
+            elif block["rows"] is not None:
+                offset, size = block["rows"][0] + self._payload_offset, block["rows"][1]
+                self._words[length] = word_index.WordStore(memoryview(self._buffer)[offset:offset + size],
+                                                           block["alphabet"], length)
+            else:
+                offset, size = block["words"][0] + self._payload_offset, block["words"][1]
+                self._words[length] = str(memoryview(self._buffer)[offset:offset + size], "utf-8").split("\n")
+
+        return self._words[length]
+
+    def table(self, length: int) -> word_index.WordTable:
+        """
+        Fetches the words of a given length along with their letter masks and weights, these are read straight from
+        the memory-mapped index rather than being copied.
+        :param length: Integer length of the words to fetch.
+        :return: WordTable of the words of that length.
+        """
+        if length not in self._tables:
+            block: Optional[Dict] = self.header["lengths"].get(str(length))
+
+            if block is None:
+                self._tables[length] = word_index.WordTable([], "")
+            else:
+                view: memoryview = memoryview(self._buffer)
+                masks: Optional[memoryview] = None
+                weights: Optional[memoryview] = None
+
+                if block["masks"] is not None:
+                    offset, size = block["masks"][0] + self._payload_offset, block["masks"][1]
+                    masks = view[offset:offset + size].cast(word_index.MASK_TYPECODE)
+
+                if block["weights"] is not None:
+                    offset, size = block["weights"][0] + self._payload_offset, block["weights"][1]
+                    weights = view[offset:offset + size].cast(word_index.WEIGHT_TYPECODE)
+
+                # the letter columns are strided views onto the rows of the word store.
+                self._tables[length] = word_index.WordTable(self.words(length), block["alphabet"], masks,
+                                                            weights=weights)
+                self._tables[length].source = (self.index_path, length, self.header["source"]["sha256"])
+
+        return self._tables[length]
+
+    def is_fresh(self, file_path: str) -> bool:
+        """
+        Checks the index still describes the source dictionary.  The modification time and size are compared first as
+        they are cheap, the content hash is only recalculated when the modification time has moved on its own, and then
+        only once for each modification time.
+        :param file_path: String containing the file path to the source dictionary.
+        :return: True if the index can be used; False if it needs rebuilding.
+        """
+        source: Dict = self.header["source"]
+        stat: os.stat_result = os.stat(file_path)
+
+        if stat.st_size != source["size"]:
+            return False
+
+        if stat.st_mtime_ns in (source["mtime_ns"], self._verified[1]):
+            return True
+
+        if _file_digest(file_path) != source["sha256"]:
+            return False
+
+        # e.g. the dictionary was touched or copied, the content is unchanged so remember not to hash it again.
+        self._verified = (stat.st_size, stat.st_mtime_ns)
+
+        return True
+
+    def close(self):
+        # the tables and word stores are views onto the buffer and have to be let go of before it can be closed.
+        for table in self._tables.values():
+            table.close()
+        for words in self._words.values():
+            if isinstance(words, word_index.WordStore):
+                words.close()
+        self._tables.clear()
+        self._words.clear()
+        self._buffer.close()
+
+
+def build_index(file_path: str, index_path: Optional[str] = None) -> str:
+    """
+    Compiles a dictionary into a binary index that can be memory-mapped by `load_index`.  This is the one-off cost of
+    using a dictionary, the index is written to a temporary file first so readers never see a half written index.
+    :param file_path: String containing the file path to the dictionary you wish to compile.
+    :param index_path: String containing the file path to write the index to, defaults to next to the dictionary.
+    :return: String containing the file path of the index that was written.
+    :raises: ValueError if the dictionary cannot be parsed.
+    """
+    index_path = index_path or index_path_for(file_path)
+    stat: os.stat_result = os.stat(file_path)
+    words_by_length, digest, stats = ingest(file_path)
+
+    lengths: Dict = {}
+    blocks: List = []
+    offset: int = 0
+
+    for length in sorted(words_by_length):
+        words: List = sorted(words_by_length[length])
+        alphabet: str = word_index.alphabet_of(words)
+        store: Optional[word_index.WordStore] = word_index.WordStore.from_words(words, alphabet)
+        lengths[str(length)] = {"count": len(words), "alphabet": alphabet, "rows": None, "words": None, "masks": None,
+                                "weights": None}
+
+        if store is not None:
+            block: bytes = store.rows.tobytes()
+            lengths[str(length)]["rows"] = [offset, len(block)]
+        else:
+            # too many distinct characters to index with a byte, so the words are kept as text.
+            block = "\n".join(words).encode("utf-8")
+            lengths[str(length)]["words"] = [offset, len(block)]
+
+        # pad the words so the mask column that follows is aligned to its item size.
+        block += b"\0" * (-len(block) % _ALIGNMENT)
+        blocks.append(block)
+        offset += len(block)
+
+        masks = word_index.build_masks(words, alphabet)
+        if isinstance(masks, array):
+            lengths[str(length)]["masks"] = [offset, len(masks) * masks.itemsize]
+            blocks.append(masks.tobytes())
+            offset += len(masks) * masks.itemsize
+
+        # weights are only stored for lengths where the dictionary gave at least one, words without one weigh nothing.
+        weights: Dict = words_by_length[length]
+        if any(weight is not None for weight in weights.values()):
+            column: array = array(word_index.WEIGHT_TYPECODE, [weights[word] or 0.0 for word in words])
+            lengths[str(length)]["weights"] = [offset, len(column) * column.itemsize]
+            blocks.append(column.tobytes())
+            offset += len(column) * column.itemsize
+
+    header: Dict = {
+        "source": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest},
+        "byteorder": sys.byteorder,
+        "ingest": stats,
+        "lengths": lengths
+    }
+
+    preamble: bytes = INDEX_MAGIC + b" %d\n" % INDEX_VERSION + json.dumps(header).encode("utf-8")
+    # pad the header with white space so the payload starts on an aligned offset too.
+    preamble += b" " * (-(len(preamble) + 1) % _ALIGNMENT) + b"\n"
+
+    temporary_path: str = f"{index_path}.{os.getpid()}.tmp"
+
+    try:
+        with open(temporary_path, "wb") as file:
+            file.write(preamble)
+            for block in blocks:
+                file.write(block)
+
+        os.replace(temporary_path, index_path)
+    except BaseException:
+        # e.g. the disk filled up part way through, don't leave the half written index behind.
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    return index_path
+
+
+def load_index(file_path: str, index_path: Optional[str] = None) -> DictionaryIndex:
+    """
+    Loads the compiled index of a dictionary, (re)building it first if it is missing or out of date.  Indexes are kept
+    open for the life of the process so repeated calls only cost a stat of the source dictionary.
+    :param file_path: String containing the file path to the dictionary you wish to load.
+    :param index_path: String containing the file path of the index, defaults to next to the dictionary.
+    :return: DictionaryIndex of the dictionary.
+    :raises: ValueError if the dictionary needs compiling and cannot be parsed.
+    :raises: OSError if the dictionary needs compiling and the index cannot be written, which is only tried again once
+    the dictionary changes.
+    """
+    index_path = index_path or index_path_for(file_path)
+    index: Optional[DictionaryIndex] = _LOADED_INDEXES.get(index_path)
+
+    if index is not None and index.is_fresh(file_path):
+        return index
+
+    if index is not None:
+        # tables handed out by the stale index may still be in use, so leave closing it to the garbage collector.
+        del _LOADED_INDEXES[index_path]
+
+    try:
+        index = DictionaryIndex(index_path)
+    except (OSError, ValueError, StaleIndex):
+        index = None
+
+    if index is None or not index.is_fresh(file_path):
+        if index is not None:
+            index.close()
+        index = DictionaryIndex(_build_once(file_path, index_path))
+
+    _LOADED_INDEXES[index_path] = index
+
+    return index
+
+
+def _build_once(file_path: str, index_path: str) -> str:
+    stat: os.stat_result = os.stat(file_path)
+    version: tuple = (stat.st_size, stat.st_mtime_ns)
+    failure: Optional[tuple] = _BUILD_FAILURES.get(index_path)
+
+    if failure is not None and failure[0] == version:
+        raise failure[1].with_traceback(None)
+
+    try:
+        return build_index(file_path, index_path)
+    except OSError as error:
+        _BUILD_FAILURES[index_path] = (version, error)
+        raise
+
+
+def _parsed(file_path: str) -> Dict:
+    stat: os.stat_result = os.stat(file_path)
+    version: tuple = (stat.st_size, stat.st_mtime_ns)
+
+    if file_path not in _INGESTED or _INGESTED[file_path]["version"] != version:
+        words_by_length, digest, _ = ingest(file_path)
+        _INGESTED[file_path] = {"version": version, "sha256": digest, "words": words_by_length, "tables": {}}
+
+    return _INGESTED[file_path]
+
+
+def _parsed_table(file_path: str, length: int) -> word_index.WordTable:
+    # the same table `DictionaryIndex.table` reads from an index, weights included, built from the parsed dictionary.
+    parsed: Dict = _parsed(file_path)
+
+    if length not in parsed["tables"]:
+        weights: Dict = parsed["words"].get(length, {})
+        words: List = sorted(weights)
+        column: Optional[array] = None
+        if any(weight is not None for weight in weights.values()):
+            column = array(word_index.WEIGHT_TYPECODE, [weights[word] or 0.0 for word in words])
+        parsed["tables"][length] = word_index.WordTable(word_index.WordStore.from_words(words) or words,
+                                                        weights=column)
+
+    return parsed["tables"][length]
+
+
+def source_digest(file_path: str) -> str:
+    """
+    Fetches the SHA-256 digest of a dictionary, from its index when it has one, otherwise from parsing it directly.
+    :param file_path: String containing the file path to the dictionary.
+    :return: String containing the hex digest of the dictionary.
+    :raises: ValueError if the dictionary cannot be parsed.
+    """
+    try:
+        return load_index(file_path).header["source"]["sha256"]
+    except OSError:
+        return _parsed(file_path)["sha256"]
+
+
+def load_words(file_path: str, length: int) -> Sequence:
+    """
+    Fetches the playable words of a given length from a dictionary via its compiled index.
+    :param file_path: String containing the file path to the dictionary you wish to load.
+    :param length: Integer length of the words to fetch.
+    :return: WordStore, or list for very large alphabets, of the words of that length in sorted order.
+    :raises: ValueError if the dictionary cannot be parsed.
+    """
+    try:
+        return load_index(file_path).words(length)
+    except OSError:
+        # the index couldn't be written next to the dictionary e.g. a read-only location, so parse it directly, once.
+        return _parsed_table(file_path, length).words
+
+
+@instrumentation.instrumented("load")
+def load_table(file_path: str, length: int) -> word_index.WordTable:
+    """
+    Fetches the playable words of a given length from a dictionary via its compiled index, along with their letter masks.
+    :param file_path: String containing the file path to the dictionary you wish to load.
+    :param length: Integer length of the words to fetch.
+    :return: WordTable of the words of that length in sorted order.
+    :raises: ValueError if the dictionary cannot be parsed.
+    """
+    try:
+        return load_index(file_path).table(length)
+    except OSError:
+        # parsed directly, as in `load_words`, with the weights kept so candidates are ranked the same either way.
+        return _parsed_table(file_path, length)
+
+
+@instrumentation.instrumented("parse")
 def parse(path, length):
     """
     Parse the defined dictionary JSON file and return the parsed state
     """
-    
+
     try:
-        parsed_dictionary = parse_json(path)
+        words: Sequence = load_words(path, length)
     except ValueError as error:
         raise error
-                
-    # this dictionary contains some invalid entries containing white space and other non-alphabetic characters that
-    # won't ever appear in a wordle; the below will filter those out using the isalpha() conditional.
-    pre_filtered_words: Dict = {key for key in parsed_dictionary.keys() if len(key) == length and key.isalpha()}
-        
-    return pre_filtered_words
 
+    # the index only holds entries that pass the isalpha() conditional, this dictionary contains some invalid entries
+    # containing white space and other non-alphabetic characters that won't ever appear in a wordle.  The words are
+    # already sorted and unique, and looking one up in the store is a binary search, so there's no need for a set.
+    return words
@@ -0,0 +1,229 @@
+"""
+Remembers the candidates matching a set of constraints, so players that reach the same knowledge state, e.g. after the
+same opening guess, don't pay for filtering the dictionary again.
+
+Entries are keyed by the dictionary, the word length and the canonical key of the constraints, so the same filters given
+in a different order share an entry.  The cache keeps the most recently used entries in memory, up to a total size in
+bytes as the bitset of a large dictionary is far bigger than that of a small one.  It can also keep every entry in a
+SQLite database on disk, which survives between runs and can be read and written by several processes at once, each
+process opens its own connection to it, including the worker processes forked from one that already had it open.  A
+cache can be used by several threads at once, e.g. those of the threaded query server.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# the most bytes of candidate bitsets kept in memory, the least recently used are dropped first.
+REFINE_CACHE_BYTES: int = 64 << 20
+
+# seconds a process waits for another to finish writing to the on-disk tier.
+_DISK_TIMEOUT: float = 30.0
+
+
+def _size_of(key: str, bits: int) -> int:
+    return len(key) + (bits.bit_length() + 7) // 8
+
+
+class RefineCache:
+    """
+    A least recently used cache of candidate bitsets with an optional on-disk tier.
+    """
+
+    def __init__(self, capacity: int = REFINE_CACHE_BYTES, disk_path: Optional[str] = None):
+        """
+        :param capacity: Integer number of bytes of keys and bitsets kept in memory.
+        :param disk_path: String containing the file path of the on-disk tier, by default entries are only kept in
+        memory.
+        :raises sqlite3.DatabaseError: If the file of the on-disk tier isn't a cache.
+        """
+        self.capacity: int = capacity
+        self.disk_path: Optional[str] = disk_path
+        self.size: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._disk = None
+        # process the connection to the on-disk tier was opened by, a connection can't be shared with a forked child.
+        self._disk_pid: Optional[int] = None
+        # connection inherited from the parent process, kept so this process never closes it out from under the parent.
+        self._inherited = None
+        # guards the entries, the counters and the on-disk tier, neither an OrderedDict nor a connection is safe to
+        # share.
+        self._lock: threading.Lock = threading.Lock()
+
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        if disk_path:
+            # opened straight away so a file that isn't a cache is reported when it is given.
+            self._connection()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _connection(self):
+        # only called with the lock held, or before the cache is shared.
+        if self.disk_path is None:
+            return None
+
+        if self._disk_pid != os.getpid():
+            # imported here so processes only keeping the cache in memory don't pay for loading a database module
+            import sqlite3
+
+            if self._disk is not None:
+                self._inherited = self._disk
+            self._disk = sqlite3.connect(self.disk_path, timeout=_DISK_TIMEOUT, isolation_level=None,
+                                         check_same_thread=False)
+            # readers don't block the writer and the other way round, each write is one small transaction.
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("PRAGMA synchronous=NORMAL")
+            self._disk.execute("CREATE TABLE IF NOT EXISTS refines (key TEXT PRIMARY KEY, bits BLOB NOT NULL)")
+            self._disk_pid = os.getpid()
+
+        return self._disk
+
+    def get(self, key: str) -> Optional[int]:
+        """
+        Looks up the candidates of a key, first in memory and then on disk.
+        :param key: String containing the key.
+        :return: Integer bitset of the candidates, None if the key isn't cached.
+        """
+        with self._lock:
+            bits: Optional[int] = self._entries.get(key)
+
+            if bits is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return bits
+
+            disk = self._connection()
+
+            if disk is not None:
+                row: Optional[tuple] = disk.execute("SELECT bits FROM refines WHERE key = ?", (key,)).fetchone()
+
+                if row is not None:
+                    bits = int.from_bytes(row[0], "big")
+                    self._remember(key, bits)
+                    self.disk_hits += 1
+                    return bits
+
+            self.misses += 1
+
+        return None
+
+    def put(self, key: str, bits: int):
+        """
+        Caches the candidates of a key.
+        :param key: String containing the key.
+        :param bits: Integer bitset of the candidates.
+        """
+        with self._lock:
+            self._remember(key, bits)
+            disk = self._connection()
+
+            if disk is not None:
+                disk.execute("INSERT OR REPLACE INTO refines (key, bits) VALUES (?, ?)",
+                             (key, bits.to_bytes((bits.bit_length() + 7) // 8, "big")))
+
+    def fetch(self, key: str, compute: Callable[[], int]) -> int:
+        """
+        Looks up the candidates of a key, working them out and caching them if they aren't cached yet.
+        :param key: String containing the key.
+        :param compute: Callable returning the bitset of the candidates.
+        :return: Integer bitset of the candidates.
+        """
+        bits: Optional[int] = self.get(key)
+
+        if bits is None:
+            bits = compute()
+            self.put(key, bits)
+
+        return bits
+
+    def _remember(self, key: str, bits: int):
+        # only called with the lock held.
+        if key in self._entries:
+            self.size -= _size_of(key, self._entries[key])
+
+        self._entries[key] = bits
+        self._entries.move_to_end(key)
+        self.size += _size_of(key, bits)
+
+        # the newest entry is always kept, even when it is bigger than the cache on its own.
+        while self.size > self.capacity and len(self._entries) > 1:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.size -= _size_of(evicted_key, evicted)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """
+        Reports how well the cache is doing.
+        :return: Dictionary of the hit, on-disk hit, miss and eviction counts and the number and size of the entries in
+        memory.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "capacity": self.capacity
+            }
+
+    def clear(self):
+        """
+        Forgets the entries kept in memory and resets the counters, the on-disk tier is left alone.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def close(self):
+        with self._lock:
+            # a connection inherited from the parent process is left for the parent to close.
+            if self._disk is not None and self._disk_pid == os.getpid():
+                self._disk.close()
+            self._disk = None
+            self._disk_pid = None
+
+
+def cache_key(sha256: str, length: int, constraints_key: str) -> str:
+    """
+    Builds the key of a refine against a dictionary.
+    :param sha256: String containing the digest of the source dictionary.
+    :param length: Integer length of the words.
+    :param constraints_key: String containing the canonical key of the constraints.
+    :return: String containing the key.
+    """
+    return f"{sha256}:{length}:{constraints_key}"
+
+
+# the cache used by refine unless configured otherwise.
+_cache: RefineCache = RefineCache()
+
+
+def default_cache() -> RefineCache:
+    """
+    Fetches the cache used by refine.
+    :return: RefineCache shared by the process.
+    """
+    return _cache
+
+
+def configure(capacity: int = REFINE_CACHE_BYTES, disk_path: Optional[str] = None) -> RefineCache:
+    """
+    Replaces the cache used by refine, e.g. to give it an on-disk tier.
+    :param capacity: Integer number of bytes of keys and bitsets kept in memory.
+    :param disk_path: String containing the file path of the on-disk tier, by default entries are only kept in memory.
+    :return: RefineCache now used by refine.
+    """
+    global _cache
+    _cache.close()
+    _cache = RefineCache(capacity, disk_path)
+
+    return _cache
@@ -0,0 +1,285 @@
+"""
+A long running query server that keeps dictionaries loaded between requests, so bots issuing many refine and suggest
+queries only pay for loading a dictionary once.
+
+Requests and responses are JSON objects, one per line, over stdin/stdout or a local Unix or TCP socket.  A request
+looks like:
+
+    {"id": 1, "op": "refine", "length": 5, "present": "ae", "absent": "st", "patterns": ["?a^e??"]}
+    {"id": 2, "op": "suggest", "length": 5, "present": "ae", "top": 5}
+    {"id": 3, "op": "count", "length": 5, "present": "ae"}
+
+A refine request can also give a `limit` to only list the first few words that match, and `at_least` and `at_most`
+objects giving the fewest and most copies of a letter, e.g. `{"e": 2}`.  A count request only returns how many words
+match and a stats request reports the hits, misses and evictions of the refine cache.  Requests can name a
+`dictionary`, but only the dictionaries the server was started with are served.  Each request is answered with the same
+id, the words found and how long it took to answer:
+
+    {"id": 1, "ok": true, "count": 12, "words": [...], "elapsed_ms": 0.41}
+
+Requests can be pipelined, a client can send as many lines as it likes without waiting and the responses come back in
+the same order.  A line can also hold a JSON array of requests, which is answered with a JSON array of responses.
+
+Requests are answered one at a time, async_server.py answers them concurrently across a pool of processes.  Any
+request that can't be answered, including one with fields of the wrong type, is answered with `ok` false and an error.
+"""
+
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+import time
+import refine_cache
+import suggestions
+import wordlepy
+from typing import Dict, Iterable, List, Optional, TextIO
+
+OPERATIONS = ("refine", "suggest", "count", "stats")
+
+# errors raised by bad requests, whose messages are returned as they are.
+_REQUEST_ERRORS: tuple = (wordlepy.DictionaryNotFound, wordlepy.InvalidCharacterString,
+                          wordlepy.InvalidFilterCombination, wordlepy.RawPatternParseError, ValueError)
+
+
+class InvalidRequest(Exception):
+    pass
+
+
+class QueryServer:
+    """
+    Answers refine, suggest and count requests against dictionaries that are loaded the first time they are asked for.
+    """
+
+    def __init__(self, dictionary: str = wordlepy.DEFAULT_DICTIONARY, dictionaries: Iterable[str] = ()):
+        """
+        :param dictionary: String containing the file path to the dictionary used by requests that don't name one.
+        :param dictionaries: Iterable of the file paths to the other dictionaries requests can name.
+        """
+        self.dictionary: str = dictionary
+        # requests can only name a dictionary the server was started with, however they spell its path.
+        self.dictionaries: Dict = {os.path.realpath(path): path for path in (dictionary, *dictionaries)}
+        self._sessions: Dict = {}
+        # guards the sessions, the threaded servers answer each connection in its own thread.
+        self._lock: threading.Lock = threading.Lock()
+
+    def dictionary_of(self, request: Dict) -> str:
+        """
+        Works out which dictionary a request is for.
+        :param request: Dictionary containing the request.
+        :return: String containing the file path to the dictionary, as the server was given it.
+        :raises InvalidRequest: If the request names a dictionary the server doesn't serve.
+        """
+        dictionary = request.get("dictionary", self.dictionary)
+
+        if not isinstance(dictionary, str) or os.path.realpath(dictionary) not in self.dictionaries:
+            raise InvalidRequest(f"The dictionary {dictionary} isn't served, use one of "
+                                 f"{', '.join(self.dictionaries.values())}!")
+
+        return self.dictionaries[os.path.realpath(dictionary)]
+
+    def session(self, dictionary: str, length: int) -> wordlepy.WordleSession:
+        """
+        Fetches a fresh session over a dictionary, reusing the table loaded by an earlier request.
+        :param dictionary: String containing the file path to the dictionary.
+        :param length: Integer length of the words.
+        :return: WordleSession with every word of that length as a candidate.
+        """
+        key: tuple = (dictionary, length)
+
+        with self._lock:
+            if key not in self._sessions:
+                self._sessions[key] = wordlepy.WordleSession(dictionary, length)
+
+            return self._sessions[key].branch()
+
+    def answer(self, request: Dict) -> Dict:
+        """
+        Answers a single request.
+        :param request: Dictionary containing the request.
+        :return: Dictionary containing the response.
+        :raises InvalidRequest: If the request is missing an operation or asks for one that doesn't exist.
+        """
+        if not isinstance(request, dict) or request.get("op") not in OPERATIONS:
+            raise InvalidRequest(f"Requests must be objects with an op of {' or '.join(OPERATIONS)}!")
+
+        if request["op"] == "stats":
+            return {"cache": refine_cache.default_cache().stats()}
+
+        dictionary: str = self.dictionary_of(request)
+        length: int = _field(request, "length", int, 5)
+        present: str = _field(request, "present", str, "")
+        absent: str = _field(request, "absent", str, "")
+        patterns: List = _field(request, "patterns", list, [])
+        at_least: Dict = _field(request, "at_least", dict, {})
+        at_most: Dict = _field(request, "at_most", dict, {})
+
+        if length <= 0:
+            raise InvalidRequest("The length must be a positive number!")
+
+        if not all(isinstance(pattern, str) for pattern in patterns):
+            raise InvalidRequest("The patterns must be a list of strings!")
+
+        for name, counts in (("at_least", at_least), ("at_most", at_most)):
+            if not all(isinstance(letter, str) and len(letter) == 1 and letter.isalpha() and isinstance(count, int)
+                       and not isinstance(count, bool) and count >= 0 for letter, count in counts.items()):
+                raise InvalidRequest(f"The counts of {name} must be numbers of copies keyed by letter e.g. "
+                                     f'{{"e": 2}}!')
+
+        session: wordlepy.WordleSession = self.session(dictionary, length)
+
+        if present or absent or patterns or at_least or at_most:
+            session.refine(present, absent, patterns, at_least, at_most)
+
+        if request["op"] == "count":
+            return {"count": len(session)}
+
+        top: int = _field(request, "top", int, 10)
+        limit: Optional[int] = _field(request, "limit", int, None)
+
+        if top < 1 or limit is not None and limit < 1:
+            raise InvalidRequest("The top and limit of a request must be at least 1!")
+
+        if request["op"] == "suggest":
+            words: List = suggestions.suggest(dictionary, length, session.candidates, top)
+        else:
+            words = list(session.iter_words(limit))
+
+        return {"count": len(words), "words": words}
+
+    def respond(self, request) -> Dict:
+        """
+        Answers a single request, turning any error into an error response rather than raising it.
+        :param request: Dictionary containing the request.
+        :return: Dictionary containing the response, including the time taken to answer it.
+        """
+        start: float = time.perf_counter()
+        request_id = request.get("id") if isinstance(request, dict) else None
+
+        try:
+            response: Dict = {"id": request_id, "ok": True}
+            response.update(self.answer(request))
+        except (InvalidRequest,) + _REQUEST_ERRORS as error:
+            response = {"id": request_id, "ok": False, "error": str(error)}
+        except Exception as error:
+            # anything else is still answered, a bad request must never take the server down.
+            response = {"id": request_id, "ok": False, "error": f"Could not answer request: {error!r}"}
+
+        response["elapsed_ms"] = (time.perf_counter() - start) * 1000
+
+        return response
+
+    def respond_line(self, line: str) -> Optional[str]:
+        """
+        Answers a line of the protocol, which holds either one request or an array of them.
+        :param line: String containing the JSON of the request or requests.
+        :return: String containing the JSON of the response or responses, None for a blank line.
+        """
+        if not line.strip():
+            return None
+
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return json.dumps({"id": None, "ok": False, "error": f"Could not parse request: {error}"})
+
+        if isinstance(request, list):
+            return json.dumps([self.respond(item) for item in request])
+
+        return json.dumps(self.respond(request))
+
+    def serve_stream(self, infile: TextIO, outfile: TextIO):
+        """
+        Answers requests read from one stream and writes the responses to another until the input runs out.
+        :param infile: Text stream to read request lines from.
+        :param outfile: Text stream to write response lines to.
+        """
+        for line in infile:
+            response: Optional[str] = self.respond_line(line)
+
+            if response is not None:
+                outfile.write(response + "\n")
+                outfile.flush()
+
+
+def _field(request: Dict, name: str, kind: type, default):
+    value = request.get(name)
+
+    if value is None:
+        return default
+
+    # bools are ints in python, but never what a request means by a number.
+    if not isinstance(value, kind) or isinstance(value, bool) and kind is not bool:
+        raise InvalidRequest(f"The {name} of a request must be a {kind.__name__}!")
+
+    return value
+
+
+def remove_stale_socket(socket_path: str):
+    """
+    Removes a Unix socket left behind by an earlier server, so a new one can listen on the same path.
+    :param socket_path: String containing the file path of the socket.
+    :raises OSError: If something other than a socket is at the path.
+    """
+    try:
+        mode: int = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{socket_path} already exists and isn't a socket, choose another path!")
+
+    os.remove(socket_path)
+
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            response: Optional[str] = self.server.query_server.respond_line(line.decode("utf-8"))
+
+            if response is not None:
+                self.wfile.write(response.encode("utf-8") + b"\n")
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def serve(dictionary: str = wordlepy.DEFAULT_DICTIONARY, socket_path: Optional[str] = None,
+          host: str = "127.0.0.1", port: Optional[int] = None, dictionaries: Iterable[str] = ()):
+    """
+    Runs the query server until it is interrupted or its input runs out.  With neither a socket path nor a port the
+    requests are read from stdin and the responses written to stdout.
+    :param dictionary: String containing the file path to the dictionary used by requests that don't name one.
+    :param socket_path: String containing the file path of a Unix socket to listen on.
+    :param host: String containing the address to listen on when a port is given.
+    :param port: Integer TCP port to listen on.
+    :param dictionaries: Iterable of the file paths to the other dictionaries requests can name.
+    :raises OSError: If something other than a socket is at the socket path.
+    """
+    query_server: QueryServer = QueryServer(dictionary, dictionaries)
+
+    if socket_path is None and port is None:
+        query_server.serve_stream(sys.stdin, sys.stdout)
+        return
+
+    if socket_path is not None:
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise OSError("Unix sockets aren't supported on this platform, use a TCP port instead!")
+        remove_stale_socket(socket_path)
+        server = _UnixServer(socket_path, _StreamHandler)
+    else:
+        server = _TCPServer((host, port), _StreamHandler)
+
+    server.query_server = query_server
+
+    with server:
+        server.serve_forever()
@@ -0,0 +1,246 @@
+"""
+Splits the filters over very large dictionaries into shards that are checked on several cores at once.
+
+Refines evaluate their constraints against a table as bitsets, see `constraint_bits`, building the positional bitsets
+they need from the letter columns the first time each is used.  For merged dictionaries of millions of words, or long
+words, that is worth spreading over a pool of worker processes: the table is split into contiguous ranges of ids, each
+worker evaluates the constraints against its own range, keeping the positional bitsets of the last few ranges it was
+given for later refines, and the bitsets of the ranges are joined back together in order, so the result is exactly
+what evaluating them in this process gives.  The present/absent letter filter and the regex filter, which look at every word in Python,
+are split up the same way.
+
+Tables read from a dictionary index aren't sent to the workers, each worker maps the same index file and is only sent
+the range of ids to check.  Any other list of words is sent a shard at a time.
+
+Sharding only pays for itself once there are enough words, so smaller filters are run in this process without ever
+starting the pool.  The number of workers and that threshold are set with `configure`.
+"""
+
+import os
+import re
+import constraints
+import parse_dictionary
+import word_index
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Pattern, Sequence
+
+# the fewest words that are filtered across the pool, fewer are filtered in this process.
+SHARD_MIN_WORDS: int = 200000
+
+# shards given to each worker, more than one so a worker that finishes early can pick up another.
+SHARDS_PER_WORKER: int = 4
+
+# ranges of a table each worker keeps the positional bitsets of, as any worker can be given any range, keeping every one
+# it was ever given would cost each worker a copy of the bitsets of the whole table.
+RANGES_PER_WORKER: int = SHARDS_PER_WORKER
+
+_settings: Dict = {"workers": None, "min_words": SHARD_MIN_WORDS}
+_pool = None
+
+# tables opened by each worker process, keyed by the source of the table, and the most recently used ranges of them it
+# has evaluated constraints against, keyed by the source and the range.
+_worker_tables: Dict = {}
+_worker_ranges: OrderedDict = OrderedDict()
+
+
+def configure(workers: Optional[int] = None, min_words: int = SHARD_MIN_WORDS):
+    """
+    Sets how filters are sharded, shutting down any running pool so the next sharded filter starts a new one.
+    :param workers: Integer number of worker processes, defaults to the number of CPUs, 1 to never shard.
+    :param min_words: Integer number of words below which filters are run in this process.
+    """
+    shutdown()
+    _settings["workers"] = workers
+    _settings["min_words"] = min_words
+
+
+def shutdown():
+    """
+    Stops the worker processes, if they were ever started.
+    """
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def worker_count() -> int:
+    return _settings["workers"] or os.cpu_count() or 1
+
+
+def should_shard(count: int) -> bool:
+    """
+    Decides whether filtering a number of words is worth spreading across the pool.
+    :param count: Integer number of words to filter.
+    :return: True if the words should be sharded; False to filter them in this process.
+    """
+    return worker_count() > 1 and count >= _settings["min_words"]
+
+
+def _executor():
+    global _pool
+
+    if _pool is None:
+        # imported here as most filters are small enough to never need a pool
+        from concurrent.futures import ProcessPoolExecutor
+        _pool = ProcessPoolExecutor(worker_count())
+
+    return _pool
+
+
+def _table_of(source: tuple) -> word_index.WordTable:
+    if source not in _worker_tables:
+        index_path, length, sha256 = source
+        # the index was rebuilt, so whatever was opened from it before is never used again.
+        for stale in [key for key in _worker_tables if key[:2] == (index_path, length)]:
+            del _worker_tables[stale]
+        for stale in [key for key in _worker_ranges if key[0][:2] == (index_path, length) and key[0] != source]:
+            del _worker_ranges[stale]
+
+        index: parse_dictionary.DictionaryIndex = parse_dictionary.DictionaryIndex(index_path)
+        if index.header["source"]["sha256"] != sha256:
+            index.close()
+            raise parse_dictionary.StaleIndex(f"{index_path} was rebuilt while it was being filtered!")
+        _worker_tables[source] = index.table(length)
+
+    return _worker_tables[source]
+
+
+def _shards(count: int) -> List:
+    shards: int = min(worker_count() * SHARDS_PER_WORKER, count)
+
+    return [range(shard * count // shards, (shard + 1) * count // shards) for shard in range(shards)]
+
+
+def _run(function: Callable, words: Sequence, ids: Optional[Sequence], *args) -> List:
+    """
+    Runs a filter over every shard of the words across the pool and joins the matches together in order.
+    :param function: Callable filtering a shard, given the words or table source, the ids to check and `args`.
+    :param words: WordTable or Sequence of the words to filter.
+    :param ids: Sequence of the ids of the words of a table to check, defaults to every word.
+    :return: List of the matching words in order.
+    """
+    source = getattr(words, "source", None)
+    count: int = len(ids if ids is not None else words)
+    tasks: List = []
+
+    for shard in _shards(count):
+        selection: Sequence = ids[shard.start:shard.stop] if ids is not None else shard
+        if source is not None:
+            tasks.append((source, selection))
+        elif isinstance(words, word_index.WordTable):
+            tasks.append(([words.words[index] for index in selection], None))
+        else:
+            tasks.append((list(words[shard.start:shard.stop]), None))
+
+    matches: List = []
+    futures: List = [_executor().submit(function, shard_words, selection, *args) for shard_words, selection in tasks]
+
+    for future in futures:
+        matches.extend(future.result())
+
+    return matches
+
+
+def _filter_letters_shard(words, selection: Optional[Sequence], present: Sequence, absent: Sequence) -> List:
+    if selection is None:
+        return word_index.WordTable(words).filter_by_letters(present, absent)
+
+    return _table_of(words).filter_by_letters(present, absent, selection)
+
+
+def filter_by_letters(words: Sequence, present: Sequence = (), absent: Sequence = (),
+                      ids: Optional[Sequence] = None) -> List:
+    """
+    Finds the words that contain all of one set of letters and none of another, see `WordTable.filter_by_letters`,
+    sharded across the pool when there are enough words to check.
+    :param words: WordTable or Sequence of the words to filter.
+    :param present: Sequence of the characters each word must contain.
+    :param absent: Sequence of the characters each word must not contain.
+    :param ids: Sequence of the ids of the words of a table to check, defaults to every word.
+    :return: List of the matching words in order.
+    """
+    if not should_shard(len(ids) if ids is not None else len(words)):
+        if not isinstance(words, word_index.WordTable):
+            words = word_index.WordTable(list(words))
+        return words.filter_by_letters(present, absent, ids)
+
+    return _run(_filter_letters_shard, words, ids, list(present), list(absent))
+
+
+def _regex_shard(words, selection: Optional[Sequence], pattern: str, flags: int) -> List:
+    if selection is not None:
+        table: word_index.WordTable = _table_of(words)
+        words = table.words[selection.start:selection.stop]
+
+    regex: Pattern = re.compile(pattern, flags)
+
+    return [word for word in words if regex.match(word)]
+
+
+def filter_by_regex(words: Sequence, regex: Pattern) -> List:
+    """
+    Finds the words that match a regular expression from their start, sharded across the pool when there are enough
+    words to check.
+    :param words: WordTable or Sequence of the words to filter.
+    :param regex: Pattern containing a compiled regular expression.
+    :return: List of the matching words in order.
+    """
+    if not should_shard(len(words)):
+        if isinstance(words, word_index.WordTable):
+            words = words.words
+        return [word for word in words if regex.match(word)]
+
+    return _run(_regex_shard, words, None, regex.pattern, regex.flags)
+
+
+def _range_of(source: tuple, start: int, stop: int) -> word_index.WordTable:
+    key: tuple = (source, start, stop)
+
+    if key not in _worker_ranges:
+        table: word_index.WordTable = _table_of(source)
+        # the words and masks of the range are views onto the table, only the positional bitsets are its own.
+        _worker_ranges[key] = word_index.WordTable(table.words[start:stop], table.alphabet, table.masks[start:stop])
+
+        while len(_worker_ranges) > RANGES_PER_WORKER:
+            _worker_ranges.popitem(last=False)
+
+    _worker_ranges.move_to_end(key)
+
+    return _worker_ranges[key]
+
+
+def _constraint_shard(source: tuple, start: int, stop: int, compiled: constraints.Constraints, bits: int) -> int:
+    return compiled.bits(_range_of(source, start, stop), bits)
+
+
+def constraint_bits(compiled: constraints.Constraints, table: word_index.WordTable, bits: Optional[int] = None) -> int:
+    """
+    Evaluates constraints against a table, see `Constraints.bits`, sharded across the pool by ranges of ids when the
+    table was read from an index and there are enough candidates.
+    :param compiled: Constraints to evaluate.
+    :param table: WordTable to evaluate against.
+    :param bits: Integer bitset of the candidates to narrow down, defaults to every word in the table.
+    :return: Integer bitset of the candidates satisfying every constraint.
+    """
+    bits = table.all_bits if bits is None else bits
+    size: int = len(table)
+
+    if table.source is None or compiled.impossible or not should_shard(word_index.popcount(bits)):
+        return compiled.bits(table, bits)
+
+    # bit i counts from the most significant end, so the range [start, stop) is the bits below size - start.
+    futures: List = []
+    for shard in _shards(size):
+        shift: int = size - shard.stop
+        shard_bits: int = bits >> shift & (1 << len(shard)) - 1
+        if shard_bits:
+            futures.append((shift, _executor().submit(_constraint_shard, table.source, shard.start, shard.stop,
+                                                      compiled, shard_bits)))
+
+    matches: int = 0
+    for shift, future in futures:
+        matches |= future.result() << shift
+
+    return matches
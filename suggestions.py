@@ -0,0 +1,310 @@
+"""
+Suggests guesses by how much they are expected to narrow down the candidates, rather than from a fixed list.
+
+The expected information of a guess is the entropy of the feedback it would get across every candidate answer, a guess
+that splits the candidates into many small groups of equal size scores highest.  When a feedback matrix has been built
+for the dictionary every word is ranked as a guess, looking its feedback up in the matrix.  Otherwise each guess is
+scored against the candidates as it is ranked, which is too slow to do for every word of a large dictionary, so only a
+pool of guesses is ranked: an evenly spread sample of the candidates, topped up with a sample of the rest of the words.
+Those suggestions are approximate, the best of the pool rather than of the whole dictionary, and the size of the pool
+is set with `configure`, 0 ranks every word.  Rankings are cached by dictionary, word length and candidates both in memory and on disk, so
+asking for the same suggestions again is free.
+
+Starting words are taken from the ranking of a tournament first, when one has been run for the dictionary, see
+tournament.py.
+"""
+
+import hashlib
+import json
+import math
+import operator
+import os
+import threading
+import feedback
+import instrumentation
+import parse_dictionary
+import tournament
+import word_index
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+SUGGESTIONS_SUFFIX: str = ".wpsug"
+
+# the most guesses ranked without a feedback matrix, an evenly spread sample of the candidates and the rest of the
+# words is ranked when there are more.
+GUESS_POOL: int = 256
+
+# the most rankings kept in the on-disk cache of a dictionary, the oldest are dropped when it is compacted.
+CACHE_ENTRIES: int = 1024
+
+# the most rankings kept in memory by this process, the least recently used are dropped first.
+MEMORY_ENTRIES: int = 256
+
+# translates the characters of a bitset formatted as a binary string into flags for `itertools.compress`.
+_FLAGS: bytes = bytes.maketrans(b"01", b"\0\1")
+
+_settings: Dict = {"guess_pool": GUESS_POOL}
+
+# rankings that have already been worked out or read by this process, keyed in the same way as the on-disk cache.
+_RANKINGS: OrderedDict = OrderedDict()
+
+# the rankings in the on-disk cache of each dictionary and how many lines it has, read once per process.
+_DISK_CACHES: Dict = {}
+
+# guards both caches and the writes to the on-disk caches, as the threaded query server suggests from several threads.
+_lock: threading.Lock = threading.Lock()
+
+
+def configure(guess_pool: int = GUESS_POOL):
+    """
+    Sets how many guesses are ranked when there isn't a feedback matrix to look their feedback up in.
+    :param guess_pool: Integer number of guesses, 0 to rank every word of the dictionary.
+    """
+    _settings["guess_pool"] = guess_pool
+
+
+def information(counts) -> float:
+    """
+    Works out the expected information, in bits, of a guess from how it splits up the candidates.
+    :param counts: Iterable of the number of candidates giving each distinct feedback code.
+    :return: Float entropy of the feedback.
+    """
+    counts = list(counts)
+    total: int = sum(counts)
+
+    return math.log2(total) - sum(count * math.log2(count) for count in counts) / total
+
+
+def candidate_flags(table: word_index.WordTable, bits: int) -> bytes:
+    """
+    Converts a bitset of candidates into one flag byte per word of the table.
+    :param table: WordTable the bitset is over.
+    :param bits: Integer bitset of candidates.
+    :return: bytes with 1 for each candidate and 0 for every other word, in table order.
+    """
+    return format(bits, "0%db" % len(table)).encode("ascii").translate(_FLAGS)
+
+
+def sample_ids(ids: Sequence[int], size: int) -> List:
+    """
+    Picks an evenly spread sample of ids, so the same ids always give the same sample.
+    :param ids: Sequence of the ids to sample.
+    :param size: Integer number of ids to pick.
+    :return: List of the picked ids in the order they are given, every id when there are no more than `size`.
+    """
+    if len(ids) <= size:
+        return list(ids)
+
+    return [ids[index * len(ids) // size] for index in range(size)]
+
+
+def guess_pool(table: word_index.WordTable, candidate_ids: Sequence[int], size: int = GUESS_POOL) -> List:
+    """
+    Picks the words worth ranking as guesses, every candidate while there are few enough, topped up with an evenly
+    spread sample of the rest of the table as a word that can't be the answer often splits the candidates up better.
+    :param table: WordTable containing the guesses.
+    :param candidate_ids: Sequence of the ids of the candidate answers in table order.
+    :param size: Integer number of guesses to pick.
+    :return: List of the ids of the guesses in table order.
+    """
+    pool: List = sample_ids(candidate_ids, size)
+
+    if len(pool) < size and len(table) > len(candidate_ids):
+        # each spread out pick of the table is moved on past any candidates, which are already in the pool.
+        chosen: set = set(pool)
+        others: List = [guess_id for guess_id in sample_ids(range(len(table)), size) if guess_id not in chosen]
+        pool = sorted(chosen.union(others[:size - len(pool)]))
+
+    return pool
+
+
+def rank_guesses(table: word_index.WordTable, bits: Optional[int] = None, top: int = 10,
+                 matrix: Optional[feedback.FeedbackMatrix] = None, pool: int = 0) -> List:
+    """
+    Ranks the words of a table as guesses by their expected information over a set of candidate answers.  Each guess
+    is only scored against the candidates.  Ties are broken in favour of guesses that could be the answer, then
+    alphabetically, so the ranking is always the same.
+    :param table: WordTable containing the guesses and answers.
+    :param bits: Integer bitset of the candidate answers, defaults to every word in the table.
+    :param top: Integer number of guesses to return.
+    :param matrix: FeedbackMatrix of the table, when not given each guess is scored as it is ranked.
+    :param pool: Integer number of guesses to rank, see `guess_pool`, 0 ranks every word.
+    :return: List of the best guesses, best first.
+    """
+    bits = table.all_bits if bits is None else bits
+    candidate_ids: List = table.ids_of(bits)
+
+    if len(candidate_ids) <= 2:
+        # guessing one of the last two candidates is at least as good as anything else.
+        return [table.words[index] for index in candidate_ids][:top]
+
+    candidates: set = set(candidate_ids)
+    guess_ids: Sequence = guess_pool(table, candidate_ids, pool) if pool else range(len(table))
+    # picks the codes of the candidates out of a row of the matrix in one go.
+    pick: Optional[Callable] = operator.itemgetter(*candidate_ids) if len(candidate_ids) < len(table) else None
+    ranked: List = []
+
+    for guess_id in guess_ids:
+        if matrix is not None:
+            with matrix.row(guess_id) as row:
+                counts: Counter = Counter(pick(row) if pick is not None else row)
+        else:
+            counts = Counter(feedback.score_ids(table, [guess_id] * len(candidate_ids), candidate_ids))
+        score: float = information(counts.values())
+        ranked.append((-score, guess_id not in candidates, table.words[guess_id]))
+
+    ranked.sort()
+
+    return [guess for _, _, guess in ranked[:top]]
+
+
+def suggestions_path_for(file_path: str) -> str:
+    """
+    Works out where the on-disk cache of suggestions for a dictionary lives.
+    :param file_path: String containing the file path to the source dictionary.
+    :return: String containing the file path to the cache.
+    """
+    return file_path + SUGGESTIONS_SUFFIX
+
+
+def _remember(key: str, ranking: List):
+    # this and the on-disk cache helpers are only called with the lock held.
+    _RANKINGS[key] = ranking
+    _RANKINGS.move_to_end(key)
+
+    while len(_RANKINGS) > MEMORY_ENTRIES:
+        _RANKINGS.popitem(last=False)
+
+
+def _disk_cache(cache_path: str) -> Dict:
+    # the on-disk cache is a JSON line per ranking, it is only read the first time a dictionary is used and kept in
+    # memory alongside the file from then on.
+    if cache_path in _DISK_CACHES:
+        return _DISK_CACHES[cache_path]
+
+    entries: OrderedDict = OrderedDict()
+    lines: int = 0
+    compact: bool = False
+
+    try:
+        with open(cache_path, "r") as file:
+            for line in file:
+                lines += 1
+                try:
+                    entry: Dict = json.loads(line)
+                    entries[entry["key"]] = entry["ranking"]
+                    entries.move_to_end(entry["key"])
+                except (ValueError, KeyError, TypeError):
+                    # a partly written line, or a cache written by an older version, is dropped by rewriting the file.
+                    compact = True
+    except OSError:
+        pass
+
+    while len(entries) > CACHE_ENTRIES:
+        entries.popitem(last=False)
+
+    _DISK_CACHES[cache_path] = {"entries": entries, "lines": lines, "compact": compact}
+
+    return _DISK_CACHES[cache_path]
+
+
+def _append_cache(cache_path: str, key: str, ranking: List):
+    disk: Dict = _disk_cache(cache_path)
+    entries: OrderedDict = disk["entries"]
+    entries[key] = ranking
+
+    while len(entries) > CACHE_ENTRIES:
+        entries.popitem(last=False)
+
+    try:
+        if disk["compact"] or disk["lines"] >= 2 * CACHE_ENTRIES:
+            # rewritten with only the newest rankings once it has grown to twice the size it is allowed.
+            temporary_path: str = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                for cached_key, cached in entries.items():
+                    file.write(json.dumps({"key": cached_key, "ranking": cached}) + "\n")
+            os.replace(temporary_path, cache_path)
+            disk["lines"] = len(entries)
+            disk["compact"] = False
+        else:
+            with open(cache_path, "a") as file:
+                file.write(json.dumps({"key": key, "ranking": ranking}) + "\n")
+            disk["lines"] += 1
+    except OSError:
+        # the cache is only an optimisation, carry on without it if it can't be written.
+        pass
+
+
+@instrumentation.instrumented("suggest")
+def suggest(file_path: str, length: int, bits: Optional[int] = None, top: int = 10, openers: bool = True) -> List:
+    """
+    Suggests the best guesses for a dictionary, word length and set of candidates, using the cached ranking if there is
+    one.  When every word is still a candidate, the openers ranked by a tournament come first.
+    :param file_path: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param bits: Integer bitset of the candidate answers, defaults to every word of that length.
+    :param top: Integer number of guesses to return.
+    :param openers: Boolean, False to ignore the ranking of a tournament and only rank by expected information.
+    :return: List of the best guesses, best first.
+    """
+    # read the same way as refine, so suggestions still work when the index can't be written.
+    table: word_index.WordTable = parse_dictionary.load_table(file_path, length)
+    bits = table.all_bits if bits is None else bits
+    sha256: str = parse_dictionary.source_digest(file_path)
+
+    ranked_openers: List = []
+    if openers and bits == table.all_bits:
+        ranked_openers = tournament.load_openers(file_path, length, sha256)
+
+        if len(ranked_openers) >= top:
+            return ranked_openers[:top]
+
+    ranking: List = _ranking(file_path, length, sha256, table, bits, top)
+
+    if not ranked_openers:
+        return ranking
+
+    # a tournament of only a few openers is topped up with the best of the rest.
+    return (ranked_openers + [guess for guess in ranking if guess not in ranked_openers])[:top]
+
+
+def _ranking(file_path: str, length: int, sha256: str, table: word_index.WordTable, bits: int, top: int) -> List:
+    matrix: Optional[feedback.FeedbackMatrix] = None
+
+    try:
+        matrix = feedback.FeedbackMatrix(feedback.matrix_path_for(file_path, length))
+    except (OSError, ValueError, feedback.InvalidMatrix):
+        pass
+
+    try:
+        if matrix is not None and matrix.header["sha256"] != sha256:
+            matrix.close()
+            matrix = None
+
+        # every word is ranked with a matrix, so rankings of a pool are only ever shared with the same size of pool.
+        pool: int = 0 if matrix is not None else _settings["guess_pool"]
+        state: str = hashlib.sha1(bits.to_bytes((len(table) + 7) // 8, "big")).hexdigest()
+        key: str = f"{sha256}:{length}:{top}:{pool}:{state}"
+
+        cache_path: str = suggestions_path_for(file_path)
+
+        with _lock:
+            ranking: Optional[List] = _RANKINGS.get(key)
+            if ranking is None:
+                ranking = _disk_cache(cache_path)["entries"].get(key)
+            cached: bool = ranking is not None
+
+        if not cached:
+            # ranked without holding the lock, two threads asking for the same ranking at once both work it out.
+            ranking = rank_guesses(table, bits, top, matrix, pool)
+    finally:
+        if matrix is not None:
+            matrix.close()
+
+    with _lock:
+        # only written once, whichever thread finishes ranking first.
+        if not cached and key not in _disk_cache(cache_path)["entries"]:
+            _append_cache(cache_path, key, ranking)
+        _remember(key, ranking)
+
+    return ranking
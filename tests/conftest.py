@@ -0,0 +1,20 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ["crane", "slate", "trace", "crate", "react", "caret", "stare", "tears", "rates", "aster", "pound", "nymph"]
+
+
+@pytest.fixture
+def dictionary(tmp_path) -> str:
+    """
+    Writes a small dictionary in the same format as the Webster's dictionary, its index is built next to it.
+    """
+    file_path = tmp_path / "dictionary.json"
+    file_path.write_text(json.dumps({word: f"A definition of {word}." for word in WORDS}))
+
+    return str(file_path)
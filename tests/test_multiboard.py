@@ -0,0 +1,17 @@
+import pytest
+
+import multiboard
+
+
+def test_play_solves_every_board(dictionary):
+    session = multiboard.MultiBoardSession(dictionary, boards=2)
+
+    assert multiboard.play(session, ["crane", "pound"]) >= 2
+    assert all(session.solved)
+
+
+def test_play_raises_when_an_answer_is_not_in_the_dictionary(dictionary):
+    session = multiboard.MultiBoardSession(dictionary, boards=2)
+
+    with pytest.raises(ValueError, match="board"):
+        multiboard.play(session, ["crane", "zzzzz"])
@@ -0,0 +1,20 @@
+import argparse
+
+import wordlepy
+
+
+def test_refine_filters_by_presence_and_absence(dictionary):
+    assert wordlepy.refine(present="ae", absent="s", dictionary=dictionary) == ["caret", "crane", "crate", "react",
+                                                                                 "trace"]
+
+
+def test_wordlepy_applies_filters_of_a_hand_built_namespace(dictionary):
+    args = argparse.Namespace(dictionary=dictionary, length=5, suggest=False, present="ae", absent="s", regex=None)
+
+    assert wordlepy.wordlepy(args) == wordlepy.refine(present="ae", absent="s", dictionary=dictionary)
+
+
+def test_wordlepy_counts_with_a_hand_built_namespace(dictionary):
+    args = argparse.Namespace(dictionary=dictionary, length=5, suggest=False, present="p", count=True)
+
+    assert wordlepy.wordlepy(args) == 2
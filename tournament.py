@@ -0,0 +1,234 @@
+"""
+Ranks starting words by playing every one of them against every answer of a dictionary, using the tester's solve loop.
+
+The games are split into work units of one opener against a chunk of answers, which are played across a pool of worker
+processes.  Each finished unit is appended to a checkpoint file as a line of JSON, so a tournament that is stopped part
+way through picks up where it left off when run again with the same checkpoint.
+
+The ranking, best opener first by mean guesses, then fail rate, then worst case, is written next to the dictionary.
+Suggestions of starting words read it before ranking guesses by their expected information, so once a tournament has
+been run for a dictionary its winners are what gets suggested.
+"""
+
+import feedback
+import json
+import os
+import parse_dictionary
+import word_index
+from typing import Dict, List, Optional, Sequence
+
+TOURNAMENT_SUFFIX: str = ".wptour"
+
+# number of answers played against an opener in a single work unit.
+ANSWER_CHUNK: int = 256
+
+
+class InvalidCheckpoint(Exception):
+    pass
+
+
+def tournament_path_for(file_path: str, length: int) -> str:
+    """
+    Works out where the ranking of the starting words of a dictionary and word length lives.
+    :param file_path: String containing the file path to the source dictionary.
+    :param length: Integer length of the words.
+    :return: String containing the file path to the ranking.
+    """
+    return f"{file_path}.{length}{TOURNAMENT_SUFFIX}"
+
+
+# state of each worker process, so the dictionary is only loaded once per worker.
+_worker: Dict = {}
+
+
+def _initialise_worker(file_path: str, length: int, max_guesses: int):
+    # imported here so reading a ranking doesn't pay for loading the tester
+    import logging
+    import wordlepy
+    import wordlepy_tester
+
+    _worker["solve"] = wordlepy_tester.solve
+    _worker["log"] = logging.getLogger(wordlepy_tester.__name__)
+    _worker["session"] = wordlepy.WordleSession(file_path, length)
+    _worker["max_guesses"] = max_guesses
+
+
+def _play_unit(unit: Sequence) -> Dict:
+    opener, start, stop = unit
+    session = _worker["session"]
+    table: word_index.WordTable = session.table
+    total: int = 0
+    worst: int = 0
+    failures: int = 0
+    # the opening feedback of every game of the unit is scored in one batch.
+    opener_id: int = table.words.index(opener)
+    codes = feedback.score_ids(table, [opener_id] * (stop - start), range(start, stop))
+
+    for answer, code in zip(table.words[start:stop], codes):
+        guesses: int = _worker["solve"](_worker["log"], session.branch(), answer, opener, code)
+        total += guesses
+        worst = max(worst, guesses)
+        failures += guesses > _worker["max_guesses"]
+
+    return {"opener": opener, "start": start, "games": stop - start, "guesses": total, "worst": worst,
+            "failures": failures}
+
+
+def _load_checkpoint(checkpoint_path: str, header: Dict) -> List:
+    units: List = []
+
+    with open(checkpoint_path, "r") as file:
+        lines: List = file.read().splitlines()
+
+    if not lines:
+        return units
+
+    if json.loads(lines[0]) != header:
+        raise InvalidCheckpoint(f"The checkpoint {checkpoint_path} is of a different tournament!")
+
+    for line in lines[1:]:
+        try:
+            units.append(json.loads(line))
+        except ValueError:
+            # a partly written line from a run that was stopped.
+            continue
+
+    return units
+
+
+def rank(units: Sequence[Dict], answers: int) -> List:
+    """
+    Sums the work units of each opener up and ranks the openers that have been played against every answer.
+    :param units: Sequence of the results of each work unit.
+    :param answers: Integer number of answers each opener is played against.
+    :return: List of a dictionary of the word, mean guesses, worst case and fail rate of each opener, best first.
+    """
+    totals: Dict = {}
+
+    for unit in units:
+        total: Dict = totals.setdefault(unit["opener"], {"games": 0, "guesses": 0, "worst": 0, "failures": 0})
+        total["games"] += unit["games"]
+        total["guesses"] += unit["guesses"]
+        total["worst"] = max(total["worst"], unit["worst"])
+        total["failures"] += unit["failures"]
+
+    ranking: List = [{
+        "word": opener,
+        "mean": total["guesses"] / total["games"],
+        "worst": total["worst"],
+        "fail_rate": total["failures"] / total["games"]
+    } for opener, total in totals.items() if total["games"] == answers]
+
+    ranking.sort(key=lambda entry: (entry["mean"], entry["fail_rate"], entry["worst"], entry["word"]))
+
+    return ranking
+
+
+def run(file_path: str, length: int, openers: Optional[Sequence[str]] = None, max_guesses: int = 6,
+        checkpoint_path: Optional[str] = None, workers: Optional[int] = None,
+        tournament_path: Optional[str] = None) -> List:
+    """
+    Plays every opener against every answer of a dictionary and writes the ranking next to the dictionary.
+    :param file_path: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param openers: Sequence of the starting words to rank, defaults to every word of the dictionary.
+    :param max_guesses: Integer number of guesses after which a game counts as a failure.
+    :param checkpoint_path: String containing the file path to record finished work units in, a tournament resumes
+    from it when run again.
+    :param workers: Integer number of worker processes, defaults to the number of CPUs.
+    :param tournament_path: String containing the file path to write the ranking to, defaults to next to the
+    dictionary.
+    :return: List of the ranking, best opener first, see `rank`.
+    :raises InvalidCheckpoint: If the checkpoint was written by a tournament with different settings.
+    :raises ValueError: If an opener isn't a word of the dictionary.
+    """
+    # imported here as starting up a process pool is only ever needed when running a tournament
+    from concurrent.futures import ProcessPoolExecutor
+
+    table: word_index.WordTable = parse_dictionary.load_table(file_path, length)
+    openers = list(table.words if openers is None else openers)
+    words: set = set(table.words)
+
+    for opener in openers:
+        if opener not in words:
+            raise ValueError(f"The opener {opener} isn't a word of length {length} in the dictionary!")
+
+    header: Dict = {"sha256": parse_dictionary.source_digest(file_path), "length": length, "max_guesses": max_guesses,
+                    "chunk": ANSWER_CHUNK}
+    units: List = []
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        units = _load_checkpoint(checkpoint_path, header)
+
+    done: set = {(unit["opener"], unit["start"]) for unit in units}
+    pending: List = [(opener, start, min(start + ANSWER_CHUNK, len(table))) for opener in openers
+                     for start in range(0, len(table), ANSWER_CHUNK) if (opener, start) not in done]
+
+    checkpoint = None
+    if checkpoint_path:
+        # line buffered so every finished unit is on disk before the next one is played
+        checkpoint = open(checkpoint_path, "a", buffering=1)
+        if not done:
+            checkpoint.truncate(0)
+            checkpoint.write(json.dumps(header) + "\n")
+
+    try:
+        if pending:
+            with ProcessPoolExecutor(workers, initializer=_initialise_worker,
+                                     initargs=(file_path, length, max_guesses)) as executor:
+                for unit in executor.map(_play_unit, pending):
+                    units.append(unit)
+                    if checkpoint:
+                        checkpoint.write(json.dumps(unit) + "\n")
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    wanted: set = set(openers)
+    ranking: List = rank([unit for unit in units if unit["opener"] in wanted], len(table))
+
+    tournament_path = tournament_path or tournament_path_for(file_path, length)
+    temporary_path: str = f"{tournament_path}.{os.getpid()}.tmp"
+
+    with open(temporary_path, "w") as file:
+        json.dump(dict(header, answers=len(table), ranking=ranking), file)
+
+    os.replace(temporary_path, tournament_path)
+
+    return ranking
+
+
+def load_openers(file_path: str, length: int, sha256: str) -> List:
+    """
+    Reads the ranked starting words of a dictionary, if a tournament has been run for this version of it.
+    :param file_path: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param sha256: String containing the digest of the dictionary.
+    :return: List of the openers, best first, empty if there is no ranking.
+    """
+    try:
+        with open(tournament_path_for(file_path, length), "r") as file:
+            tournament: Dict = json.load(file)
+    except (OSError, ValueError):
+        return []
+
+    if tournament.get("sha256") != sha256 or tournament.get("length") != length:
+        return []
+
+    return [entry["word"] for entry in tournament["ranking"]]
+
+
+def format_ranking(ranking: Sequence[Dict], top: Optional[int] = None) -> str:
+    """
+    Formats a ranking as a table.
+    :param ranking: Sequence of the ranking, see `rank`.
+    :param top: Integer number of openers to include, defaults to all of them.
+    :return: String containing the table.
+    """
+    lines: List = [f"{'rank':>5} {'word':<12} {'mean':>7} {'worst':>6} {'fail %':>7}"]
+
+    for place, entry in enumerate(ranking[:top], 1):
+        lines.append(f"{place:>5} {entry['word']:<12} {entry['mean']:>7.3f} {entry['worst']:>6} "
+                     f"{entry['fail_rate'] * 100:>7.2f}")
+
+    return "\n".join(lines)
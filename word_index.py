@@ -0,0 +1,600 @@
+"""
+In-memory structures built over the words of a single length that let the filters answer questions about a word without
+looking at its characters again.
+
+Every word is given a letter mask, an integer with one bit set for each distinct letter of the alphabet it contains.  A
+set of present or absent letters is compiled into a mask of the same shape once per query, which turns each of the
+present/absent checks into a single AND and compare per word.
+
+The letters at each position of the words are also kept as one column per position, from which an inverted index of
+(position, letter) bitsets is built on demand.  Bit i of a bitset counts from the most significant end and stands for
+word i, so positional patterns become intersections and subtractions of a handful of integers rather than a regular
+expression match per word.
+
+The words themselves are held by a `WordStore`, one fixed-width row of alphabet indexes per word packed into a single
+buffer, rather than as a Python string each.  A row is a byte per letter, so the store costs the length of the words
+in bytes per word, it can be a view straight onto the memory-mapped index, and the letter columns are strided views
+onto the same rows.
+"""
+
+import heapq
+from array import array
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+# letter masks are stored in an unsigned 64 bit array column when the alphabet is small enough to fit.
+MASK_TYPECODE: str = "Q"
+MASK_BITS: int = 64
+
+# letter columns store one alphabet index per byte.
+COLUMN_LETTERS: int = 256
+
+# `int.bit_count` is only available from python 3.10, older versions count the ones of the binary string instead.
+_BIT_COUNT: bool = hasattr(int, "bit_count")
+
+# bytes of a bitset converted at a time when ids are found lazily.
+_ID_CHUNK_BYTES: int = 4096
+
+# words decoded at a time when iterating over a word store.
+_DECODE_CHUNK_WORDS: int = 4096
+
+# word weights are stored in a double array column.
+WEIGHT_TYPECODE: str = "d"
+
+
+def popcount(bits: int) -> int:
+    """
+    Counts the words in a bitset.
+    :param bits: Integer bitset.
+    :return: Integer number of bits set.
+    """
+    if _BIT_COUNT:
+        return bits.bit_count()
+
+    return bin(bits).count("1")
+
+
+def alphabet_of(words: Iterable) -> str:
+    """
+    Collects the distinct characters used by a collection of words.
+    :param words: Iterable of the words to collect the characters of.
+    :return: String containing every character used, in sorted order.
+    """
+    letters: set = set()
+
+    for word in words:
+        letters.update(word)
+
+    return "".join(sorted(letters))
+
+
+def letter_mask(word: str, bits: Dict) -> int:
+    """
+    Builds the letter mask of a word.
+    :param word: String containing the word to build the mask of.
+    :param bits: Dictionary mapping each character of the alphabet to its bit.
+    :return: Integer with the bit of every distinct character of the word set.
+    """
+    mask: int = 0
+
+    for char in set(word):
+        mask |= bits[char]
+
+    return mask
+
+
+def build_masks(words: Sequence, alphabet: str) -> Sequence:
+    """
+    Builds the letter mask column of a list of words.
+    :param words: Sequence of words to build the masks of.
+    :param alphabet: String containing every character used by the words.
+    :return: Sequence of letter masks in the same order as the words, an array when the alphabet fits into 64 bits.
+    """
+    bits: Dict = {char: 1 << position for position, char in enumerate(alphabet)}
+    masks: List = [letter_mask(word, bits) for word in words]
+
+    if len(alphabet) <= MASK_BITS:
+        return array(MASK_TYPECODE, masks)
+
+    return masks
+
+
+def build_columns(words: Sequence, alphabet: str, length: int) -> Optional[List]:
+    """
+    Builds the letter columns of a list of words, each column holds the alphabet index of the letter at one position
+    of every word.
+    :param words: Sequence of words to build the columns of, all of the same length.
+    :param alphabet: String containing every character used by the words.
+    :param length: Integer length of the words.
+    :return: List of one bytes column per position, None if the alphabet is too large to index with a byte.
+    """
+    if len(alphabet) > COLUMN_LETTERS:
+        return None
+
+    codes: Dict = {char: index for index, char in enumerate(alphabet)}
+
+    return [bytes(codes[word[position]] for word in words) for position in range(length)]
+
+
+class WordStore(SequenceABC):
+    """
+    The sorted words of a single length as fixed-width rows of alphabet indexes in one contiguous buffer.  Words are
+    decoded when they are indexed, slicing returns a store viewing the same buffer and, as the rows sort in the same
+    order as the words, looking a word up is a binary search.
+    """
+
+    def __init__(self, rows, alphabet: str, length: int):
+        """
+        :param rows: Bytes-like buffer holding a row of `length` alphabet indexes per word.
+        :param alphabet: String containing every character used by the words, in sorted order.
+        :param length: Integer length of the words.
+        """
+        self.rows: memoryview = memoryview(rows)
+        self.alphabet: str = alphabet
+        self.length: int = length
+        self._count: int = len(self.rows) // length if length else 0
+        self._codes: Dict = {char: index for index, char in enumerate(alphabet)}
+
+        if all(ord(char) < 256 for char in alphabet):
+            # one byte characters are decoded with a byte translation, the fastest way there is.
+            self._bytes_table: Optional[bytes] = bytes.maketrans(bytes(range(len(alphabet))),
+                                                                 alphabet.encode("latin-1"))
+            self._str_table: Optional[Dict] = None
+        else:
+            self._bytes_table = None
+            self._str_table = {index: char for index, char in enumerate(alphabet)}
+
+    @classmethod
+    def from_words(cls, words: Sequence, alphabet: Optional[str] = None) -> Optional["WordStore"]:
+        """
+        Packs a list of words into a store.
+        :param words: Sequence of words to pack, all of the same length and in sorted order.
+        :param alphabet: String containing every character used by the words, defaults to the characters of the words.
+        :return: WordStore of the words, None if the alphabet is too large to index with a byte.
+        """
+        alphabet = alphabet if alphabet is not None else alphabet_of(words)
+
+        if len(alphabet) > COLUMN_LETTERS or not words:
+            return None
+
+        codes: Dict = {ord(char): chr(index) for index, char in enumerate(alphabet)}
+
+        return cls("".join(words).translate(codes).encode("latin-1"), alphabet, len(words[0]))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _decode(self, data) -> str:
+        if self._bytes_table is not None:
+            return bytes(data).translate(self._bytes_table).decode("latin-1")
+
+        return bytes(data).decode("latin-1").translate(self._str_table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step != 1:
+                return [self[position] for position in range(start, stop, step)]
+            return WordStore(self.rows[start * self.length:max(start, stop) * self.length], self.alphabet, self.length)
+
+        if index < 0:
+            index += self._count
+
+        if not 0 <= index < self._count:
+            raise IndexError("word id out of range")
+
+        return self._decode(self.rows[index * self.length:(index + 1) * self.length])
+
+    def __iter__(self) -> Iterator:
+        length: int = self.length
+
+        for start in range(0, self._count, _DECODE_CHUNK_WORDS):
+            stop: int = min(start + _DECODE_CHUNK_WORDS, self._count)
+            text: str = self._decode(self.rows[start * length:stop * length])
+            for offset in range(0, len(text), length):
+                yield text[offset:offset + length]
+
+    def __contains__(self, word) -> bool:
+        return self._find(word) is not None
+
+    def __repr__(self) -> str:
+        return f"WordStore({self._count} words of length {self.length})"
+
+    def encode(self, word: str) -> Optional[bytes]:
+        """
+        Encodes a word into a row of the store.
+        :param word: String containing the word.
+        :return: bytes of the row, None if the word has the wrong length or a character outside of the alphabet.
+        """
+        if not isinstance(word, str) or len(word) != self.length:
+            return None
+
+        try:
+            return bytes(self._codes[char] for char in word)
+        except KeyError:
+            return None
+
+    def _find(self, word) -> Optional[int]:
+        row: Optional[bytes] = self.encode(word)
+
+        if row is None:
+            return None
+
+        low: int = 0
+        high: int = self._count
+        length: int = self.length
+
+        while low < high:
+            middle: int = (low + high) // 2
+            if self.rows[middle * length:(middle + 1) * length].tobytes() < row:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self._count and self.rows[low * length:(low + 1) * length] == row:
+            return low
+
+        return None
+
+    def index(self, word, start: int = 0, stop: Optional[int] = None) -> int:
+        """
+        Finds the id of a word by binary search.
+        :param word: String containing the word.
+        :return: Integer id of the word.
+        :raises ValueError: If the word isn't in the store.
+        """
+        position: Optional[int] = self._find(word)
+
+        if position is None or position < start or stop is not None and position >= stop:
+            raise ValueError(f"{word!r} is not in the store")
+
+        return position
+
+    def count(self, word) -> int:
+        return int(word in self)
+
+    def row(self, index: int) -> memoryview:
+        """
+        Fetches the row of a word without decoding it.
+        :param index: Integer id of the word.
+        :return: memoryview of the alphabet indexes of the letters of the word.
+        """
+        return self.rows[index * self.length:(index + 1) * self.length]
+
+    def column(self, position: int) -> memoryview:
+        """
+        Fetches the letters at one position of every word, as a strided view onto the rows.
+        :param position: Integer position in the words, starting from 0.
+        :return: memoryview of the alphabet index of the letter at that position of each word.
+        """
+        return self.rows[position::self.length]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.rows)
+
+    def close(self):
+        """
+        Lets go of the rows, so the buffer they are a view onto e.g. a memory-mapped index can be closed.  The store
+        can't be used afterwards.
+        """
+        self.rows.release()
+
+
+class WordTable:
+    """
+    The words of a single length together with the precomputed columns used to filter them, and optionally a weight
+    for each word saying how common it is, which candidates are listed by.
+    """
+
+    def __init__(self, words: Sequence, alphabet: Optional[str] = None, masks: Optional[Sequence] = None,
+                 columns: Optional[Sequence] = None, weights: Optional[Sequence] = None):
+        self.words: Sequence = words
+        self.weights: Optional[Sequence] = weights
+        self.length: int = len(words[0]) if words else 0
+        self.alphabet: str = alphabet if alphabet is not None else alphabet_of(words)
+        self.bits: Dict = {char: 1 << position for position, char in enumerate(self.alphabet)}
+        self.masks: Sequence = masks if masks is not None else build_masks(words, self.alphabet)
+        # the size is kept as a word store's length is a python level call, and it's needed by every bitset conversion.
+        self._size: int = len(words)
+        self.all_bits: int = (1 << self._size) - 1
+        self._columns: Optional[Sequence] = columns
+        self._positions: Dict = {}
+        self._ranked: Optional[List] = None
+        # (index path, length, dictionary digest) of the index the table was read from, if any, so another process can
+        # open the same table rather than being sent its words.
+        self.source: Optional[tuple] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def columns(self) -> Sequence:
+        """
+        The letter columns of the table, built the first time they are needed when they weren't stored in the index.
+        Columns are bytes of alphabet indexes, or strings of the letters themselves for very large alphabets.
+        """
+        if self._columns is None and isinstance(self.words, WordStore) and self.words.alphabet == self.alphabet:
+            self._columns = [self.words.column(position) for position in range(self.length)]
+
+        if self._columns is None:
+            columns: Optional[List] = build_columns(self.words, self.alphabet, self.length)
+            if columns is None:
+                columns = ["".join(word[position] for word in self.words) for position in range(self.length)]
+            self._columns = columns
+
+        return self._columns
+
+    def close(self):
+        """
+        Lets go of the words and of every column that is a view onto a buffer, so the buffer e.g. a memory-mapped index
+        can be closed.  The table can't be used afterwards.
+        """
+        for column in (self.masks, self.weights, *(self._columns or ())):
+            if isinstance(column, memoryview):
+                column.release()
+
+        if isinstance(self.words, WordStore):
+            self.words.close()
+
+    def position_bits(self, position: int, letter: str) -> int:
+        """
+        Fetches the bitset of the words that have a letter at a position, from the inverted index.
+        :param position: Integer position in the word, starting from 0.
+        :param letter: String containing the letter.
+        :return: Integer bitset of the words with that letter at that position.
+        """
+        key: tuple = (position, letter)
+
+        if key not in self._positions:
+            if letter not in self.bits or position >= self.length:
+                self._positions[key] = 0
+            else:
+                column = self.columns[position]
+
+                if isinstance(column, str):
+                    table = dict.fromkeys(map(ord, self.alphabet), "0")
+                    table[ord(letter)] = "1"
+                    self._positions[key] = int(column.translate(table), 2)
+                else:
+                    table = bytearray(b"0" * COLUMN_LETTERS)
+                    table[self.alphabet.index(letter)] = ord("1")
+                    self._positions[key] = int(bytes(column).translate(table), 2)
+
+        return self._positions[key]
+
+    def letter_bits(self, letter: str) -> int:
+        """
+        Fetches the bitset of the words that contain a letter anywhere, from the inverted index.
+        :param letter: String containing the letter.
+        :return: Integer bitset of the words containing that letter.
+        """
+        key: tuple = (None, letter)
+
+        if key not in self._positions:
+            bits: int = 0
+            for position in range(self.length):
+                bits |= self.position_bits(position, letter)
+            self._positions[key] = bits
+
+        return self._positions[key]
+
+    def count_bits(self, letter: str, minimum: int) -> int:
+        """
+        Fetches the bitset of the words that contain at least a given number of copies of a letter, from the inverted
+        index.  The bitsets for every count of the letter are built together the first time any of them is needed.
+        :param letter: String containing the letter.
+        :param minimum: Integer number of copies.
+        :return: Integer bitset of the words with at least that many copies of the letter.
+        """
+        if minimum <= 0:
+            return self.all_bits
+
+        if minimum > self.length:
+            return 0
+
+        key: tuple = ("count", letter, minimum)
+
+        if key not in self._positions:
+            # at_least[t] is the bitset of words with at least t copies of the letter among the positions seen so far.
+            at_least: List = [self.all_bits] + [0] * self.length
+            for position in range(self.length):
+                present: int = self.position_bits(position, letter)
+                if present:
+                    for count in range(position + 1, 0, -1):
+                        at_least[count] |= at_least[count - 1] & present
+
+            for count in range(1, self.length + 1):
+                self._positions[("count", letter, count)] = at_least[count]
+
+        return self._positions[key]
+
+    def pattern_bits(self, patterns: Iterable, bits: Optional[int] = None) -> int:
+        """
+        Combines any number of positional patterns into a single bitset.  Every letter that must be in a position is
+        intersected with the candidates and every letter that must not be in a position is subtracted from them.
+        :param patterns: Iterable of patterns, each a list of (kind, character) tuples with one per position where the
+        kind is `=` for a letter in that position, `^` for a letter not in that position and `?` for anything.
+        :param bits: Integer bitset of the candidates to narrow down, defaults to every word in the table.
+        :return: Integer bitset of the candidates that match every pattern.
+        """
+        greens: Dict = {}
+        yellows: Dict = {}
+
+        for tokens in patterns:
+            if len(tokens) > self.length:
+                # a pattern longer than the words can never match.
+                return 0
+
+            for position, (kind, char) in enumerate(tokens):
+                if kind == "=":
+                    greens.setdefault(position, set()).add(char)
+                elif kind == "^":
+                    yellows.setdefault(position, set()).add(char)
+
+        bits = self.all_bits if bits is None else bits
+
+        for position, letters in greens.items():
+            if len(letters) > 1:
+                return 0
+            bits &= self.position_bits(position, next(iter(letters)))
+
+        for position, letters in yellows.items():
+            for char in letters:
+                bits &= ~self.position_bits(position, char)
+
+        return bits
+
+    def ids_of(self, bits: int) -> List:
+        """
+        Converts a bitset of candidates into the ids of those words, the cost is proportional to the number of words
+        in the bitset rather than the size of the table.
+        :param bits: Integer bitset of candidates.
+        :return: List of the ids of the candidates in table order.
+        """
+        if not bits:
+            return []
+
+        flags: str = format(bits, "0%db" % self._size)
+        ids: List = []
+        index: int = flags.find("1")
+
+        while index != -1:
+            ids.append(index)
+            index = flags.find("1", index + 1)
+
+        return ids
+
+    def iter_ids(self, bits: int, limit: Optional[int] = None) -> Iterator:
+        """
+        Lazily converts a bitset of candidates into the ids of those words.  The bitset is scanned a chunk at a time,
+        skipping chunks without any candidates, so finding the first few ids doesn't pay for converting the rest.
+        :param bits: Integer bitset of candidates.
+        :param limit: Integer number of ids to stop after, defaults to every candidate.
+        :return: Iterator of the ids of the candidates in table order.
+        """
+        if not bits or limit is not None and limit <= 0:
+            return
+
+        size: int = self._size
+        data: bytes = bits.to_bytes((size + 7) // 8, "big")
+        # the bitset is padded at the front to a whole number of bytes, bit `padding` of the bytes is word 0.
+        padding: int = len(data) * 8 - size
+        found: int = 0
+
+        for start in range(0, len(data), _ID_CHUNK_BYTES):
+            chunk: bytes = data[start:start + _ID_CHUNK_BYTES]
+
+            if not chunk.strip(b"\0"):
+                continue
+
+            flags: str = format(int.from_bytes(chunk, "big"), "0%db" % (len(chunk) * 8))
+            offset: int = start * 8 - padding
+            index: int = flags.find("1")
+
+            while index != -1:
+                yield offset + index
+                found += 1
+                if found == limit:
+                    return
+                index = flags.find("1", index + 1)
+
+    def ranked_ids(self, bits: int, limit: Optional[int] = None) -> Iterator:
+        """
+        Lists the ids of a bitset of candidates in the order they should be shown, the most common words first when
+        the table has weights, with ties in table order so the order is always the same.  Only the best `limit` are
+        picked out, either by walking down every word from the most common until enough candidates have been seen,
+        when there are plenty of candidates, or with a heap over the candidates rather than sorting them all.  Without
+        weights this is `iter_ids`, in table order.
+        :param bits: Integer bitset of candidates.
+        :param limit: Integer number of ids to return, defaults to every candidate.
+        :return: Iterator of the ids of the candidates.
+        """
+        if self.weights is None:
+            return self.iter_ids(bits, limit)
+
+        if limit is not None and limit <= 0 or not bits:
+            return iter(())
+
+        count: int = popcount(bits)
+
+        # walking down the ranking looks at about limit * size / count words before finding enough candidates.
+        if limit is not None and limit < count and limit * self._size < count * count:
+            flags: str = format(bits, "0%db" % self._size)
+            found: List = []
+
+            for index in self.ranking:
+                if flags[index] == "1":
+                    found.append(index)
+                    if len(found) == limit:
+                        break
+
+            return iter(found)
+
+        ids: List = self.ids_of(bits)
+        weight = self.weights.__getitem__
+
+        # both keep candidates of the same weight in the order they are given, which is table order.
+        if limit is not None and limit < count:
+            return iter(heapq.nlargest(limit, ids, key=weight))
+
+        return iter(sorted(ids, key=weight, reverse=True))
+
+    @property
+    def ranking(self) -> List:
+        """
+        The ids of every word of a table with weights, most common first and ties in table order, worked out the first
+        time it is needed.
+        """
+        if self._ranked is None:
+            self._ranked = sorted(range(self._size), key=self.weights.__getitem__, reverse=True)
+
+        return self._ranked
+
+    def compile_letters(self, letters: Iterable) -> Optional[int]:
+        """
+        Compiles a collection of letters into a mask that can be compared against the letter masks of the table.
+        :param letters: Iterable of the characters to compile.
+        :return: Integer mask of the letters, None if a letter isn't used by any word in the table.
+        """
+        mask: int = 0
+
+        for char in letters:
+            if char not in self.bits:
+                return None
+            mask |= self.bits[char]
+
+        return mask
+
+    def filter_by_letters(self, present: Iterable = (), absent: Iterable = (), ids: Optional[Iterable] = None) -> List:
+        """
+        Finds the words that contain all of one set of letters and none of another.
+        :param present: Iterable of the characters each word must contain.
+        :param absent: Iterable of the characters each word must not contain.
+        :param ids: Iterable of the ids of the words to check, defaults to every word in the table.
+        :return: List of the matching words in table order.
+        """
+        present_mask: Optional[int] = self.compile_letters(present)
+
+        if present_mask is None:
+            # a letter nothing contains can't be present.
+            return []
+
+        if ids is not None:
+            both_mask: int = present_mask | self.compile_letters(char for char in absent if char in self.bits)
+            words: Sequence = self.words
+            masks: Sequence = self.masks
+            return [words[index] for index in ids if masks[index] & both_mask == present_mask]
+
+        # a letter nothing contains is absent from every word already, so it can be left out.
+        absent_mask: int = self.compile_letters(char for char in absent if char in self.bits)
+
+        if not absent_mask:
+            return [word for word, mask in zip(self.words, self.masks) if mask & present_mask == present_mask]
+
+        if not present_mask:
+            return [word for word, mask in zip(self.words, self.masks) if not mask & absent_mask]
+
+        both_mask: int = present_mask | absent_mask
+
+        return [word for word, mask in zip(self.words, self.masks) if mask & both_mask == present_mask]
@@ -32,13 +32,23 @@ His interesting blog on the subject can be found here: https://mrcoles.com/best-
 """
 
 import argparse
-import json
+import constraints
 import os
 import re
 import sys
+import feedback
+import instrumentation
 import parse_dictionary
+import refine_cache
+import sharding
+import word_index
 
-from typing import List, Optional, Pattern
+from typing import Dict, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+DEFAULT_DICTIONARY = "data/websters-english-dictionary.json"
+
+# characters used to describe the colour of each letter of a guess when giving feedback to a WordleSession.
+FEEDBACK_GREY, FEEDBACK_YELLOW, FEEDBACK_GREEN = feedback.FEEDBACK_CHARACTERS
 
 GOOD_STARTING_WORDS = [
     "roate",
@@ -70,6 +80,10 @@ class InvalidFilterCombination(Exception):
     pass
 
 
+class InvalidFeedback(Exception):
+    pass
+
+
 
 
 
@@ -93,46 +107,32 @@ def _listify(chars: str) -> Optional[List]:
     return list(chars)
 
 
-def _present(word: str, p_chars: List) -> Optional[str]:
+def _pattern_tokens(raw_patten: str) -> List:
     """
-    Checks a word for presence of characters from a User defined list.
-    :param word: String containing the word to test against the list of characters present.
-    :param p_chars: List of characters present in the word.
-    :return: String containing the word if it contains the p_chars, None is it doesn't.
-    """
-    matches: List = []
-
-    for char in p_chars:
-        if char in word:
-            matches.append(True)
-        else:
-            matches.append(False)
-
-    if all(matches):
-        return word
-
-    return None
-
-
-def _absent(word: str, a_chars: List) -> Optional[str]:
-    """
-    Checks a word for absence of characters from a User defined list.
-    :param word: String containing the word to test against the list of absences.
-    :param a_chars: List of characters absent in the word.
-    :return: String containing the word if it doesn't contain the a_chars; None if it does.
+    Splits a User defined simplified regex into one token per character position of the word.  A raw_pattern such as:
+    ?^ab^c? for example will yield [("?", ""), ("^", "a"), ("=", "b"), ("^", "c"), ("?", "")] where ? is a wild card,
+    ^ is a character that is present but not in that position and = is a character that is in that position.
+    :param raw_patten: String containing a simplified regex like pattern defined by the User.
+    :return: List of (kind, character) tuples, one for each position in the word.
+    :raises RawPatternParseError: if it finds unexpected characters in the raw_pattern.
     """
-    matches: List = []
+    tokens: List = []
+    excluded: bool = False
 
-    for char in a_chars:
-        if char not in word:
-            matches.append(True)
+    for char in raw_patten:
+        if char == "?":
+            tokens.append(("?", ""))
+            excluded = False
+        elif char == "^":
+            excluded = True
+        elif char.isalpha():
+            tokens.append(("^" if excluded else "=", char))
+            excluded = False
         else:
-            matches.append(False)
-
-    if all(matches):
-        return word
+            raise RawPatternParseError(f"Unexpected character encounted: {char}, please use --help or see the README "
+                                       f"for the correct usage.")
 
-    return None
+    return tokens
 
 
 def __pattern_parser(raw_patten: str) -> List:
@@ -145,23 +145,14 @@ def __pattern_parser(raw_patten: str) -> List:
     :raises RawPatternPaseException: if it finds unexpected characters in the raw_pattern.
     """
     regex_map: List = {}
-    char_counter: int = 1
 
-    for index, char in enumerate(raw_patten):
-        if char == "?":
+    for char_counter, (kind, char) in enumerate(_pattern_tokens(raw_patten), start=1):
+        if kind == "?":
             regex_map[char_counter] = r"[\w]"
-            char_counter += 1
-        elif raw_patten[index - 1] == "^":
+        elif kind == "^":
             regex_map[char_counter] = f"[^{char}]"
-            char_counter += 1
-        elif char == "^":
-            continue
-        elif char.isalpha():
-            regex_map[char_counter] = f"[{char}]"
-            char_counter += 1
         else:
-            raise RawPatternParseError(f"Unexpected character encounted: {char}, please use --help or see the README "
-                                       f"for the correct usage.")
+            regex_map[char_counter] = f"[{char}]"
 
     return regex_map
 
@@ -191,156 +182,645 @@ def _build_regex(raw_pattern: str) -> Pattern:
     return re.compile(pattern)
 
 
+@instrumentation.instrumented("regex", candidates_in=lambda word_subset, *args, **kwargs: len(word_subset))
 def refined_by_regex(word_subset: List, regex):
     """
-    Uses regex to match words in a dictionary against a pre-compiled regular expression pattern.
-    :param word_subset: List containing a pre-filtered words from the English dictionary.
+    Uses regex to match words in a dictionary against a pre-compiled regular expression pattern.  Very large
+    dictionaries are split into shards that are matched on several cores, see sharding.py.
+    :param word_subset: List or WordTable containing a pre-filtered words from the English dictionary.
     :param regex: Pattern containing a compiled regular expression.
     :return:  List with reduced number of words based on the regular expression.
     """
-    regex_matches: List = list()
+    return sharding.filter_by_regex(word_subset, re.compile(regex))
+
+
+@instrumentation.instrumented("patterns",
+                              candidates_in=lambda dictionary_subset, *args, **kwargs: len(dictionary_subset))
+def refined_by_patterns(dictionary_subset: word_index.WordTable, raw_patterns: List) -> List:
+    """
+    Uses the positional index of a WordTable to match its words against any number of User defined simplified regex
+    patterns at once.  Letters in a position are intersected and letters not in a position are subtracted, so the cost
+    depends on the number of constraints rather than the number of words.
+    :param dictionary_subset: WordTable containing the pre-filtered words from the English dictionary.
+    :param raw_patterns: List of strings containing simplified regex like patterns defined by the User.
+    :return: List of the ids of the words matching every pattern, in table order.
+    :raises RawPatternParseError: If a User defined raw pattern doesn't follow the accepted convention.
+    """
+    patterns: List = [_pattern_tokens(raw_pattern) for raw_pattern in raw_patterns]
 
-    for word in word_subset:
-        if re.match(regex, word):
-            regex_matches.append(word)
+    return dictionary_subset.ids_of(dictionary_subset.pattern_bits(patterns))
 
-    return regex_matches
 
+def _filter_candidates_in(dictionary_subset, **kwargs) -> int:
+    return len(kwargs["ids"]) if kwargs.get("ids") is not None else len(dictionary_subset)
 
-def filter_entries_by_presence_or_absence(dictionary_subset: List, **kwargs) -> List:
+
+@instrumentation.instrumented("filter", candidates_in=_filter_candidates_in)
+def filter_entries_by_presence_or_absence(dictionary_subset, **kwargs) -> List:
     """
-    Filters a List of words further by using two helper functions that check if a list of chars is either present or
-    absent from the List of words.  Uses two possible keyword arguments `present` and `absent` which contain a list of
-    characters which are either present or absent from the word based on your previous wordle guesses.
-    :param dictionary_subset: List containing a pre-filtered words from the English dictionary.
+    Filters a List of words further by checking that a list of chars is either present or absent from each word.  Uses
+    two possible keyword arguments `present` and `absent` which contain a list of characters which are either present or
+    absent from the word based on your previous wordle guesses.  Both lists are compiled into letter masks so each word
+    is checked with a single comparison, pass a WordTable to reuse the letter masks stored in the dictionary index.  A
+    WordTable can also be given the keyword argument `ids` to only check the words with those ids.  Very large
+    dictionaries are split into shards that are checked on several cores, see sharding.py.
+    :param dictionary_subset: WordTable or List containing a pre-filtered words from the English dictionary.
     :return: List with reduced number of words if kwargs provided; the original dictionary of words if not.
     """
     c_present: List = kwargs.get("present")
     c_absent: List = kwargs.get("absent")
-
-    filtered_results: List = list()
+    c_ids: Optional[List] = kwargs.get("ids")
 
     if not c_present and not c_absent:
-        return dictionary_subset
+        if not isinstance(dictionary_subset, word_index.WordTable):
+            return dictionary_subset
+        if c_ids is None:
+            return list(dictionary_subset.words)
+        return [dictionary_subset.words[index] for index in c_ids]
 
-    for word in dictionary_subset:
-        if c_present and c_absent:
-            if _present(word, c_present) and _absent(word, c_absent):
-                filtered_results.append(word)
+    return sharding.filter_by_letters(dictionary_subset, c_present or (), c_absent or (), c_ids)
 
-        elif c_present and not c_absent:
-            if _present(word, c_present):
-                filtered_results.append(word)
 
-        elif c_absent and not c_present:
-            if _absent(word, c_absent):
-                filtered_results.append(word)
+def _parse_counts(raw_counts: List) -> Dict:
+    """
+    Parses User defined letter counts such as `e2` into a dictionary.
+    :param raw_counts: List of strings each containing a letter followed by a number of copies of that letter.
+    :return: Dictionary of the number of copies keyed by letter.
+    :raises InvalidCharacterString: If a count isn't a single letter followed by a number.
+    """
+    counts: Dict = {}
 
-    return filtered_results
+    for raw_count in raw_counts or ():
+        if len(raw_count) < 2 or not raw_count[0].isalpha() or not raw_count[1:].isdigit():
+            raise InvalidCharacterString(f"The letter count {raw_count} should be a letter followed by a number "
+                                         f"e.g. e2!")
+        counts[raw_count[0]] = int(raw_count[1:])
 
-def wordlepy(worldlepy_args) -> List:
+    return counts
+
+
+@instrumentation.instrumented("compile", candidates_out=None)
+def compile_constraints(present: str = "", absent: str = "", patterns: List = (), at_least: Optional[Dict] = None,
+                        at_most: Optional[Dict] = None) -> constraints.Constraints:
     """
-    Function that checks the arguments passed into wordlepy and assembles a filtered list of words accordingly.
-    :param worldlepy_args: Namespace containing the arguments passed via the terminal.
-    :return: List of filtered words depending on the other parameters.
-    :raises ValueError: If the custom dictionary provided isn't in the correct format.
-    :raises DictionaryNotFound: If the specified custom dictionary cannot be located using the path specified.
-    :raises InvalidCharacterString: If the present or absent parameter string contains a non-alphabetic character.
-    :raises InvalidFilterCombination: If you list a character in both present and absent parameter strings.
+    Checks the filters of refine and compiles them into a single set of constraints that can be evaluated in one pass.
+    :param present: String of the characters that are present in the word.
+    :param absent: String of the characters that are absent from the word.
+    :param patterns: List of strings containing simplified regex like patterns.
+    :param at_least: Dictionary of the fewest copies of a letter the word has, keyed by letter.
+    :param at_most: Dictionary of the most copies of a letter the word has, keyed by letter.
+    :return: Constraints of all of the filters.
+    :raises InvalidCharacterString: If the present or absent string contains a non-alphabetic character.
+    :raises InvalidFilterCombination: If the filters contradict each other.
+    :raises RawPatternParseError: If a pattern doesn't follow the accepted convention.
     """
-    suggest: bool = worldlepy_args.suggest
-    filtered_words: List
-    present_chars: List = []
-    absent_chars: List = []
+    if present and not present.isalpha():
+        raise InvalidCharacterString("The present characters string you supplied contains non latin characters!")
 
-    if suggest:
-        return GOOD_STARTING_WORDS
+    if absent and not absent.isalpha():
+        raise InvalidCharacterString("The absent characters string you supplied contains non latin characters!")
 
-    length: int = worldlepy_args.length
-    
-    if not os.path.exists(worldlepy_args.dictionary):
-        raise DictionaryNotFound(f"The specified path: {worldlepy_args.dictionary} doesn't exist or is invalid!")
-    
-    # Load up our dictionary
-    pre_filtered_words = parse_dictionary.parse(worldlepy_args.dictionary, length)
+    if _check_lists(_listify(present or ""), _listify(absent or "")):
+        raise InvalidFilterCombination("Your present and absent filters cannot contain a shared element!")
 
-    if worldlepy_args.present:
-        present: str = worldlepy_args.present
-        if not present.isalpha():
-            raise InvalidCharacterString("The present characters string you supplied contains non latin characters!")
+    compiled: constraints.Constraints = constraints.Constraints.from_arguments(
+        present or "",
+        absent or "",
+        [_pattern_tokens(raw_pattern) for raw_pattern in patterns or ()],
+        at_least,
+        at_most
+    )
 
-        present_chars = _listify(worldlepy_args.present)
+    contradictions: List = compiled.contradictions()
+    if contradictions:
+        raise InvalidFilterCombination(f"Your filters need more copies of {', '.join(contradictions)} than they "
+                                       f"allow!")
 
-    if worldlepy_args.absent:
-        absent: str = worldlepy_args.absent
-        if not absent.isalpha():
-            raise InvalidCharacterString("The absent characters string you supplied contains non latin characters!")
+    return compiled
 
-        absent_chars = _listify(worldlepy_args.absent)
 
-    if _check_lists(present_chars, absent_chars):
-        raise InvalidFilterCombination("Your present and absent filters cannot contain a shared element!")
+def _source_digest(dictionary: str) -> Optional[str]:
+    try:
+        return parse_dictionary.source_digest(dictionary)
+    except OSError:
+        return None
 
-    
 
-    filtered_words = filter_entries_by_presence_or_absence(
-        pre_filtered_words,
-        present=present_chars,
-        absent=absent_chars
-    )
+class WordleSession:
+    """
+    An incremental solver that holds the loaded dictionary and the current set of candidate words, each guess only
+    narrows down the candidates that survived the guesses before it.  Candidates are held as a bitset over the word
+    table so undoing a guess or branching the session to explore an alternative never copies a list of words.
+    """
 
-    if worldlepy_args.regex:
-        for raw_regex in worldlepy_args.regex:
-            regex: Pattern = _build_regex(raw_regex)
-            filtered_words = refined_by_regex(filtered_words, regex)
+    def __init__(self, dictionary: str = DEFAULT_DICTIONARY, length: int = 5,
+                 table: Optional[word_index.WordTable] = None):
+        """
+        :param dictionary: String containing the file path to the dictionary to solve with.
+        :param length: Integer length of the word to be guessed.
+        :param table: WordTable to solve with, when given the dictionary isn't loaded.
+        :raises DictionaryNotFound: If the dictionary cannot be located using the path specified.
+        """
+        source: Optional[str] = None
+
+        if table is None:
+            if not os.path.exists(dictionary):
+                raise DictionaryNotFound(f"The specified path: {dictionary} doesn't exist or is invalid!")
+
+            table = parse_dictionary.load_table(dictionary, length)
+            source = _source_digest(dictionary)
+
+        self.table: word_index.WordTable = table
+        self.length: int = length
+        # digest of the dictionary the table was loaded from, narrowing down every word is only cached when it's known
+        self._source: Optional[str] = source
+        self._history: List = [table.all_bits]
+
+    @property
+    def candidates(self) -> int:
+        """
+        The bitset of the words that are still possible.
+        """
+        return self._history[-1]
+
+    def __len__(self) -> int:
+        return word_index.popcount(self.candidates)
+
+    def words(self) -> List:
+        """
+        Lists the words that are still possible.
+        :return: List of the candidate words, most common first if the dictionary has weights, otherwise in dictionary
+        order.
+        """
+        return [self.table.words[index] for index in self.table.ranked_ids(self.candidates)]
+
+    def iter_words(self, limit: Optional[int] = None) -> Iterator:
+        """
+        Lazily lists the words that are still possible, stopping as soon as enough have been found.  If the dictionary
+        has weights the most common words are picked out first instead.
+        :param limit: Integer number of words to stop after, defaults to every candidate.
+        :return: Iterator of the candidate words, most common first if the dictionary has weights, otherwise in
+        dictionary order.
+        """
+        return (self.table.words[index] for index in self.table.ranked_ids(self.candidates, limit))
+
+    def _narrow(self, bits: int) -> int:
+        self._history.append(self.candidates & bits)
+
+        return len(self)
+
+    def _matching(self, compiled: constraints.Constraints) -> int:
+        with instrumentation.stage("match", len(self)) as record:
+            if self._source is None or self.candidates != self.table.all_bits:
+                bits: int = sharding.constraint_bits(compiled, self.table, self.candidates)
+            else:
+                # nothing is known yet, so the result only depends on the constraints and can be shared with other
+                # sessions
+                key: str = refine_cache.cache_key(self._source, self.length, compiled.key(self.length))
+                bits = refine_cache.default_cache().fetch(key, lambda: sharding.constraint_bits(compiled, self.table))
+
+            record["candidates_out"] = word_index.popcount(bits)
+
+        return bits
+
+    def refine(self, present: str = "", absent: str = "", patterns: List = (), at_least: Optional[Dict] = None,
+               at_most: Optional[Dict] = None) -> int:
+        """
+        Narrows down the candidates using the same filters as `refine`.
+        :param present: String of the characters that are present in the word.
+        :param absent: String of the characters that are absent from the word.
+        :param patterns: List of strings containing simplified regex like patterns.
+        :param at_least: Dictionary of the fewest copies of a letter the word has, keyed by letter.
+        :param at_most: Dictionary of the most copies of a letter the word has, keyed by letter.
+        :return: Integer number of candidates that remain.
+        :raises InvalidCharacterString: If the present or absent string contains a non-alphabetic character.
+        :raises InvalidFilterCombination: If the filters contradict each other.
+        :raises RawPatternParseError: If a pattern doesn't follow the accepted convention.
+        """
+        compiled: constraints.Constraints = compile_constraints(present, absent, patterns, at_least, at_most)
+
+        return self._narrow(self._matching(compiled))
+
+    def guess(self, word: str, feedback: str) -> int:
+        """
+        Narrows down the candidates using the colours given to each letter of a guess, following the wordle rules for
+        duplicate letters.
+        :param word: String containing the word that was guessed.
+        :param feedback: String with one character per letter of the guess, g for green, y for yellow and - for grey.
+        :return: Integer number of candidates that remain.
+        :raises InvalidFeedback: If the guess or the feedback don't match the length of the word, or the feedback
+        contains an unexpected character.
+        """
+        if len(word) != self.length or len(feedback) != self.length:
+            raise InvalidFeedback(f"The guess and feedback must both be {self.length} characters long!")
+
+        try:
+            compiled: constraints.Constraints = constraints.Constraints.from_feedback(word, feedback)
+        except ValueError as error:
+            raise InvalidFeedback(str(error))
+
+        return self._narrow(self._matching(compiled))
+
+    def undo(self) -> int:
+        """
+        Forgets the most recent guess or refine.
+        :return: Integer number of candidates that remain.
+        """
+        if len(self._history) > 1:
+            self._history.pop()
+
+        return len(self)
+
+    def branch(self) -> "WordleSession":
+        """
+        Starts a new session from the current candidates that can be narrowed down without affecting this one.
+        :return: WordleSession sharing the dictionary and current candidates of this session.
+        """
+        session: WordleSession = WordleSession(length=self.length, table=self.table)
+        session._source = self._source
+        session._history = [self.candidates]
+
+        return session
+
+
+def _refined_candidates(dictionary: str, length: int,
+                        compiled: constraints.Constraints) -> Tuple[word_index.WordTable, int]:
+    # Load up our dictionary from its compiled index, this is built on first use and whenever the dictionary changes
+    try:
+        table: word_index.WordTable = parse_dictionary.load_table(dictionary, length)
+    except FileNotFoundError:
+        raise DictionaryNotFound(f"The specified path: {dictionary} doesn't exist or is invalid!")
 
-    return filtered_words
+    source: Optional[str] = _source_digest(dictionary)
 
+    with instrumentation.stage("match", len(table)) as record:
+        if source is None:
+            bits: int = sharding.constraint_bits(compiled, table)
+        else:
+            # equivalent filters share a cache entry, so players reaching the same state only pay for the first of them
+            key: str = refine_cache.cache_key(source, length, compiled.key(length))
+            bits = refine_cache.default_cache().fetch(key, lambda: sharding.constraint_bits(compiled, table))
 
-def main(argv):
-    
+        record["candidates_out"] = word_index.popcount(bits)
+
+    return table, bits
+
+
+def iter_refined(dictionary: str = DEFAULT_DICTIONARY, length: int = 5, present: str = "", absent: str = "",
+                 patterns: List = (), at_least: Optional[Dict] = None, at_most: Optional[Dict] = None,
+                 limit: Optional[int] = None) -> Iterator:
     """
-    Performing parsing of arguments.
-    This allows the script to be callable with arguments from outside.
+    Lazily lists the words matching the filters of refine, the words are only looked up as they are asked for and the
+    search stops as soon as the limit is reached.
+    :param dictionary: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param present: String of the characters that are present in the word.
+    :param absent: String of the characters that are absent from the word.
+    :param patterns: List of strings containing simplified regex like patterns.
+    :param at_least: Dictionary of the fewest copies of a letter the word has, keyed by letter.
+    :param at_most: Dictionary of the most copies of a letter the word has, keyed by letter.
+    :param limit: Integer number of words to stop after, defaults to every match.
+    :return: Iterator of the matching words, most common first if the dictionary has weights, otherwise in dictionary
+    order.
+    :raises DictionaryNotFound: If the dictionary cannot be located using the path specified.
+    :raises InvalidCharacterString: If the present or absent string contains a non-alphabetic character.
+    :raises InvalidFilterCombination: If the filters contradict each other.
+    :raises RawPatternParseError: If a pattern doesn't follow the accepted convention.
     """
+    compiled: constraints.Constraints = compile_constraints(present, absent, patterns, at_least, at_most)
+    table, candidates = _refined_candidates(dictionary, length, compiled)
+
+    return (table.words[index] for index in table.ranked_ids(candidates, limit))
+
+
+def count_refined(dictionary: str = DEFAULT_DICTIONARY, length: int = 5, present: str = "", absent: str = "",
+                  patterns: List = (), at_least: Optional[Dict] = None, at_most: Optional[Dict] = None) -> int:
+    """
+    Counts the words matching the filters of refine without listing them.
+    :param dictionary: String containing the file path to the dictionary.
+    :param length: Integer length of the words.
+    :param present: String of the characters that are present in the word.
+    :param absent: String of the characters that are absent from the word.
+    :param patterns: List of strings containing simplified regex like patterns.
+    :param at_least: Dictionary of the fewest copies of a letter the word has, keyed by letter.
+    :param at_most: Dictionary of the most copies of a letter the word has, keyed by letter.
+    :return: Integer number of matching words.
+    :raises DictionaryNotFound: If the dictionary cannot be located using the path specified.
+    :raises InvalidCharacterString: If the present or absent string contains a non-alphabetic character.
+    :raises InvalidFilterCombination: If the filters contradict each other.
+    :raises RawPatternParseError: If a pattern doesn't follow the accepted convention.
+    """
+    compiled: constraints.Constraints = compile_constraints(present, absent, patterns, at_least, at_most)
+
+    return word_index.popcount(_refined_candidates(dictionary, length, compiled)[1])
+
+
+def refine(present: str = "", absent: str = "", patterns: Sequence[str] = (), length: int = 5,
+           dictionary: str = DEFAULT_DICTIONARY, at_least: Optional[Dict[str, int]] = None,
+           at_most: Optional[Dict[str, int]] = None, limit: Optional[int] = None) -> List[str]:
+    """
+    Lists the words matching the filters of refine.
+    :param present: String of the characters that are present in the word.
+    :param absent: String of the characters that are absent from the word.
+    :param patterns: Sequence of strings containing simplified regex like patterns.
+    :param length: Integer length of the words.
+    :param dictionary: String containing the file path to the dictionary.
+    :param at_least: Dictionary of the fewest copies of a letter the word has, keyed by letter.
+    :param at_most: Dictionary of the most copies of a letter the word has, keyed by letter.
+    :param limit: Integer number of words to list, the most common if the dictionary has weights, defaults to every
+    match.
+    :return: List of the matching words, most common first if the dictionary has weights, otherwise in dictionary
+    order.
+    :raises DictionaryNotFound: If the dictionary cannot be located using the path specified.
+    :raises InvalidCharacterString: If the present or absent string contains a non-alphabetic character.
+    :raises InvalidFilterCombination: If the filters contradict each other.
+    :raises RawPatternParseError: If a pattern doesn't follow the accepted convention.
+    """
+    compiled: constraints.Constraints = compile_constraints(present, absent, patterns, at_least, at_most)
+    table, candidates = _refined_candidates(dictionary, length, compiled)
+
+    with instrumentation.stage("words", word_index.popcount(candidates)) as record:
+        # only the words asked for are looked up, the rest of the candidates are never converted
+        words: List = [table.words[index] for index in table.ranked_ids(candidates, limit)]
+        record["candidates_out"] = len(words)
+
+    return words
+
+
+def suggest(present: str = "", absent: str = "", patterns: Sequence[str] = (), length: int = 5,
+            dictionary: str = DEFAULT_DICTIONARY, at_least: Optional[Dict[str, int]] = None,
+            at_most: Optional[Dict[str, int]] = None, top: int = 10) -> List[str]:
+    """
+    Suggests the guesses expected to narrow down the words matching the filters of refine the most.
+    :param present: String of the characters that are present in the word.
+    :param absent: String of the characters that are absent from the word.
+    :param patterns: Sequence of strings containing simplified regex like patterns.
+    :param length: Integer length of the words.
+    :param dictionary: String containing the file path to the dictionary.
+    :param at_least: Dictionary of the fewest copies of a letter the word has, keyed by letter.
+    :param at_most: Dictionary of the most copies of a letter the word has, keyed by letter.
+    :param top: Integer number of guesses to suggest.
+    :return: List of the best guesses, best first.
+    :raises DictionaryNotFound: If the dictionary cannot be located using the path specified.
+    :raises InvalidCharacterString: If the present or absent string contains a non-alphabetic character.
+    :raises InvalidFilterCombination: If the filters contradict each other.
+    :raises RawPatternParseError: If a pattern doesn't follow the accepted convention.
+    """
+    # imported here so refines don't pay for loading what's only needed to rank guesses
+    import suggestions
+
+    compiled: constraints.Constraints = compile_constraints(present, absent, patterns, at_least, at_most)
+    _, candidates = _refined_candidates(dictionary, length, compiled)
+
+    # rank guesses against the words left after any refine arguments, rather than against the whole dictionary
+    return suggestions.suggest(dictionary, length, candidates, top)
+
+
+def wordlepy(worldlepy_args) -> List:
+    """
+    Function that checks the arguments passed into wordlepy and hands them to `refine`, `suggest` or `count_refined`
+    accordingly.
+    :param worldlepy_args: Namespace containing the arguments passed via the terminal.
+    :return: List of filtered words depending on the other parameters, or the number of them when counting.
+    :raises ValueError: If the custom dictionary provided isn't in the correct format.
+    :raises DictionaryNotFound: If the specified custom dictionary cannot be located using the path specified.
+    :raises InvalidCharacterString: If the present or absent parameter string contains a non-alphabetic character.
+    :raises InvalidFilterCombination: If you list a character in both present and absent parameter strings.
+    """
+    # the filters are applied whenever they are given, a namespace built by hand rather than by the parser may not say
+    # which command it is for or have every argument.
+    filters: Dict = {
+        "present": getattr(worldlepy_args, "present", None) or "",
+        "absent": getattr(worldlepy_args, "absent", None) or "",
+        "patterns": getattr(worldlepy_args, "regex", None) or (),
+        "at_least": _parse_counts(getattr(worldlepy_args, "at_least", None)),
+        "at_most": _parse_counts(getattr(worldlepy_args, "at_most", None))
+    }
+
+    if getattr(worldlepy_args, "suggest", False):
+        return suggest(length=worldlepy_args.length, dictionary=worldlepy_args.dictionary,
+                       top=getattr(worldlepy_args, "top", 10), **filters)
+
+    if getattr(worldlepy_args, "count", False):
+        return count_refined(worldlepy_args.dictionary, worldlepy_args.length, **filters)
+
+    return refine(length=worldlepy_args.length, dictionary=worldlepy_args.dictionary,
+                  limit=getattr(worldlepy_args, "limit", None), **filters)
+
+
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Terminal program to help you to optimise your wordle guesses!")
 
     subparser = parser.add_subparsers(dest="command")
 
-    refine = subparser.add_parser("refine")
-
-    parser.add_argument("-d", "--dictionary", type=str, default="data/websters-english-dictionary.json",
+    refine_parser = subparser.add_parser("refine")
+    subparser.add_parser("index", help="Compile the dictionary into the index used to speed up every other command.")
+    serve = subparser.add_parser("serve", help="Keep the dictionary loaded and answer refine and suggest requests sent "
+                                               "as lines of JSON, see server.py for the format.")
+    serve.add_argument("--socket", type=str, required=False,
+                       help="Specify the path of a Unix socket to listen on instead of stdin and stdout.")
+    serve.add_argument("--host", type=str, required=False, default="127.0.0.1",
+                       help="Specify the address to listen on when using --port, the default is 127.0.0.1.")
+    serve.add_argument("--port", type=int, required=False,
+                       help="Specify a TCP port to listen on instead of stdin and stdout.")
+    serve.add_argument("-w", "--workers", type=int, required=False,
+                       help="Answer requests concurrently with this many processes, which share the dictionary's "
+                            "index, see async_server.py.")
+    serve.add_argument("--max-in-flight", type=int, required=False,
+                       help="Specify the most requests answered at once when using --workers, the default is 64.")
+    serve.add_argument("--dictionaries", type=str, nargs="+", required=False, default=[],
+                       help="Specify the other dictionaries requests can name, only the dictionary given with -d is "
+                            "served otherwise.")
+    matrix = subparser.add_parser("matrix", help="Score every word of the given length against every other word and "
+                                                 "store the feedback for solvers to look up.")
+    matrix.add_argument("-w", "--workers", type=int, required=False,
+                        help="Specify the number of processes to build the matrix with, the default is one per CPU.")
+    tree = subparser.add_parser("tree", help="Work out the guess to make after every possible feedback ahead of time "
+                                             "and store them as a decision tree for solvers to look up.")
+    tree.add_argument("-w", "--workers", type=int, required=False,
+                      help="Specify the number of processes to build the tree with, the default is one per CPU.")
+    tree.add_argument("--start", type=str, required=False,
+                      help="Specify the first guess of the tree, the default is the best suggestion.")
+    tournament = subparser.add_parser("tournament", help="Play every starting word against every answer and rank them "
+                                                         "by the mean number of guesses, suggestions of starting words "
+                                                         "then follow the ranking.")
+    tournament.add_argument("-w", "--workers", type=int, required=False,
+                            help="Specify the number of processes to play with, the default is one per CPU.")
+    tournament.add_argument("-g", "--max-guesses", type=int, required=False, default=6,
+                            help="Specify the number of guesses after which a game counts as a failure, the default "
+                                 "is 6.")
+    tournament.add_argument("-c", "--checkpoint", type=str, required=False,
+                            help="Specify a file to record finished games in, an interrupted tournament resumes from "
+                                 "it when run again.")
+    tournament.add_argument("--openers", type=str, nargs="+", required=False,
+                            help="Specify the starting words to rank, the default is every word of the dictionary.")
+    tournament.add_argument("--candidates", type=int, required=False,
+                            help="Specify a number of starting words to rank, taken from the best suggestions by "
+                                 "expected information, instead of every word of the dictionary.")
+
+    parser.add_argument("-d", "--dictionary", type=str, default=DEFAULT_DICTIONARY,
                         help="Specify the file path to the dictionary that you want to use, the default is "
-                             "websters-english-dictionary. It has to be valid JSON in a dictionary format "
-                             "i.e. it must have words as keys and the "
-                             "meanings as values.")
-    refine.add_argument("-p", "--present", type=str, required=False,
-                        help="Specify which letters are present to help eliminate the possibilities, provide them as a "
-                             "string literal e.g. `abcdefg`.")
-    refine.add_argument("-a", "--absent", type=str, required=False,
-                        help="Specify which letters are absent to help eliminate the possibilities, provide them as a "
-                             "string literal e.g. `abcdefg`.")
+                             "websters-english-dictionary. It can be JSON with words as keys and the meanings as "
+                             "values, a JSON array of words, JSON lines or a plain list of words, optionally gzip "
+                             "or xz compressed.")
+    refine_parser.add_argument("-p", "--present", type=str, required=False,
+                               help="Specify which letters are present to help eliminate the possibilities, provide "
+                                    "them as a string literal e.g. `abcdefg`.")
+    refine_parser.add_argument("-a", "--absent", type=str, required=False,
+                               help="Specify which letters are absent to help eliminate the possibilities, provide "
+                                    "them as a string literal e.g. `abcdefg`.")
     parser.add_argument("-l", "--length", type=int, required=False, default=5,
                         help="Specify the length of the word you wish to look up, the default is a length of 5 "
                              "characters.")
-    refine.add_argument("-r", "--regex", type=str, action='append', required=False,
-                        help="Specify a word using wild cards to eliminate some duds from the suggestions "
-                             "use the following convention.")
+    refine_parser.add_argument("-r", "--regex", type=str, action='append', required=False,
+                               help="Specify a word using wild cards to eliminate some duds from the suggestions "
+                                    "use the following convention.")
+    refine_parser.add_argument("--at-least", type=str, action='append', required=False,
+                               help="Specify the fewest copies of a letter in the word as the letter followed by the "
+                                    "number e.g. `e2` for a word with at least two e's, can be given more than once.")
+    refine_parser.add_argument("--at-most", type=str, action='append', required=False,
+                               help="Specify the most copies of a letter in the word as the letter followed by the "
+                                    "number e.g. `e1` for a word with no more than one e, can be given more than "
+                                    "once.")
+    refine_parser.add_argument("-n", "--limit", type=int, required=False,
+                               help="Specify the most words to list, the search stops as soon as this many have been "
+                                    "found.")
+    refine_parser.add_argument("-c", "--count", action="store_true",
+                               help="Use this to only count the words that match rather than listing them.")
     parser.add_argument("-s", "--suggest", action="store_true",
-                        help="Use this to suggest good starting words depending on word length, default is False.")
+                        help="Use this to suggest the guesses expected to narrow down the words the most, either as "
+                             "starting words or combined with refine to suggest the next guess, default is False.")
+    parser.add_argument("--refine-cache", type=str, required=False,
+                        help="Specify a file to keep the results of refines in between runs, by default they are only "
+                             "remembered while the program is running.")
+    parser.add_argument("--cores", type=int, required=False,
+                        help="Specify the number of processes used to filter very large dictionaries, the default is "
+                             "one per CPU, use 1 to always filter in a single process.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Use this to print how long each stage took, how much memory it allocated and how many "
+                             "words went in and out of it once the command finishes.")
+    parser.add_argument("-k", "--top", type=int, required=False, default=10,
+                        help="Specify how many guesses to suggest, the default is 10.")
+    parser.add_argument("--guess-pool", type=int, required=False,
+                        help="Specify how many guesses to rank when suggesting without a feedback matrix, these "
+                             "suggestions are approximate as they are the best of the pool rather than of the whole "
+                             "dictionary, the default is 256, use 0 to rank every word.  With a matrix every word is "
+                             "always ranked.")
+
+    return parser
+
+
+# the parser is built the first time main is called and reused by every later call.
+_parser: Optional[argparse.ArgumentParser] = None
+
 
-    args = parser.parse_args(argv)
+def main(argv):
+    
+    """
+    Performing parsing of arguments.
+    This allows the script to be callable with arguments from outside, although `refine` and `suggest` are the faster
+    way to do that.
+    """
+    global _parser
+
+    if _parser is None:
+        _parser = _build_parser()
+
+    args = _parser.parse_args(argv)
+
+    if args.refine_cache:
+        refine_cache.configure(disk_path=args.refine_cache)
+
+    if args.cores:
+        sharding.configure(workers=args.cores)
+
+    if args.guess_pool is not None:
+        # imported here so refines don't pay for loading what's only needed to rank guesses
+        import suggestions
+        suggestions.configure(guess_pool=args.guess_pool)
 
     if args.suggest:
-        if args.command == "refine":
-            print("You cannot use refine when requesting suggestions for starter words!")
+        if args.command in ("index", "matrix", "tree", "tournament", "serve"):
+            print(f"You cannot use {args.command} when requesting suggestions!")
             sys.exit(1)
 
     if args.command == "refine":
-        if not args.regex and not args.present and not args.absent:
+        if not args.regex and not args.present and not args.absent and not args.at_least and not args.at_most:
             print("You cannot use refine without specifying at least one refine argument!")
             sys.exit(1)
             
+    if not args.profile:
+        return _run_command(args)
+
+    profile: instrumentation.Profile = instrumentation.Profile()
+    instrumentation.add_hook(profile)
+    instrumentation.enable(allocations=True)
+
+    try:
+        return _run_command(args)
+    finally:
+        instrumentation.disable()
+        instrumentation.remove_hook(profile)
+        profile.print()
+
+
+def _run_command(args):
+    if args.command == "index":
+        if not os.path.exists(args.dictionary):
+            raise DictionaryNotFound(f"The specified path: {args.dictionary} doesn't exist or is invalid!")
+
+        index_path: str = parse_dictionary.build_index(args.dictionary)
+        stats: dict = parse_dictionary.load_index(args.dictionary, index_path).header["ingest"]
+        print(f"Indexed {stats['words']} words from {stats['entries']} entries in {stats['seconds']:.2f}s "
+              f"({stats['bytes_per_second'] / 1e6:.1f} MB/s), peak RSS {stats['peak_rss_bytes'] / 1e6:.1f} MB")
+
+        return index_path
+
+    if args.command == "serve":
+        # imported here as the server needs this module to be fully loaded first
+        import server
+
+        if args.workers is not None:
+            import async_server
+
+            return async_server.serve(args.dictionary, args.socket, args.host, args.port, args.workers,
+                                      args.max_in_flight or async_server.MAX_IN_FLIGHT, args.dictionaries)
+
+        return server.serve(args.dictionary, args.socket, args.host, args.port, args.dictionaries)
+
+    if args.command == "matrix":
+        if not os.path.exists(args.dictionary):
+            raise DictionaryNotFound(f"The specified path: {args.dictionary} doesn't exist or is invalid!")
+
+        return feedback.build_matrix(args.dictionary, args.length, workers=args.workers)
+
+    if args.command == "tree":
+        if not os.path.exists(args.dictionary):
+            raise DictionaryNotFound(f"The specified path: {args.dictionary} doesn't exist or is invalid!")
+
+        # imported here as the tree is only ever built ahead of time
+        import decision_tree
+
+        return decision_tree.build_tree(args.dictionary, args.length, start=args.start, workers=args.workers)
+
+    if args.command == "tournament":
+        if not os.path.exists(args.dictionary):
+            raise DictionaryNotFound(f"The specified path: {args.dictionary} doesn't exist or is invalid!")
+
+        # imported here as tournaments are only ever run ahead of time
+        import suggestions
+        import tournament
+
+        openers: Optional[List] = args.openers
+        if openers is None and args.candidates:
+            openers = suggestions.suggest(args.dictionary, args.length, top=args.candidates, openers=False)
+
+        ranking: List = tournament.run(args.dictionary, args.length, openers, args.max_guesses, args.checkpoint,
+                                       args.workers)
+        print(tournament.format_ranking(ranking, args.top))
+
+        return ranking
+
     try:
         filtered_words = wordlepy(args)        
     except(DictionaryNotFound, InvalidCharacterString, InvalidFilterCombination) as main_error:
@@ -30,26 +30,217 @@ The original project can be found here: https://github.com/matthewreagan/Webster
 Thanks to Peter Coles https://github.com/mrcoles for his list of good starting words!
 His interesting blog on the subject can be found here: https://mrcoles.com/best-wordle-starting-word/
 """
-import argparse, logging, json, os, re, sys
+import argparse, logging, json, os, re, sys, time
+import decision_tree
+import feedback
+import instrumentation
 import parse_dictionary
+import tournament
 import wordlepy
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# number of games handed to a regression worker at a time
+REGRESSION_CHUNK_SIZE = 64
 
 def select_starting_word(log, dictionary_path, length, word_id):
-    # get the parsed dictionary
-    parsed_dict = parse_dictionary.parse(dictionary_path, length)
-    
-    # yuk! sets aren't indexable
-    reference_word = None
-    for id, word in enumerate(sorted(parsed_dict)):
-        if id == word_id:
-            reference_word = word
-            break
+    # the index keeps the words sorted, so the id is just a position in the list
+    words = parse_dictionary.load_words(dictionary_path, length)
+    
+    reference_word = words[word_id] if 0 <= word_id < len(words) else None
             
     log.info("Reference word (id=%d): '%s'" % (word_id, reference_word))
     
     return reference_word
     
        
+def letter_feedback(guess_word, reference_word, code=None):
+    """ Colour the letters of a guess following the wordle rules, a repeated letter is only yellow for as many copies as
+    the reference word has left over once the greens are taken out.  The code can be given when it has already been
+    scored in a batch. """
+
+    if code is None:
+        code = feedback.score(guess_word, reference_word)
+
+    return feedback.to_string(code, len(guess_word))
+
+
+@instrumentation.instrumented("solve", candidates_out=None)
+def solve(log, session, reference_word, starting_word, opening_code=None):
+    """ Play a game against the reference word, returning the number of guesses it took.  The feedback code of the
+    starting word can be given when every game's has been scored in one batch. """
+    
+    guess_word = starting_word
+
+    log.debug("Starting word: '%s'" % guess_word)
+
+    solution_counter = 0
+    while True: # don't impose a limit like real wordle does
+        
+        solution_counter = solution_counter + 1 # increment our number of tries counter
+
+        # perform comparison
+        if guess_word == reference_word:
+            log.debug("Solved '%s' in %d attempt(s)" % (reference_word, solution_counter))
+            return solution_counter
+        
+        colours = letter_feedback(guess_word, reference_word, opening_code if solution_counter == 1 else None)
+
+        # narrow down the candidates left by the previous guess
+        remaining = session.guess(guess_word, colours)
+
+        log.debug("Feedback: '%s', Candidates remaining: %d" % (colours, remaining))
+
+        # get next guess word
+        # only the first candidate is needed, so stop looking as soon as it is found
+        guess_word = next(session.iter_words(1))
+
+        log.debug("Guess word: '%s'" % guess_word)
+        
+
+@instrumentation.instrumented("solve", candidates_out=None)
+def solve_with_tree(log, tree, reference_word):
+    """ Play a game against the reference word by walking down a decision tree, returning the number of guesses it
+    took """
+    
+    node = 0
+    solution_counter = 0
+    while True:
+        
+        solution_counter = solution_counter + 1
+        guess_word = tree.guess(node)
+
+        log.debug("Guess word: '%s'" % guess_word)
+
+        if guess_word == reference_word:
+            log.debug("Solved '%s' in %d attempt(s)" % (reference_word, solution_counter))
+            return solution_counter
+
+        # a single lookup replaces the refine and filter of every guess
+        node = tree.child(node, feedback.score(guess_word, reference_word))
+
+
+# state of each regression worker process, so the dictionary is only loaded once per worker
+_worker = {}
+
+def _initialise_worker(dictionary_path, length, starting_word, use_tree=False, profile=False):
+    # records are collected by each worker and handed back with the games they belong to
+    _worker["records"] = []
+    if profile:
+        instrumentation.add_hook(_worker["records"].append)
+        instrumentation.enable(allocations=True)
+    _worker["session"] = wordlepy.WordleSession(dictionary_path, length)
+    _worker["tree"] = decision_tree.load_tree(dictionary_path, length) if use_tree else None
+    _worker["starting_word"] = starting_word
+    # every game opens with the same word, so its feedback against every answer is scored at once.
+    _worker["opening_codes"] = None if use_tree else feedback.score_row(_worker["session"].table, starting_word)
+    _worker["log"] = logging.getLogger(__name__)
+
+def _solve_word_id(word_id):
+    if _worker["tree"] is not None:
+        tree = _worker["tree"]
+        guesses = solve_with_tree(_worker["log"], tree, tree.table.words[word_id])
+    else:
+        session = _worker["session"].branch()
+        reference_word = session.table.words[word_id]
+        guesses = solve(_worker["log"], session, reference_word, _worker["starting_word"],
+                        _worker["opening_codes"][word_id])
+    
+    records = _worker["records"][:]
+    del _worker["records"][:]
+    
+    return word_id, guesses, records
+
+
+def load_checkpoint(checkpoint_path, header):
+    """ Read back the games already played by an earlier run, as a dictionary of word id to number of guesses.  The
+    first line of the checkpoint is the header of the regression that wrote it, which must match this one's. """
+    
+    results = {}
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r") as checkpoint:
+            lines = checkpoint.read().splitlines()
+        
+        if lines and json.loads(lines[0]) != header:
+            raise tournament.InvalidCheckpoint("The checkpoint %s is of a different regression, remove it or choose "
+                                               "another file!" % checkpoint_path)
+        
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # a partly written line from a run that was stopped
+            results[entry["word_id"]] = entry["guesses"]
+    
+    return results
+
+
+def regression_report(log, results, max_guesses, elapsed, games_played):
+    """ Log the spread of the number of guesses needed across every game played """
+    
+    distribution = Counter(results.values())
+    games = len(results)
+    mean = sum(results.values()) / games
+    failures = sum(count for guesses, count in distribution.items() if guesses > max_guesses)
+    games_per_second = games_played / elapsed if elapsed else 0.0
+    
+    log.info("Games: %d, mean guesses: %.3f, failures (over %d guesses): %d (%.2f%%)" % (
+        games, mean, max_guesses, failures, 100.0 * failures / games))
+    
+    for guesses in sorted(distribution):
+        log.info("%3d guess(es): %d" % (guesses, distribution[guesses]))
+    
+    log.info("Played %d game(s) in %.2fs, %.1f games/second" % (games_played, elapsed, games_per_second))
+    
+    return {
+        "games": games,
+        "mean": mean,
+        "failures": failures,
+        "distribution": dict(sorted(distribution.items())),
+        "games_per_second": games_per_second
+    }
+
+
+def regression(log, args, starting_word):
+    """ Play a game against every word of the dictionary across a pool of worker processes """
+    
+    word_count = len(parse_dictionary.load_words(args.dictionary, args.length))
+    # word ids only mean the same game when the dictionary, word length and way of playing are the same.
+    header = {"sha256": parse_dictionary.source_digest(args.dictionary),
+              "length": args.length, "starting_word": starting_word, "tree": bool(args.tree)}
+    results = load_checkpoint(args.checkpoint, header)
+    word_ids = [word_id for word_id in range(word_count) if word_id not in results]
+    
+    log.info("Regression over %d word(s), %d already played" % (word_count, len(results)))
+    
+    # line buffered so every finished game is on disk before the next one is reported
+    checkpoint = open(args.checkpoint, "a", buffering=1) if args.checkpoint else None
+    if checkpoint and not results:
+        checkpoint.truncate(0)
+        checkpoint.write(json.dumps(header) + "\n")
+    start = time.perf_counter()
+    
+    try:
+        with ProcessPoolExecutor(args.workers, initializer=_initialise_worker,
+                                 initargs=(args.dictionary, args.length, starting_word, args.tree,
+                                           args.profile)) as executor:
+            for word_id, guesses, records in executor.map(_solve_word_id, word_ids, chunksize=REGRESSION_CHUNK_SIZE):
+                results[word_id] = guesses
+                for record in records:
+                    instrumentation.emit(record)
+                if checkpoint:
+                    checkpoint.write(json.dumps({"word_id": word_id, "guesses": guesses}) + "\n")
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    
+    elapsed = time.perf_counter() - start
+    
+    if not results:
+        log.info("No words of length %d to play" % args.length)
+        return {}
+    
+    return regression_report(log, results, args.max_guesses, elapsed, len(word_ids))
     
 
 def logging_define_verbosity( logger, cmdline_verbose, cmdline_quiet ):
@@ -87,9 +278,9 @@ def commandline_interface( log, argv ):
     # Optional arguments
     parser.add_argument("-d", "--dictionary", type=str, default="data/websters-english-dictionary.json",
                         help="Specify the file path to the dictionary that you want to use, the default is "
-                             "websters-english-dictionary. It has to be valid JSON in a dictionary format "
-                             "i.e. it must have words as keys and the "
-                             "meanings as values.")
+                             "websters-english-dictionary. It can be JSON with words as keys and the meanings as "
+                             "values, a JSON array of words, JSON lines or a plain list of words, optionally gzip "
+                             "or xz compressed.")
     parser.add_argument("-l", "--length", type=int, required=False, default=5,
                         help="Specify the length of the word you wish to look up, the default is a length of 5 "
                              "characters.")
@@ -97,6 +288,20 @@ def commandline_interface( log, argv ):
                              
     parser.add_argument("-i", "--word-id", type=int, required=False, default=0,
                         help="Specify the dictionary word id to use as a reference. -1 signifies all words (i.e. regression mode)")
+    parser.add_argument("-w", "--workers", type=int, required=False, default=None,
+                        help="Specify the number of worker processes used in regression mode, defaults to one per CPU.")
+    parser.add_argument("-g", "--max-guesses", type=int, required=False, default=6,
+                        help="Specify the number of guesses after which a game counts as a failure in regression mode.")
+    parser.add_argument("-c", "--checkpoint", type=str, required=False, default=None,
+                        help="Specify a file to record regression results in as they finish, an interrupted regression "
+                             "resumes from it when run again.")
+    parser.add_argument("-t", "--tree", action="store_true",
+                        help="Play by walking down the decision tree of the dictionary instead of refining after every "
+                             "guess, the tree is built first if it is missing.")
+    
+    parser.add_argument("--profile", action="store_true",
+                        help="Print how long each stage took, how much memory it allocated and how many words went in "
+                             "and out of it, including the stages run by regression workers.")
     
     parser.add_argument('--verbose', '-v',     action='count', default=0,
                         help="Increment verbosity level by one" )
@@ -128,77 +333,48 @@ def main(argv):
     
     logging_define_verbosity(log, args.verbose, args.quiet)
     
+    if not args.profile:
+        return play(log, args)
     
-    if args.word_id != -1:
-        word_ids = [args.word_id]
-    else:
-        word_ids = 100000000000000 # i'm lazy, how big is the dictionary?
+    profile = instrumentation.Profile()
+    instrumentation.add_hook(profile)
+    instrumentation.enable(allocations=True)
     
-    # main test loop   
-    for word_id in word_ids:
-        reference_word = select_starting_word(log, args.dictionary, args.length, args.word_id)
-        reference_letters = list(reference_word)
-
-        # solution loop
-        
-        # initial starting guess
-        suggested_words = wordlepy.main(["--suggest"])
-        guess_word = suggested_words[0]
-        guess_letters = list(guess_word)
+    try:
+        return play(log, args)
+    finally:
+        instrumentation.disable()
+        instrumentation.remove_hook(profile)
+        profile.print(sys.stdout)
 
-        log.debug("Starting word: '%s'" % guess_word)
 
-        # Store the letters found
-        correct_positions = ['?','?','?','?','?'] # TODO: allow this to handle any word size
-        correct_letters = ""
-        incorrect_letters = ""
-
-        solution_counter = 0
-        while True: # don't impose a limit like real wordle does
-            
-            solution_counter = solution_counter + 1 # increment our number of tries counter
-
-            # perform comparison
-            if guess_word == reference_word:
-                log.info("Solved in %d attempt(s)" % solution_counter)
-                break
-            
-            # perform letter comparison
-            for id, letter in enumerate(guess_letters):
-
-                # check letter is within the word
-                if (letter in reference_letters):
-                    if (letter not in correct_letters):
-                        correct_letters = correct_letters + letter
-                    else:
-                        pass # No need to dupliate the list
-                elif letter not in incorrect_letters: # No need to dupliate the list
-                    incorrect_letters = incorrect_letters + letter
-
-                # check positionality: use a simplified approach where we don't exclude letters from specific positions, just in totol
-                # TODO: implement the exclusion of included letters from specific positions.
-                if guess_letters[id] == reference_letters[id]:
-                    correct_positions[id] = reference_letters[id]
-
-            search_exp = "".join(correct_positions)
-                 
-            log.debug("Correct letters: '%s', Incorrect letters: '%s', Search pattern: '%s'" % (correct_letters, incorrect_letters, search_exp) )
-                        
-            # get next guess word whilst refining
-            guess_words = wordlepy.main(["refine", "-p", correct_letters, "-a", incorrect_letters,  "-r","%s" % search_exp])
-            guess_word = guess_words[0]
-            guess_letters = list(guess_word)
-
-            log.debug("Guess word: '%s'" % guess_word)
-            
-            
-            
-            
-        
+def play(log, args):
+    """ Play a single game, or every game in regression mode, as chosen by the command line arguments """
+    
+    # the same starting word is used for every game
+    starting_word = wordlepy.suggest(length=args.length, dictionary=args.dictionary, top=1)[0]
     
+    if args.tree:
+        # built up front so the regression workers only ever load it
+        tree = decision_tree.load_tree(args.dictionary, args.length, workers=args.workers)
     
+    if args.word_id == -1:
+        return regression(log, args, starting_word)
     
+    reference_word = select_starting_word(log, args.dictionary, args.length, args.word_id)
     
+    if args.tree:
+        solution_counter = solve_with_tree(log, tree, reference_word)
+        log.info("Solved in %d attempt(s)" % solution_counter)
+        return solution_counter
+    
+    session = wordlepy.WordleSession(args.dictionary, args.length)
+    solution_counter = solve(log, session, reference_word, starting_word)
+    
+    log.info("Solved in %d attempt(s)" % solution_counter)
+    
+    return solution_counter
+
 
 if __name__ == "__main__":
     main(sys.argv[1:])
\ No newline at end of file